@@ -0,0 +1,143 @@
+# accounts/metrics.py
+"""
+Figures shown on the role dashboards (accounts.views.dashboard).
+
+Each role's figures take at most two queries:
+
+  - sales per day over the last DASHBOARD_WINDOW_DAYS business days, from
+    the daily rollup (reports.models.DailySalesReport, which checkout keeps
+    current for today too),
+  - every count and total in one SELECT: scalar COUNT / SUM subqueries on
+    one row (the branch's, or the superuser's own), or conditional
+    aggregation (COUNT/SUM ... FILTER) over the cashier's own sales, on the
+    (user, business_date) index.
+
+The superuser's total sales are all time, as before the window; the branch
+roles' sales total and the cashier's payment methods cover the window.
+
+Results are cached for DASHBOARD_CACHE_TIMEOUT seconds: per branch for
+admins and managers, per cashier, and once for the superuser view.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F, Func, IntegerField, Q, Subquery, Sum
+from django.utils import timezone
+
+from branches.models import Branch
+from customers.models import Customer
+from inventory.models import Category, Item
+from reports.models import DailySalesReport
+from sales.models import Sale
+
+
+ZERO = Decimal("0.00")
+LOW_STOCK = 5
+
+
+def get_window_days():
+    return getattr(settings, "DASHBOARD_WINDOW_DAYS", 90)
+
+
+def get_timeout():
+    return getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 60)
+
+
+def count_of(queryset):
+    """COUNT(*) of a queryset as a scalar subquery."""
+    return Subquery(
+        queryset.order_by().annotate(count=Func(F("pk"), function="COUNT")).values("count"),
+        output_field=IntegerField(),
+    )
+
+
+def sum_of(queryset, field):
+    """SUM(field) of a queryset as a scalar subquery (NULL when empty)."""
+    return Subquery(
+        queryset.order_by().annotate(total=Func(F(field), function="SUM")).values("total"),
+        output_field=queryset.model._meta.get_field(field),
+    )
+
+
+def cached(key, compute):
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, get_timeout())
+    return result
+
+
+def _window(today):
+    return today - datetime.timedelta(days=get_window_days() - 1)
+
+
+def _daily_sales(branch, start):
+    """[(date, gross sales)] from the daily rollup since `start`, oldest first (branch=None: all)."""
+    rows = DailySalesReport.objects.filter(date__gte=start)
+    if branch is not None:
+        rows = rows.filter(branch=branch)
+    return [
+        (row["date"], row["gross"] or ZERO)
+        for row in rows.values("date").annotate(gross=Sum("gross_sales")).order_by("date")
+    ]
+
+
+# -------------------------------
+# Per role
+# -------------------------------
+def overview_metrics(user):
+    """Superuser: users, branches, low stock items and sales of every branch (total: all time)."""
+    today = timezone.localdate()
+
+    def compute():
+        sales = _daily_sales(None, _window(today))
+        # the counts ride on the requesting user's own row: one SELECT, four scalar subqueries
+        counts = get_user_model().objects.filter(pk=user.pk).values(
+            total_users=count_of(get_user_model().objects.all()),
+            total_branches=count_of(Branch.objects.all()),
+            low_stock_count=count_of(Item.objects.filter(stock__lt=LOW_STOCK)),
+            total_sales=sum_of(DailySalesReport.objects.all(), "gross_sales"),
+        ).get()
+        counts["total_sales"] = counts["total_sales"] or ZERO
+        return {"sales": sales, **counts}
+    return cached(f"dashboard:overview:{today.isoformat()}", compute)
+
+
+def branch_metrics(branch):
+    """Branch admin and manager: the branch's sales, customers, items and categories."""
+    today = branch.business_date()
+
+    def compute():
+        sales = _daily_sales(branch, _window(today))
+        counts = Branch.objects.filter(pk=branch.pk).values(
+            branch_customers=count_of(Customer.objects.filter(branch=branch)),
+            branch_items=count_of(Item.objects.filter(branch=branch)),
+            branch_categories=count_of(Category.objects.filter(branch=branch)),
+        ).get()
+        return {"sales": sales, "branch_sales": sum((total for _, total in sales), ZERO), **counts}
+    return cached(f"dashboard:branch:{branch.pk}:{today.isoformat()}", compute)
+
+
+def cashier_metrics(user):
+    """
+    Cashier (with a branch): today's sales and payment methods (over the
+    window) of their own sales in that branch, in one query.
+    """
+    branch = user.branch
+    today = branch.business_date()
+
+    def compute():
+        sums = Sale.objects.filter(user=user, branch=branch, business_date__gte=_window(today)).aggregate(
+            todays_sales=Sum("total", filter=Q(business_date=today)),
+            cash=Count("pk", filter=Q(payment_method="cash")),
+            card=Count("pk", filter=Q(payment_method="card")),
+            other=Count("pk", filter=~Q(payment_method__in=["cash", "card"])),
+        )
+        return {
+            "todays_sales": sums["todays_sales"] or ZERO,
+            "payment_methods": [sums["cash"], sums["card"], sums["other"]],
+        }
+    return cached(f"dashboard:cashier:{user.pk}:{today.isoformat()}", compute)
@@ -1,6 +1,7 @@
 // accounts/static/js/reports.js
 let salesChart = null;
 let topItemsChart = null;
+let exportParams = {}; // branch / date filters shared by every export
 
 // Helper - safely read branch id from page (body data attribute)
 function getBranchId() {
@@ -25,6 +26,22 @@ function buildUrl(path, params = {}) {
   return url.toString();
 }
 
+// GET a report API as JSON, revalidating with its ETag: while the branch has
+// no new sale or item change the server answers 304 and the last body is reused
+const reportResponses = new Map();
+
+async function fetchReport(url) {
+  const previous = reportResponses.get(url);
+  const headers = previous ? { "If-None-Match": previous.etag } : {};
+  const res = await fetch(url, { headers: headers, cache: "no-store" });
+  if (res.status === 304 && previous) return previous.data;
+  if (!res.ok) throw new Error("Network response not ok");
+  const data = await res.json();
+  const etag = res.headers.get("ETag");
+  if (etag) reportResponses.set(url, { etag: etag, data: data });
+  return data;
+}
+
 // Render chart helper
 function renderChart(canvasId, data, label) {
   const canvas = document.getElementById(canvasId);
@@ -78,9 +95,7 @@ function renderChart(canvasId, data, label) {
 async function loadTrends(period) {
   const url = buildUrl(`/reports/sales_trends/${encodeURIComponent(period)}/`);
   try {
-    const res = await fetch(url);
-    if (!res.ok) throw new Error("Network response not ok");
-    const data = await res.json();
+    const data = await fetchReport(url);
     renderChart("salesChart", data, `Sales (${period})`);
   } catch (err) {
     console.error("loadTrends error:", err);
@@ -92,9 +107,7 @@ async function loadTrends(period) {
 async function loadTrendsRange(start, end) {
   const url = buildUrl("/reports/sales_trends_range/", { start: start, end: end });
   try {
-    const res = await fetch(url);
-    if (!res.ok) throw new Error("Network response not ok");
-    const data = await res.json();
+    const data = await fetchReport(url);
     renderChart("salesChart", data, `Sales (${start} → ${end})`);
   } catch (err) {
     console.error("loadTrendsRange error:", err);
@@ -106,9 +119,7 @@ async function loadTrendsRange(start, end) {
 async function loadTopItems() {
   const url = buildUrl("/reports/top_items/");
   try {
-    const res = await fetch(url);
-    if (!res.ok) throw new Error("Network response not ok");
-    const data = await res.json();
+    const data = await fetchReport(url);
     renderChart("topItemsChart", data, "Top Items (qty)");
   } catch (err) {
     console.error("loadTopItems error:", err);
@@ -116,20 +127,106 @@ async function loadTopItems() {
   }
 }
 
+// Today's top sellers and ticket percentiles, answered from the server's live sketches
+// (no SaleItem query), reloaded on new sales (or every LIVE_REFRESH_MS without the live feed)
+const LIVE_REFRESH_MS = 30000;
+
+function fillList(id, lines) {
+  const ul = document.getElementById(id);
+  if (!ul) return;
+  ul.innerHTML = "";
+  (lines.length ? lines : ["No sales yet today"]).forEach(text => {
+    const li = document.createElement("li");
+    li.className = "list-group-item" + (lines.length ? "" : " text-muted");
+    li.textContent = text;
+    ul.appendChild(li);
+  });
+}
+
+async function loadLiveToday() {
+  try {
+    const [top, tickets] = await Promise.all([
+      fetch(buildUrl("/reports/live/top_items/")).then(res => res.json()),
+      fetch(buildUrl("/reports/live/tickets/")).then(res => res.json())
+    ]);
+    fillList("liveTopList", (top.labels || []).map((name, i) =>
+      `${name} — ${top.errors[i] ? "~" : ""}${top.totals[i]} sold`));
+    fillList("liveTicketList", tickets.sales ? [
+      `${tickets.sales} sales, ${tickets.revenue.toFixed(2)} total (average ${tickets.average.toFixed(2)})`,
+      ...Object.entries(tickets.percentiles).map(([p, value]) => `${p}: ${value.toFixed(2)}`),
+      `smallest ${tickets.min.toFixed(2)}, largest ${tickets.max.toFixed(2)}`
+    ] : []);
+  } catch (err) {
+    console.error("loadLiveToday error:", err);
+  }
+}
+
+// Load forecast: last 8 weeks, 7-day average and the next days, plus unusual days
+let forecastChart = null;
+
+async function loadForecast() {
+  const canvas = document.getElementById("forecastChart");
+  if (!canvas) return;
+  try {
+    const data = await fetchReport(buildUrl("/reports/forecast/"));
+    const shown = 56;
+    const past = data.history.dates.slice(-shown);
+    const labels = past.concat(data.forecast.dates);
+    const pad = (values, before, after) => Array(before).fill(null).concat(values, Array(after).fill(null));
+    const horizon = data.forecast.dates.length;
+
+    if (forecastChart) {
+      try { forecastChart.destroy(); } catch (e) {}
+    }
+    forecastChart = new Chart(canvas.getContext("2d"), {
+      type: "line",
+      data: {
+        labels: labels,
+        datasets: [
+          { label: "Sales", data: pad(data.history.totals.slice(-shown), 0, horizon), borderWidth: 2, tension: 0.2 },
+          { label: "7-day average", data: pad(data.history.ma7.slice(-shown), 0, horizon), borderWidth: 1, pointRadius: 0 },
+          { label: "Forecast", data: pad(data.forecast.totals, past.length, 0), borderDash: [6, 4], borderWidth: 2 }
+        ]
+      },
+      options: { responsive: true, maintainAspectRatio: false, scales: { y: { beginAtZero: true } } }
+    });
+
+    const ul = document.getElementById("anomalyList");
+    if (!ul) return;
+    ul.innerHTML = "";
+    const anomalies = (data.anomalies || []).slice(-10).reverse();
+    if (!anomalies.length) {
+      const li = document.createElement("li");
+      li.className = "list-group-item text-muted";
+      li.textContent = "No unusual days";
+      ul.appendChild(li);
+    }
+    anomalies.forEach(a => {
+      const li = document.createElement("li");
+      li.className = "list-group-item";
+      li.textContent = `${a.date} — ${a.total.toFixed(2)} (expected ~${a.expected.toFixed(2)}, z ${a.z})`;
+      ul.appendChild(li);
+    });
+  } catch (err) {
+    console.error("loadForecast error:", err);
+  }
+}
+
 // Load low stock list
 async function loadLowStock() {
   const url = buildUrl("/reports/low_stock/");
   try {
-    const res = await fetch(url);
-    if (!res.ok) throw new Error("Network response not ok");
-    const data = await res.json();
+    const data = await fetchReport(url);
     const ul = document.getElementById("lowStockList");
     if (!ul) return;
     ul.innerHTML = "";
     (data.items || []).forEach(it => {
       const li = document.createElement("li");
       li.className = "list-group-item";
-      li.textContent = `${it.name} — Stock: ${it.stock}`;
+      const cover = it.days_of_cover === null ? "not selling" : `${it.days_of_cover} days left`;
+      const order = it.suggested_quantity ? `, order ${it.suggested_quantity}` : "";
+      const supplier = it.supplier ? ` from ${it.supplier}` : "";
+      li.textContent = `${it.name} — Stock: ${it.stock} (${cover}${order}${supplier})`;
       ul.appendChild(li);
     });
   } catch (err) {
@@ -137,6 +234,58 @@ async function loadLowStock() {
   }
 }
 
+// Live low stock alerts: long-poll the branch's events and reload the list when a sale
+// takes an item to its reorder point
+async function watchStockAlerts() {
+  let after = 0;
+  try {
+    const recent = await (await fetch(buildUrl("/reports/alerts/"))).json();
+    after = recent.last_id || 0;
+  } catch (e) {
+    return;
+  }
+  for (;;) {
+    try {
+      const res = await fetch(buildUrl("/reports/alerts/", { after: after, wait: 25 }));
+      if (!res.ok) throw new Error("Network response not ok");
+      const data = await res.json();
+      after = data.last_id;
+      if ((data.events || []).some(ev => ev.type === "low_stock")) loadLowStock();
+    } catch (err) {
+      console.error("watchStockAlerts error:", err);
+      await new Promise(resolve => setTimeout(resolve, 10000));
+    }
+  }
+}
+
+// Live feed (Server-Sent Events): today's running totals, plus new sales and low stock
+// crossings as checkouts commit. Without EventSource, fall back to polling.
+let liveRefresh = null;
+
+function showLiveTotals(data) {
+  const badge = document.getElementById("liveTotals");
+  if (!badge) return;
+  badge.textContent = `Today: ${data.revenue.toFixed(2)} from ${data.orders} orders`;
+  badge.classList.remove("d-none");
+}
+
+function watchLiveFeed() {
+  if (!window.EventSource) {
+    setInterval(loadLiveToday, LIVE_REFRESH_MS);
+    watchStockAlerts();
+    return;
+  }
+  const source = new EventSource(buildUrl("/reports/live/feed/"));
+  source.addEventListener("summary", ev => showLiveTotals(JSON.parse(ev.data)));
+  source.addEventListener("sale", ev => {
+    showLiveTotals(JSON.parse(ev.data));
+    // a burst of sales reloads the live cards once
+    clearTimeout(liveRefresh);
+    liveRefresh = setTimeout(loadLiveToday, 2000);
+  });
+  source.addEventListener("low_stock", () => loadLowStock());
+}
+
 // Update export links (CSV/PDF) with branch + optional dates
 function updateExportLinks(start = null, end = null) {
   const csvBtn = document.getElementById("exportCsvBtn");
@@ -152,6 +301,53 @@ function updateExportLinks(start = null, end = null) {
   const pdfUrl = buildUrl("/reports/export/pdf/", params);
   csvBtn.href = csvUrl;
   pdfBtn.href = pdfUrl;
+  exportParams = params;
+}
+
+// Large exports (PDF, Excel) run as background jobs: create, poll progress, then download
+function getCsrfToken() {
+  const row = document.cookie.split("; ").find((r) => r.startsWith("csrftoken="));
+  return row ? decodeURIComponent(row.split("=")[1]) : "";
+}
+
+async function runExportJob(format, btn) {
+  const label = btn.textContent;
+  const body = new URLSearchParams({ ...exportParams, format });
+  btn.classList.add("disabled");
+  try {
+    const res = await fetch("/reports/export/jobs/", {
+      method: "POST",
+      headers: { "X-CSRFToken": getCsrfToken() },
+      body,
+    });
+    let job = await res.json();
+    if (!res.ok) throw new Error(job.error || "Export failed");
+
+    while (job.status === "pending" || job.status === "running") {
+      btn.textContent = job.status === "pending" ? "Queued…" : `Exporting ${job.progress}%`;
+      await new Promise((r) => setTimeout(r, 1500));
+      job = await (await fetch(job.status_url)).json();
+    }
+    if (job.status !== "done") throw new Error(job.error || "Export failed");
+    window.location = job.download_url;
+  } catch (e) {
+    alert(e.message);
+  } finally {
+    btn.textContent = label;
+    btn.classList.remove("disabled");
+  }
+}
+
+function bindExportJobButtons() {
+  const buttons = { exportPdfBtn: "pdf", exportXlsxBtn: "xlsx" };
+  for (const id in buttons) {
+    const btn = document.getElementById(id);
+    if (!btn) continue;
+    btn.addEventListener("click", (e) => {
+      e.preventDefault();
+      if (!btn.classList.contains("disabled")) runExportJob(buttons[id], btn);
+    });
+  }
 }
 
 // Apply date filter (reads daterange input)
@@ -194,5 +390,9 @@ document.addEventListener("DOMContentLoaded", () => {
   loadTrends("daily");
   loadTopItems();
   loadLowStock();
+  loadForecast();
+  loadLiveToday();
+  watchLiveFeed();
   updateExportLinks();
+  bindExportJobButtons();
 });
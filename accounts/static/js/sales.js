@@ -31,6 +31,42 @@ document.addEventListener("DOMContentLoaded", () => {
 
   function saveCart() {
     localStorage.setItem("cart", JSON.stringify(cart));
+    // A changed cart is a different sale -> it needs a fresh idempotency key
+    localStorage.removeItem("checkoutKey");
+  }
+
+  // Same key for every retry of the same cart, so the server never sells it twice
+  function getCheckoutKey() {
+    let key = localStorage.getItem("checkoutKey");
+    if (!key) {
+      key = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+      localStorage.setItem("checkoutKey", key);
+    }
+    return key;
+  }
+
+  // Retry network failures / server errors with backoff; safe thanks to the idempotency key
+  function postCheckout(body, attempt = 1) {
+    return fetch("/sales/checkout/", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": getCSRFToken(),
+        "Idempotency-Key": getCheckoutKey(),
+      },
+      body: JSON.stringify(body),
+    })
+      .then((res) => {
+        if ((res.status >= 500 || res.status === 409) && attempt < 3) throw new Error(`HTTP ${res.status}`);
+        return res.json();
+      })
+      .catch((err) => {
+        if (attempt >= 3) throw err;
+        return new Promise((resolve) => setTimeout(resolve, 500 * attempt))
+          .then(() => postCheckout(body, attempt + 1));
+      });
   }
 
   // === Cart Rendering ===
@@ -39,6 +75,8 @@ document.addEventListener("DOMContentLoaded", () => {
     cartTable.innerHTML = "";
     let total = 0;
 
+    loadSuggestions();
+
     if (!cart.length) {
       cartTable.innerHTML = `<tr><td colspan="5">Cart is empty</td></tr>`;
       document.getElementById("cartTotal").innerText = "0.00";
@@ -90,6 +128,40 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
+  // === Frequently bought together: refreshed when the set of cart items changes ===
+  const suggestionsBox = document.getElementById("cartSuggestions");
+  const suggestionList = document.getElementById("cartSuggestionList");
+  let suggestionsFor = null;
+
+  function loadSuggestions() {
+    if (!suggestionsBox) return;
+    const ids = cart.map((i) => i.id).sort((a, b) => a - b).join(",");
+    if (ids === suggestionsFor) return;
+    suggestionsFor = ids;
+    if (!ids) {
+      suggestionsBox.style.display = "none";
+      return;
+    }
+    fetch(`/reports/suggestions/?items=${ids}`)
+      .then((res) => (res.ok ? res.json() : { items: [] }))
+      .then((data) => {
+        if (ids !== suggestionsFor) return; // the cart changed meanwhile
+        suggestionList.innerHTML = "";
+        (data.items || []).forEach((s) => {
+          const btn = document.createElement("button");
+          btn.type = "button";
+          btn.className = "btn btn-sm btn-outline-primary";
+          btn.textContent = `+ ${s.name} (${s.price.toFixed(2)})`;
+          btn.addEventListener("click", () => addToCart(s.id, s.name, s.price));
+          suggestionList.appendChild(btn);
+        });
+        suggestionsBox.style.display = data.items && data.items.length ? "" : "none";
+      })
+      .catch(() => {
+        suggestionsBox.style.display = "none";
+      });
+  }
+
   function changeQuantity(id, delta) {
     const item = cart.find((i) => i.id === id);
     if (!item) return;
@@ -110,16 +182,104 @@ document.addEventListener("DOMContentLoaded", () => {
     renderCart();
   }
 
+  // === Catalog (fetched once, then only deltas; cached per branch in localStorage) ===
+  const itemsContainer = document.getElementById("itemsContainer");
+  const catalogKey = `catalog:${itemsContainer?.dataset.branchId || ""}`;
+
+  function mergeCatalog(catalog, data) {
+    if (data.full || !catalog) catalog = { version: 0, items: {} };
+    data.items.forEach((row) => {
+      const item = {};
+      data.fields.forEach((field, i) => { item[field] = row[i]; });
+      catalog.items[item.id] = item;
+    });
+    data.deleted.forEach((id) => { delete catalog.items[id]; });
+    catalog.categories = data.categories;
+    catalog.version = data.version;
+    return catalog;
+  }
+
+  function renderCatalog(catalog) {
+    itemsContainer.innerHTML = "";
+    const items = Object.values(catalog.items)
+      .filter((i) => i.stock > 0)
+      .sort((a, b) => a.name.localeCompare(b.name));
+
+    catalog.categories.forEach(([catId, catName]) => {
+      const heading = document.createElement("h3");
+      heading.className = "mt-3";
+      heading.textContent = catName;
+      const group = document.createElement("div");
+      group.className = "d-flex flex-wrap gap-3 category-items";
+
+      items.filter((i) => i.category_id === catId).forEach((item) => {
+        const card = document.createElement("div");
+        card.className = "item-card border p-2 clickable-item";
+        card.style.cssText = "width:160px; cursor:pointer;";
+        Object.assign(card.dataset, {
+          id: item.id,
+          name: item.name,
+          price: item.price,
+          category: catName.toLowerCase(),
+          supplier: (item.supplier || "").toLowerCase(),
+          stock: item.stock,
+        });
+
+        const img = document.createElement("img");
+        img.src = item.image || itemsContainer.dataset.noImage;
+        img.alt = item.name;
+        img.className = "img-fluid";
+        img.style.cssText = "height:150px; width:150px;";
+
+        const info = document.createElement("div");
+        info.className = "mt-2";
+        const name = document.createElement("strong");
+        name.textContent = item.name;
+        info.append(name, document.createElement("br"), `Price: ${item.price}`,
+          document.createElement("br"), `Stock: ${item.stock}`);
+
+        card.append(img, info);
+        group.appendChild(card);
+      });
+
+      itemsContainer.append(heading, group);
+    });
+
+    // Keep the current search filter applied
+    if (itemSearchInput && itemSearchInput.value) itemSearchInput.dispatchEvent(new Event("input"));
+  }
+
+  function loadCatalog() {
+    if (!itemsContainer || !itemsContainer.dataset.branchId) return;
+    let catalog = null;
+    try { catalog = JSON.parse(localStorage.getItem(catalogKey) || "null"); } catch (e) {}
+    if (catalog) renderCatalog(catalog);
+
+    const url = new URL(itemsContainer.dataset.catalogUrl, window.location.origin);
+    if (catalog) url.searchParams.set("since", catalog.version);
+    return fetch(url)
+      .then((res) => (res.status === 304 ? null : res.json()))
+      .then((data) => {
+        if (!data || data.error) return;
+        catalog = mergeCatalog(catalog, data);
+        try { localStorage.setItem(catalogKey, JSON.stringify(catalog)); } catch (e) {}
+        renderCatalog(catalog);
+      })
+      .catch((err) => console.error("Failed to load catalog:", err));
+  }
+
   // === Add-to-cart using clickable item cards ===
-  document.querySelectorAll(".clickable-item").forEach((card) => {
-    card.addEventListener("click", () => {
+  if (itemsContainer) {
+    itemsContainer.addEventListener("click", (e) => {
+      const card = e.target.closest(".clickable-item");
+      if (!card) return;
       addToCart(
         parseInt(card.dataset.id),
         card.dataset.name,
         parseFloat(card.dataset.price)
       );
     });
-  });
+  }
 
   // === Payment Type Toggle ===
   if (paymentSelect && mixedInputs) {
@@ -231,28 +391,21 @@ document.addEventListener("DOMContentLoaded", () => {
         return alert(`Cash + Card must equal final total (${final_total.toFixed(2)})`);
       }
 
-      fetch("/sales/checkout/", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": getCSRFToken(),
-        },
-        body: JSON.stringify({
-          items: cart.map((i) => ({ id: i.id, quantity: i.quantity })),
-          discount,
-          payment_method,
-          customer_id,
-          order_type,
-          delivery_address,
-          table_number,
-          cash_amount,
-          card_amount,
-        }),
+      postCheckout({
+        items: cart.map((i) => ({ id: i.id, quantity: i.quantity })),
+        discount,
+        payment_method,
+        customer_id,
+        order_type,
+        delivery_address,
+        table_number,
+        cash_amount,
+        card_amount,
       })
-        .then((res) => res.json())
         .then((data) => {
           if (data.error) return alert("Error: " + data.error);
           localStorage.removeItem("cart");
+          localStorage.removeItem("checkoutKey");
           alert(`Sale completed!\nFinal Total: ${data.final_total}`);
           window.location.href = `/sales/detail/${data.sale_id}/`;
         })
@@ -260,6 +413,27 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
+  // === Scan-to-cart: scanners type the code and press Enter in the search box ===
+  if (itemSearchInput) {
+    itemSearchInput.addEventListener("keydown", (e) => {
+      if (e.key !== "Enter") return;
+      e.preventDefault();
+      const code = itemSearchInput.value.trim();
+      if (!code) return;
+
+      fetch(`/sales/scan/?code=${encodeURIComponent(code)}`)
+        .then((res) => res.json())
+        .then((data) => {
+          if (data.error) return alert(data.error);
+          if (data.item.stock <= 0) return alert(`${data.item.name} is out of stock`);
+          addToCart(data.item.id, data.item.name, parseFloat(data.item.price));
+          itemSearchInput.value = "";
+          itemSearchInput.dispatchEvent(new Event("input"));
+        })
+        .catch((err) => console.error("Scan lookup failed:", err));
+    });
+  }
+
   // === Live Item Search ===
   if (itemSearchInput) {
     itemSearchInput.addEventListener("input", () => {
@@ -327,6 +501,7 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   // === Initial Render ===
+  loadCatalog();
   renderCart();
   toggleOrderType();
   updateDeliveryAddress();
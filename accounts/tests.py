@@ -1,3 +1,96 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from branches.models import Branch
+from customers.models import Customer
+from inventory.models import Category, Item
+from reports.models import DailySalesReport
+from sales.models import Sale
+from . import metrics
+
+
+User = get_user_model()
+
+
+class DashboardMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.branch = Branch.objects.create(name="Main")
+        self.other = Branch.objects.create(name="Other")
+        self.superuser = User.objects.create_superuser("root", password="pw")
+        self.admin = User.objects.create_user("admin", password="pw", role="admin", branch=self.branch)
+        self.manager = User.objects.create_user("manager", password="pw", role="manager", branch=self.branch)
+        self.cashier = User.objects.create_user("cashier", password="pw", role="cashier", branch=self.branch)
+
+        category = Category.objects.create(name="Drinks", branch=self.branch)
+        Item.objects.create(name="Tea", price=5, stock=2, branch=self.branch, category=category)
+        Item.objects.create(name="Coffee", price=8, stock=50, branch=self.branch, category=category)
+        Item.objects.create(name="Juice", price=6, stock=1, branch=self.other)
+        Customer.objects.create(name="Walk-in regular", branch=self.branch)
+
+        today = self.branch.business_date()
+        for days_ago, gross in ((0, "30.00"), (3, "20.00"), (200, "99.00")):
+            DailySalesReport.objects.create(
+                branch=self.branch, date=today - datetime.timedelta(days=days_ago),
+                total_sales=Decimal(gross), gross_sales=Decimal(gross), total_orders=1,
+            )
+        for method, total in (("cash", "10.00"), ("cash", "5.00"), ("card", "7.00"), ("mixed", "3.00")):
+            Sale.objects.create(user=self.cashier, branch=self.branch, payment_method=method, total=Decimal(total))
+        Sale.objects.create(user=self.cashier, branch=self.branch, payment_method="card", total=Decimal("9.00"),
+                            datetime=timezone.now() - datetime.timedelta(days=200))
+        Sale.objects.create(user=self.admin, branch=self.branch, payment_method="cash", total=Decimal("50.00"))
+
+    def test_superuser_two_queries(self):
+        with self.assertNumQueries(2):
+            data = metrics.overview_metrics(self.superuser)
+        self.assertEqual(data["total_users"], 4)
+        self.assertEqual(data["total_branches"], 2)
+        self.assertEqual(data["low_stock_count"], 2)
+        self.assertEqual(len(data["sales"]), 2)  # the 200 day old row is outside the chart's window
+        self.assertEqual(data["total_sales"], Decimal("149.00"))  # but the total is all time
+
+    def test_branch_roles_two_queries(self):
+        with self.assertNumQueries(2):
+            data = metrics.branch_metrics(self.branch)
+        self.assertEqual(data["branch_sales"], Decimal("50.00"))
+        self.assertEqual(len(data["sales"]), 2)
+        self.assertEqual((data["branch_customers"], data["branch_items"], data["branch_categories"]), (1, 2, 1))
+
+    def test_cashier_one_query(self):
+        with self.assertNumQueries(1):
+            data = metrics.cashier_metrics(self.cashier)
+        self.assertEqual(data["todays_sales"], Decimal("25.00"))
+        self.assertEqual(data["payment_methods"], [2, 1, 1])  # the 200 day old card sale is outside the window
+
+    def test_cached(self):
+        metrics.overview_metrics(self.superuser)
+        metrics.branch_metrics(self.branch)
+        metrics.cashier_metrics(self.cashier)
+        with self.assertNumQueries(0):
+            metrics.overview_metrics(self.superuser)
+            metrics.branch_metrics(self.branch)
+            metrics.cashier_metrics(self.cashier)
+
+    def test_dashboard_per_role(self):
+        # session, user and the user's branch, then the role's metrics
+        for user, expected in ((self.superuser, 4), (self.admin, 5), (self.manager, 5), (self.cashier, 4)):
+            cache.clear()
+            self.client.force_login(user)
+            with self.assertNumQueries(expected):
+                response = self.client.get(reverse("accounts:dashboard"))
+            self.assertEqual(response.status_code, 200)
 
-# Create your tests here.
+    def test_cashier_without_branch(self):
+        self.cashier.branch = None
+        self.cashier.save()
+        Sale.objects.create(user=self.cashier, branch=None, payment_method="cash", total=Decimal("4.00"))
+        self.client.force_login(self.cashier)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("accounts:dashboard"))
+        self.assertEqual((response.context["todays_sales"], response.context["payment_methods"]), (0, [0, 0, 0]))
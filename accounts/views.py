@@ -6,12 +6,9 @@ from django.contrib import messages
 from .forms import ProfileImageForm
 from branches.models import Branch
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
-from sales.models import Sale
-from inventory.models import Category, Item
-from customers.models import Customer
+from django.db.models import Q
 from branches.models import Branch
-from django.utils.timezone import now
+from . import metrics as dashboard_metrics
 
 
 User = get_user_model()
@@ -94,91 +91,66 @@ def dashboard(request):
     user = request.user
 
     # --- Superuser Dashboard (All branches) ---
+    # Figures come from accounts/metrics.py: at most two queries per role over the
+    # last DASHBOARD_WINDOW_DAYS, cached for a short while
     if user.is_superuser:
-        sales_summary = (
-            Sale.objects.values("datetime__date")
-            .annotate(total=Sum("total"))
-            .order_by("datetime__date")
-        )
+        metrics = dashboard_metrics.overview_metrics(user)
 
         context = {
-            "total_users": User.objects.count(),
-            "total_branches": Branch.objects.count(),
-            "total_sales": Sale.objects.aggregate(total=Sum("total"))["total"] or 0,
-            "low_stock_count": Item.objects.filter(stock__lt=5).count(),
-            "sales_dates": [
-                s["datetime__date"].strftime("%Y-%m-%d") for s in sales_summary
-            ],
-            "sales_values": [s["total"] for s in sales_summary],
+            "total_users": metrics["total_users"],
+            "total_branches": metrics["total_branches"],
+            "total_sales": metrics["total_sales"],
+            "low_stock_count": metrics["low_stock_count"],
+            "sales_dates": [day.strftime("%Y-%m-%d") for day, _ in metrics["sales"]],
+            "sales_values": [total for _, total in metrics["sales"]],
+            "window_days": dashboard_metrics.get_window_days(),
         }
         return render(request, "accounts/dashboard_admin.html", context)
 
     # --- Admin Dashboard (Branch only) ---
     elif getattr(user, "role", None) == "admin":
         branch = user.branch
-        sales = (
-            Sale.objects.filter(branch=branch)
-            .values("datetime__date")
-            .annotate(total=Sum("total"))
-            .order_by("datetime__date")
-        )
+        metrics = dashboard_metrics.branch_metrics(branch) if branch else {}
+        sales = metrics.get("sales", [])
 
         context = {
             "branch_name": branch.name if branch else "N/A",
-            "branch_sales": Sale.objects.filter(branch=branch).aggregate(total=Sum("total"))["total"] or 0,
-            "branch_customers": Customer.objects.filter(branch=branch).count(),
-            "branch_items": Item.objects.filter(branch=branch).count(),
-            "branch_categories": Category.objects.filter(branch=request.user.branch).count(),
-
-            "branch_sales_dates": [
-                s["datetime__date"].strftime("%Y-%m-%d") for s in sales
-            ],
-            "branch_sales_values": [s["total"] for s in sales],
+            "branch_sales": metrics.get("branch_sales", 0),
+            "branch_customers": metrics.get("branch_customers", 0),
+            "branch_items": metrics.get("branch_items", 0),
+            "branch_categories": metrics.get("branch_categories", 0),
+
+            "branch_sales_dates": [day.strftime("%Y-%m-%d") for day, _ in sales],
+            "branch_sales_values": [total for _, total in sales],
+            "window_days": dashboard_metrics.get_window_days(),
         }
         return render(request, "accounts/dashboard_branch_admin.html", context)
 
     # --- Manager Dashboard (Branch only) ---
     elif getattr(user, "role", None) == "manager":
         branch = user.branch
-        sales = (
-            Sale.objects.filter(branch=branch)
-            .values("datetime__date")
-            .annotate(total=Sum("total"))
-            .order_by("datetime__date")
-        )
+        metrics = dashboard_metrics.branch_metrics(branch) if branch else {}
+        sales = metrics.get("sales", [])
 
         context = {
             "branch_name": branch.name if branch else "N/A",
-            "branch_sales": Sale.objects.filter(branch=branch).aggregate(total=Sum("total"))["total"] or 0,
-            "branch_customers": Customer.objects.filter(branch=branch).count(),
-            "branch_items": Item.objects.filter(branch=branch).count(),
-            "branch_sales_dates": [
-                s["datetime__date"].strftime("%Y-%m-%d") for s in sales
-            ],
-            "branch_sales_values": [s["total"] for s in sales],
+            "branch_sales": metrics.get("branch_sales", 0),
+            "branch_customers": metrics.get("branch_customers", 0),
+            "branch_items": metrics.get("branch_items", 0),
+            "branch_sales_dates": [day.strftime("%Y-%m-%d") for day, _ in sales],
+            "branch_sales_values": [total for _, total in sales],
+            "window_days": dashboard_metrics.get_window_days(),
         }
         return render(request, "accounts/dashboard_manager.html", context)
 
     # --- Cashier Dashboard (Own sales only) ---
     elif getattr(user, "role", None) == "cashier":
-        branch = user.branch
-
-        today = now().date()
-        today_sales = (
-            Sale.objects.filter(branch=branch, user=user, datetime__date=today)
-            .aggregate(total=Sum("total"))["total"]
-            or 0
-        )
+        metrics = dashboard_metrics.cashier_metrics(user) if user.branch else {}
 
         context = {
-            "todays_sales": today_sales,
-            "payment_methods": [
-                Sale.objects.filter(branch=branch, user=user, payment_method="cash").count(),
-                Sale.objects.filter(branch=branch, user=user, payment_method="card").count(),
-                Sale.objects.filter(branch=branch, user=user)
-                .exclude(payment_method__in=["cash", "card"])
-                .count(),
-            ],
+            "todays_sales": metrics.get("todays_sales", 0),
+            "payment_methods": metrics.get("payment_methods", [0, 0, 0]),
+            "window_days": dashboard_metrics.get_window_days(),
         }
         return render(request, "accounts/dashboard_cashier.html", context)
 
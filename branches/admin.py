@@ -3,5 +3,5 @@ from .models import Branch
 
 @admin.register(Branch)
 class BranchAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "address")
+    list_display = ("id", "name", "address", "day_rollover_hour")
     search_fields = ("name",)
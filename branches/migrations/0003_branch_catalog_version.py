@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0002_branch_city_branch_email_branch_phone_branch_website_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='catalog_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
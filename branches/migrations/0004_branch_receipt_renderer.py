@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0003_branch_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='receipt_renderer',
+            field=models.CharField(choices=[('html', 'PDF (HTML template)'), ('reportlab', 'PDF (fast, drawn directly)'), ('text', 'Plain text'), ('escpos', 'ESC/POS thermal printer')], default='html', max_length=20),
+        ),
+    ]
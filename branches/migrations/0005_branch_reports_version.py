@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0004_branch_receipt_renderer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='reports_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:16
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0005_branch_reports_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='day_rollover_hour',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(23)]),
+        ),
+    ]
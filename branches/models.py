@@ -1,12 +1,48 @@
+import datetime
+
+from django.core.validators import MaxValueValidator
 from django.db import models
+from django.utils import timezone
 
 class Branch(models.Model):
+    # How receipts are rendered for this branch (see sales/receipts.py)
+    RECEIPT_RENDERERS = [
+        ('html', 'PDF (HTML template)'),
+        ('reportlab', 'PDF (fast, drawn directly)'),
+        ('text', 'Plain text'),
+        ('escpos', 'ESC/POS thermal printer'),
+    ]
+
     name = models.CharField(max_length=100)
     address = models.TextField(blank=True, null=True)
     city = models.CharField(max_length=50, blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     website = models.URLField(blank=True, null=True)
+    receipt_renderer = models.CharField(max_length=20, choices=RECEIPT_RENDERERS, default='html')
+    # Bumped on every change to what POS terminals show (see inventory/catalog.py)
+    catalog_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Bumped by checkout, sale edits and item edits; cached report responses carry it (see reports/cache.py)
+    reports_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Local hour the business day starts at: with 4, a sale at 01:30 counts for the day before
+    day_rollover_hour = models.PositiveSmallIntegerField(default=0, validators=[MaxValueValidator(23)])
+
+    # Bumped in the database with F() by other requests: saving an edited branch
+    # must not write back the values it read before those bumps
+    COUNTERS = ("catalog_version", "reports_version")
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
+    def business_date(self, when=None):
+        """The business day (local date, shifted by day_rollover_hour) of `when`, default now."""
+        local = timezone.localtime(when) if when else timezone.localtime()
+        return (local - datetime.timedelta(hours=self.day_rollover_hour)).date()
\ No newline at end of file
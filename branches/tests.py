@@ -1,3 +1,89 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from reports import cube, rollups
+from reports.models import DailySalesReport, HourlySalesCube
+from sales.models import Sale
+from .models import Branch
+
+
+User = get_user_model()
+
+
+class BranchEditTests(TestCase):
+    def setUp(self):
+        self.branch = Branch.objects.create(name="Main")
+        self.superuser = User.objects.create_superuser("root", password="pw")
+
+    def bump_counters(self):
+        # what checkout and item edits do while the branch is open in a form
+        Branch.objects.filter(pk=self.branch.pk).update(
+            catalog_version=F("catalog_version") + 3, reports_version=F("reports_version") + 2,
+        )
+
+    def test_edit_keeps_counters(self):
+        self.client.force_login(self.superuser)
+        self.bump_counters()
+        response = self.client.post(reverse("branches:branch_edit", args=[self.branch.pk]), {
+            "name": "Main street", "receipt_renderer": "text", "day_rollover_hour": "0",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.branch.refresh_from_db()
+        self.assertEqual((self.branch.name, self.branch.receipt_renderer), ("Main street", "text"))
+        self.assertEqual((self.branch.catalog_version, self.branch.reports_version), (3, 2))
+
+    def test_save_keeps_counters(self):
+        # admin and shell saves of a stale instance
+        stale = Branch.objects.get(pk=self.branch.pk)
+        self.bump_counters()
+        stale.name = "Renamed"
+        stale.save()
+        self.branch.refresh_from_db()
+        self.assertEqual(self.branch.name, "Renamed")
+        self.assertEqual((self.branch.catalog_version, self.branch.reports_version), (3, 2))
+
+    def test_rollover_change_moves_sales(self):
+        self.client.force_login(self.superuser)
+        # 02:00 local: the 10th at rollover 0, still the 9th at rollover 4
+        sale = Sale.objects.create(user=self.superuser, branch=self.branch, total=Decimal("5.00"),
+                                   final_total=Decimal("5.00"),
+                                   datetime=timezone.make_aware(datetime.datetime(2026, 3, 10, 2, 0)))
+        rollups.rebuild([self.branch.pk])
+        cube.rebuild([self.branch.pk])
+        self.client.post(reverse("branches:branch_edit", args=[self.branch.pk]), {
+            "name": "Main", "receipt_renderer": "html", "day_rollover_hour": "4",
+        })
+        sale.refresh_from_db()
+        self.assertEqual(sale.business_date, datetime.date(2026, 3, 9))
+        self.assertEqual(list(DailySalesReport.objects.values_list("date", "total_sales")),
+                         [(datetime.date(2026, 3, 9), Decimal("5.00"))])
+        self.assertEqual(list(HourlySalesCube.objects.values_list("date", "hour")), [(datetime.date(2026, 3, 9), 2)])
+        self.branch.refresh_from_db()
+        self.assertEqual(self.branch.reports_version, 1)
 
-# Create your tests here.
+    def test_rollover_rebuild_reads_under_branch_lock(self):
+        self.client.force_login(self.superuser)
+        Sale.objects.create(user=self.superuser, branch=self.branch, total=Decimal("5.00"), final_total=Decimal("5.00"),
+                            datetime=timezone.make_aware(datetime.datetime(2026, 3, 10, 2, 0)))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("branches:branch_edit", args=[self.branch.pk]), {
+                "name": "Main", "receipt_renderer": "html", "day_rollover_hour": "4",
+            })
+        sql = [query["sql"] for query in queries]
+        locks = [index for index, query in enumerate(sql)
+                 if f'FROM "branches_branch" WHERE "branches_branch"."id" IN ({self.branch.pk})' in query]
+        self.assertEqual(len(locks), 2)
+        # each rebuild reads Sale and rewrites its table in the transaction that took the lock
+        for lock, table in zip(locks, ["reports_dailysalesreport", "reports_hourlysalescube"]):
+            self.assertTrue(sql[lock - 1].startswith("SAVEPOINT"))
+            inside = sql[lock:sql.index(f"RELEASE {sql[lock - 1]}")]
+            self.assertTrue(any(query.startswith("SELECT") and '"sales_sale"' in query for query in inside))
+            self.assertTrue(any(query.startswith(f'INSERT INTO "{table}"') for query in inside))
@@ -2,12 +2,26 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from .models import Branch
+from django.db import transaction
 from django.db.models import ProtectedError
+from reports import cache, cube, rollups
 
 
 def is_admin(user):
     return user.is_authenticated and user.is_superuser
 
+
+def _receipt_renderer(value, default="html"):
+    return value if value in dict(Branch.RECEIPT_RENDERERS) else default
+
+
+def _rollover_hour(value, default=0):
+    try:
+        hour = int(value)
+    except (TypeError, ValueError):
+        return default
+    return hour if 0 <= hour <= 23 else default
+
 # -------------------------------
 # List all branches
 # -------------------------------
@@ -29,6 +43,8 @@ def branch_create(request):
         phone = request.POST.get("phone")
         email = request.POST.get("email")
         website = request.POST.get("website")
+        receipt_renderer = _receipt_renderer(request.POST.get("receipt_renderer"))
+        day_rollover_hour = _rollover_hour(request.POST.get("day_rollover_hour"))
 
         if name:
             Branch.objects.create(
@@ -37,11 +53,16 @@ def branch_create(request):
                 city=city,
                 phone=phone,
                 email=email,
-                website=website
+                website=website,
+                receipt_renderer=receipt_renderer,
+                day_rollover_hour=day_rollover_hour
             )
             return redirect("branches:index")
 
-    return render(request, "branches/form.html", {"form_title": "Add New Branch"})
+    return render(request, "branches/form.html", {
+        "form_title": "Add New Branch",
+        "receipt_renderers": Branch.RECEIPT_RENDERERS,
+    })
 
 # -------------------------------
 # Edit branch
@@ -57,12 +78,26 @@ def branch_edit(request, branch_id):
         branch.phone = request.POST.get("phone")
         branch.email = request.POST.get("email")
         branch.website = request.POST.get("website")
-        branch.save()
+        branch.receipt_renderer = _receipt_renderer(request.POST.get("receipt_renderer"), branch.receipt_renderer)
+        rollover_hour = branch.day_rollover_hour
+        branch.day_rollover_hour = _rollover_hour(request.POST.get("day_rollover_hour"), branch.day_rollover_hour)
+        # only the edited columns: the version counters move under us (checkout, item edits)
+        branch.save(update_fields=[
+            "name", "address", "city", "phone", "email", "website", "receipt_renderer", "day_rollover_hour",
+        ])
+        if branch.day_rollover_hour != rollover_hour and rollups.reset_business_dates(branch):
+            # sales near the old and new rollover moved to another business day: as rebuild_sales_rollups,
+            # both in one transaction holding the branch lock checkout takes
+            with transaction.atomic():
+                rollups.rebuild([branch.pk])
+                cube.rebuild([branch.pk])
+            cache.bump(branch.pk)
         return redirect("branches:index")
 
     return render(request, "branches/form.html", {
         "form_title": "Edit Branch",
-        "branch": branch
+        "branch": branch,
+        "receipt_renderers": Branch.RECEIPT_RENDERERS,
     })
 
 # -------------------------------
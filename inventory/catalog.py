@@ -0,0 +1,103 @@
+# inventory/catalog.py
+"""
+Versioned per-branch catalog for POS terminals.
+
+Branch.catalog_version only ever goes up. Whatever changes what a terminal
+shows (an item's price, stock, name or image, a category or supplier rename)
+takes the next version of the branch and stamps it on every item it touched
+(Item.version). Items that leave a branch leave a CatalogTombstone.
+
+A terminal that already holds version N then only needs the items with
+version > N and the tombstones after N, instead of the whole catalog.
+
+A version is always taken in the same transaction that writes the rows it
+stamps (Item.save(), the category/supplier signal handlers, checkout), and
+taking it updates the branch row, which holds that row's lock until commit.
+So versions of a branch become visible in order, each together with its rows.
+Code that calls next_version() must keep to this, or a snapshot can report a
+version whose rows are not committed yet and a delta after it skips them.
+"""
+from django.core.files.storage import default_storage
+from django.db.models import F
+
+from branches.models import Branch
+from .models import CatalogTombstone, Category, Item
+
+
+ITEM_FIELDS = ["id", "name", "price", "stock", "category_id", "supplier", "sku", "barcode", "image"]
+
+
+def next_version(branch_id):
+    """Take the next catalog version of a branch, inside the transaction that writes the stamped rows."""
+    Branch.objects.filter(pk=branch_id).update(catalog_version=F("catalog_version") + 1)
+    return current_version(branch_id)
+
+
+def current_version(branch_id):
+    version = Branch.objects.filter(pk=branch_id).values_list("catalog_version", flat=True).first()
+    return version or 0
+
+
+def stamp_item(item):
+    """Called from Item.save(): give the item a fresh version (and tombstone it if it changed branch)."""
+    if item.pk:
+        old_branch_id = Item.objects.filter(pk=item.pk).values_list("branch_id", flat=True).first()
+        if old_branch_id and old_branch_id != item.branch_id:
+            add_tombstone(old_branch_id, item.pk)
+    if item.branch_id:
+        item.version = next_version(item.branch_id)
+
+
+def stamp_items(queryset):
+    """Give every item of the queryset a fresh version of its branch (one version per branch)."""
+    branch_ids = set(queryset.values_list("branch_id", flat=True))
+    for branch_id in branch_ids:
+        queryset.filter(branch_id=branch_id).update(version=next_version(branch_id))
+
+
+def add_tombstone(branch_id, item_id):
+    CatalogTombstone.objects.create(branch_id=branch_id, item_id=item_id, version=next_version(branch_id))
+
+
+def _item_row(row):
+    row = list(row)
+    row[2] = str(row[2])                                          # price
+    row[8] = default_storage.url(row[8]) if row[8] else None      # image
+    return row
+
+
+def snapshot(branch, since=None):
+    """
+    Catalog of a branch as compact JSON-ready data.
+    - since=None -> the full catalog.
+    - since=N    -> only items changed after version N plus ids removed since then.
+    Falls back to a full catalog if N is unknown (e.g. newer than the branch's version).
+    The version is read before the items: a change committed in between is sent
+    now and again in the next delta. Versions and their rows commit together
+    (see above), so every change up to the returned version is included.
+    """
+    version = current_version(branch.pk)
+    full = since is None or since < 0 or since > version
+
+    items = Item.objects.filter(branch=branch)
+    deleted = []
+    if not full:
+        items = items.filter(version__gt=since)
+        deleted = list(
+            CatalogTombstone.objects.filter(branch_id=branch.pk, version__gt=since)
+            .values_list("item_id", flat=True)
+        )
+
+    rows = items.order_by("id").values_list(
+        "id", "name", "price", "stock", "category_id", "supplier__name", "sku", "barcode", "image"
+    )
+    return {
+        "branch": branch.pk,
+        "version": version,
+        "since": None if full else since,
+        "full": full,
+        "categories": list(Category.objects.filter(branch=branch).values_list("id", "name")),
+        "fields": ITEM_FIELDS,
+        "items": [_item_row(row) for row in rows],
+        "deleted": deleted,
+    }
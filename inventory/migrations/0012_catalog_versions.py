@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0003_branch_catalog_version'),
+        ('inventory', '0011_alter_category_options_alter_item_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch_id', models.PositiveBigIntegerField()),
+                ('item_id', models.PositiveBigIntegerField()),
+                ('version', models.PositiveBigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['branch', 'version'], name='inventory_i_branch__5142d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogtombstone',
+            index=models.Index(fields=['branch_id', 'version'], name='inventory_c_branch__babe49_idx'),
+        ),
+    ]
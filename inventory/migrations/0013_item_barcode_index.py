@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0003_branch_catalog_version'),
+        ('inventory', '0012_catalog_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['branch', 'barcode'], name='inventory_i_branch__c50db1_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_item_barcode_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='reorder_point',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from branches.models import Branch
 from django.contrib.auth import get_user_model
 from django.conf import settings
@@ -54,13 +54,52 @@ class Item(models.Model):
     image = models.ImageField(upload_to='items/', blank=True, null=True)
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
     supplier = models.ForeignKey(Supplier, null=True, blank=True, on_delete=models.PROTECT)  
+    # Branch catalog version of the last change to this item (see inventory/catalog.py)
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Stock level at which to reorder, from recent sales (reports/reorder.py); null until first computed
+    reorder_point = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=["branch", "version"]),
+            # scan lookups are always within one branch
+            models.Index(fields=["branch", "barcode"]),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .catalog import stamp_item
+
+        # the version and the row it stamps commit together (see inventory/catalog.py)
+        with transaction.atomic():
+            stamp_item(self)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+            super().save(*args, **kwargs)
+
+
+# -----------------------------
+# Catalog Tombstone
+# -----------------------------
+class CatalogTombstone(models.Model):
+    """
+    An item that left a branch catalog (deleted or moved to another branch),
+    so terminals syncing deltas can drop it. Plain ids instead of foreign keys:
+    the item is gone and the branch may be on its way out too.
+    """
+    branch_id = models.PositiveBigIntegerField()
+    item_id = models.PositiveBigIntegerField()
+    version = models.PositiveBigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["branch_id", "version"])]
+
+    def __str__(self):
+        return f"Item {self.item_id} removed from branch {self.branch_id} at v{self.version}"
+
 
 # -----------------------------
 # Activity Log
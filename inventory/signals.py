@@ -0,0 +1,32 @@
+# inventory/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .catalog import add_tombstone, next_version, stamp_items
+from .models import Category, Item, Supplier
+
+
+# Item saves are stamped in Item.save(); deletes leave a tombstone for delta sync
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    if instance.branch_id:
+        add_tombstone(instance.branch_id, instance.pk)
+
+
+# Categories are listed in every catalog response, so any change is a new version.
+# pre_delete: its items are un-categorized by SET_NULL, which bypasses Item.save().
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    with transaction.atomic():
+        version = next_version(instance.branch_id)
+        Item.objects.filter(category=instance).update(version=version)
+
+
+# Renaming a supplier changes how its items show (and are searched) on the POS
+@receiver(post_save, sender=Supplier)
+def supplier_saved(sender, instance, created, **kwargs):
+    if not created:
+        with transaction.atomic():
+            stamp_items(Item.objects.filter(supplier=instance))
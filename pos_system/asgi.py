@@ -3,6 +3,11 @@ ASGI config for pos_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn pos_system.asgi:application``) so
+the live sales feed (/reports/live/feed/, Server-Sent Events) keeps each open
+dashboard on a coroutine instead of a worker thread. With several worker
+processes set NOTIFICATION_SOCKET_DIR so events reach every one of them.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,160 @@
+# pos_system/rendering.py
+"""
+Shared PDF rendering service.
+
+xhtml2pdf is pure Python and CPU bound: a long branch report can hold a web
+worker (and the GIL) for seconds. Templates are still rendered to HTML in the
+caller, where the database and model instances are available, but the HTML to
+PDF conversion runs in a bounded ProcessPoolExecutor:
+
+  - PDF_RENDER_WORKERS      processes in the pool (0 renders inline, e.g. in tests)
+  - PDF_RENDER_MAX_QUEUE    jobs queued or running at once; beyond that
+                            submit() raises RenderBusy instead of piling up work
+  - PDF_RENDER_TIMEOUT      seconds a caller waits for its PDF (RenderTimeout)
+
+Use render_pdf() from sync views and arender_pdf() from async ones.
+"""
+import asyncio
+import atexit
+import io
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+
+class RenderError(Exception):
+    pass
+
+
+class RenderBusy(RenderError):
+    """The render queue is full; the caller should retry later (503)."""
+
+
+class RenderTimeout(RenderError):
+    """The PDF was not ready within PDF_RENDER_TIMEOUT (504)."""
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def html_to_pdf(html):
+    """Convert HTML to PDF bytes. Runs in a pool process, so it must not touch Django."""
+    from xhtml2pdf import pisa
+
+    out = io.BytesIO()
+    status = pisa.CreatePDF(io.StringIO(html), dest=out)
+    if status.err:
+        raise RenderError("Error generating PDF")
+    return out.getvalue()
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # spawn, not fork: the web process has threads (and DB connections)
+                # that must not be copied into the workers
+                _executor = ProcessPoolExecutor(
+                    max_workers=getattr(settings, "PDF_RENDER_WORKERS", 2),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                _slots = threading.BoundedSemaphore(getattr(settings, "PDF_RENDER_MAX_QUEUE", 8))
+    return _executor, _slots
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown)
+
+
+def submit_html(html):
+    """Queue an HTML document for conversion. Returns a Future of the PDF bytes."""
+    if getattr(settings, "PDF_RENDER_WORKERS", 2) <= 0:
+        future = Future()
+        try:
+            future.set_result(html_to_pdf(html))
+        except RenderError as e:
+            future.set_exception(e)
+        return future
+
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise RenderBusy("PDF renderer is busy, try again shortly")
+    try:
+        future = executor.submit(html_to_pdf, html)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        slots.release()
+        shutdown()
+        raise RenderError("PDF renderer restarted, try again")
+    # The slot is held until the job really finishes, even if its caller timed out
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def submit(template_name, context):
+    """Render a template to HTML here and queue its PDF conversion. Returns a Future."""
+    return submit_html(render_to_string(template_name, context))
+
+
+def _timeout(timeout):
+    return getattr(settings, "PDF_RENDER_TIMEOUT", 30) if timeout is None else timeout
+
+
+def render_pdf(template_name, context, timeout=None):
+    """PDF bytes of a template, waiting at most PDF_RENDER_TIMEOUT seconds."""
+    return render_html_pdf(render_to_string(template_name, context), timeout)
+
+
+def render_html_pdf(html, timeout=None):
+    """PDF bytes of an HTML document already rendered by the caller."""
+    future = submit_html(html)
+    try:
+        return future.result(timeout=_timeout(timeout))
+    except TimeoutError:
+        future.cancel()
+        raise RenderTimeout("PDF rendering timed out")
+    except BrokenProcessPool:
+        shutdown()
+        raise RenderError("PDF renderer restarted, try again")
+
+
+async def arender_pdf(template_name, context, timeout=None):
+    """Async version of render_pdf(): the event loop is free while the pool works."""
+    from asgiref.sync import sync_to_async
+
+    html = await sync_to_async(render_to_string)(template_name, context)
+    future = submit_html(html)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), _timeout(timeout))
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise RenderTimeout("PDF rendering timed out")
+    except BrokenProcessPool:
+        shutdown()
+        raise RenderError("PDF renderer restarted, try again")
+
+
+def error_response(exc):
+    """HttpResponse for a RenderError raised while serving a PDF."""
+    if isinstance(exc, RenderBusy):
+        response = HttpResponse(str(exc), status=503)
+        response["Retry-After"] = "5"
+        return response
+    if isinstance(exc, RenderTimeout):
+        return HttpResponse(str(exc), status=504)
+    return HttpResponse("Error generating PDF", status=500)
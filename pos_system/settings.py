@@ -145,3 +145,86 @@ AUTH_USER_MODEL = 'accounts.User'
 MEDIA_URL = '/media/'
 # This is the folder on disk where uploaded files will be stored.
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Checkout idempotency keys (see sales/idempotency.py):
+# how long a stored checkout response can be replayed (seconds) and how many are kept.
+CHECKOUT_IDEMPOTENCY_TTL = 24 * 60 * 60
+CHECKOUT_IDEMPOTENCY_MAX_KEYS = 50000
+
+# Batch checkout for offline terminals (sales:checkout_batch):
+# max sales per request and how many sales share one transaction.
+SALES_BATCH_MAX_SIZE = 1000
+SALES_BATCH_CHUNK_SIZE = 100
+
+# Receipt PDF cache (see sales/receipts.py): where rendered receipts are kept
+# and how much disk they may use before the least recently used are evicted.
+RECEIPT_CACHE_DIR = BASE_DIR / 'cache' / 'receipts'
+RECEIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Plain text / ESC-POS receipts: printer columns and character encoding
+RECEIPT_TEXT_WIDTH = 42
+RECEIPT_ESCPOS_ENCODING = 'cp437'
+
+# PDF rendering pool (pos_system/rendering.py): worker processes (0 = render inline),
+# max jobs queued or running before requests get a 503, and seconds a request waits
+PDF_RENDER_WORKERS = 2
+PDF_RENDER_MAX_QUEUE = 8
+PDF_RENDER_TIMEOUT = 30
+
+# Report exports: rows fetched per database round trip while streaming
+EXPORT_CHUNK_SIZE = 2000
+# Excel exports of more sales, lines or items than this are queued as export jobs instead of built in the request
+EXPORT_XLSX_INLINE_ROWS = 20000
+# Background export jobs (manage.py run_export_jobs): output files and how long they are kept
+EXPORT_ROOT = BASE_DIR / 'cache' / 'exports'
+EXPORT_JOB_TTL = 24 * 60 * 60
+# A job still running after this many seconds is taken as dead (its worker stopped) and marked failed
+EXPORT_JOB_TIMEOUT = 2 * 60 * 60
+# Columnar sales history for analytics (manage.py export_sales_columnar)
+ANALYTICS_EXPORT_ROOT = BASE_DIR / 'cache' / 'analytics'
+# Cached report API responses (reports/cache.py): cache alias and seconds an entry is kept.
+# Entries are invalidated by Branch.reports_version; use a shared cache (e.g. Redis) with several workers.
+REPORTS_CACHE_ALIAS = 'default'
+REPORTS_CACHE_TIMEOUT = 60 * 60
+# Dashboard forecast (reports/forecast.py): days of history used, days forecast,
+# exponential smoothing factor and the |z-score| from which a day is flagged
+FORECAST_HISTORY_DAYS = 182
+FORECAST_HORIZON = 14
+FORECAST_ALPHA = 0.3
+FORECAST_Z_THRESHOLD = 3.0
+# Reorder points and low stock alerts (manage.py refresh_inventory_alerts, reports/reorder.py):
+# days of sales the velocity is measured over, supplier lead time and safety stock in days,
+# days of stock a suggested order should add, the lowest reorder point of any item (above 0,
+# so an item with no recent sales still alerts when it runs out), and the point of items
+# whose reorder point has not been computed yet
+REORDER_WINDOW_DAYS = 28
+REORDER_LEAD_TIME_DAYS = 3
+REORDER_SAFETY_DAYS = 2
+REORDER_COVER_DAYS = 14
+REORDER_MIN_POINT = 1
+REORDER_DEFAULT_POINT = 10
+# Events kept per branch by the in-process notification channels (reports/notifications.py)
+NOTIFICATION_BUFFER = 200
+# Frequently bought together (manage.py compute_item_associations, reports/baskets.py):
+# days of sales analysed, sales a pair needs before it counts, partners kept per item
+BASKET_WINDOW_DAYS = 90
+BASKET_MIN_COUNT = 3
+BASKET_TOP_K = 10
+# Live top sellers and ticket percentiles (reports/sketches.py): item counters kept per branch,
+# t-digest compression, and how often (sales / seconds) the summaries are saved to LiveSketch
+# (one row per worker process) and the other workers' rows are re-read
+LIVE_TOP_CAPACITY = 200
+LIVE_TDIGEST_COMPRESSION = 100
+LIVE_PERSIST_EVERY = 25
+LIVE_PERSIST_SECONDS = 60
+# hours after its last save a LiveSketch row is deleted (it is only read on its own business day)
+LIVE_SKETCH_KEEP_HOURS = 48
+# Role dashboards (accounts/metrics.py): business days of sales they cover and seconds their figures are cached
+DASHBOARD_WINDOW_DAYS = 90
+DASHBOARD_CACHE_TIMEOUT = 60
+# Several worker processes: directory of the Unix sockets they pass notifications through
+# (reports/notifications.py); None keeps them in-process
+NOTIFICATION_SOCKET_DIR = None
+# Live sales feed (Server-Sent Events, reports/live.py): seconds between keepalive comments
+# and how long one stream stays open before the browser reconnects
+LIVE_FEED_HEARTBEAT = 15
+LIVE_FEED_MAX_SECONDS = 300
@@ -1,13 +1,45 @@
 from django.contrib import admin
-from .models import InventoryAlert, DailySalesReport
+from .models import InventoryAlert, DailySalesReport, ExportJob, HourlySalesCube, ItemAssociation, ItemDailySales, LiveSketch
 
 @admin.register(InventoryAlert)
 class InventoryAlertAdmin(admin.ModelAdmin):
-    list_display = ("id", "item", "stock_level", "threshold", "created_at")
-    list_filter = ("created_at",)
-    ordering = ("-created_at",)
+    list_display = ("id", "item", "branch", "supplier", "stock_level", "threshold", "days_of_cover", "suggested_quantity", "updated_at")
+    list_filter = ("branch", "supplier")
+    ordering = ("days_of_cover",)
 
 @admin.register(DailySalesReport)
 class DailySalesReportAdmin(admin.ModelAdmin):
-    list_display = ("id", "date", "total_sales", "total_orders", "top_item", "generated_at")
+    list_display = ("id", "date", "branch", "total_sales", "gross_sales", "total_orders", "top_item", "updated_at")
+    list_filter = ("branch",)
+    ordering = ("-date",)
+
+@admin.register(HourlySalesCube)
+class HourlySalesCubeAdmin(admin.ModelAdmin):
+    list_display = ("date", "hour", "branch", "payment_method", "order_type", "orders", "final_total")
+    list_filter = ("branch", "payment_method", "order_type")
+    ordering = ("-date", "-hour")
+
+@admin.register(ItemDailySales)
+class ItemDailySalesAdmin(admin.ModelAdmin):
+    list_display = ("date", "branch", "item", "quantity", "revenue")
+    list_filter = ("branch",)
+    ordering = ("-date",)
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "branch", "format", "status", "progress", "rows_total", "created_at", "finished_at")
+    list_filter = ("status", "format")
+    ordering = ("-created_at",)
+
+@admin.register(ItemAssociation)
+class ItemAssociationAdmin(admin.ModelAdmin):
+    list_display = ("item", "other", "rank", "pair_count", "support", "confidence", "lift", "branch", "computed_at")
+    list_filter = ("branch",)
+    ordering = ("item", "rank")
+
+@admin.register(LiveSketch)
+class LiveSketchAdmin(admin.ModelAdmin):
+    list_display = ("date", "branch", "sales", "updated_at")
+    list_filter = ("branch",)
     ordering = ("-date",)
+    exclude = ("state",)
@@ -0,0 +1,134 @@
+# reports/baskets.py
+"""
+Frequently bought together (market basket analysis).
+
+`manage.py compute_item_associations` reads a branch's SaleItem rows of the
+last BASKET_WINDOW_DAYS business days as (sale, item) pairs in one query and turns them
+into a sparse 0/1 sales x items matrix X (SciPy CSR). Then:
+
+    X.T @ X        items x items: how many sales hold both items
+                   (its diagonal: how many sales hold each item)
+
+and for every pair bought together in at least BASKET_MIN_COUNT sales:
+
+    support    = both / sales
+    confidence = both / sales with the item
+    lift       = confidence / (sales with the other item / sales)
+
+Each item's BASKET_TOP_K partners by lift (then confidence) are stored in
+ItemAssociation, so suggest() only reads a few indexed rows per cart item
+however long the history is.
+"""
+import datetime
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from branches.models import Branch
+from sales.models import SaleItem
+from .models import ItemAssociation
+
+
+def get_settings():
+    return {
+        "window": getattr(settings, "BASKET_WINDOW_DAYS", 90),
+        "min_count": getattr(settings, "BASKET_MIN_COUNT", 3),
+        "top_k": getattr(settings, "BASKET_TOP_K", 10),
+    }
+
+
+def basket_matrix(branch, since):
+    """(X as CSR sales x items, item ids per column) of the branch's sales since business date `since`."""
+    from scipy import sparse
+
+    pairs = np.array(
+        list(SaleItem.objects.filter(sale__branch=branch, sale__business_date__gte=since).values_list("sale_id", "item_id")),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    sale_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    item_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (rows, columns)), shape=(len(sale_ids), len(item_ids)),
+    )
+    # an item on two lines of one sale is still one basket
+    matrix.data[:] = 1
+    return matrix, item_ids
+
+
+def associations(matrix, min_count, top_k):
+    """
+    Arrays (item column, other column, rank, count, support, confidence, lift)
+    of each item's top_k partners, from the sparse co-occurrence matrix.
+    """
+    baskets = matrix.shape[0]
+    pairs = (matrix.T @ matrix).tocoo()
+    counts = matrix.sum(axis=0).A1.astype(float)                  # sales holding each item
+
+    keep = (pairs.row != pairs.col) & (pairs.data >= min_count)
+    item, other, both = pairs.row[keep], pairs.col[keep], pairs.data[keep].astype(float)
+    support = both / baskets if baskets else both
+    confidence = both / counts[item]
+    lift = confidence * baskets / counts[other]
+
+    # best first within each item, then rank = position inside the item's group
+    order = np.lexsort((other, -confidence, -lift, item))
+    item, other, both, support, confidence, lift = (
+        array[order] for array in (item, other, both, support, confidence, lift)
+    )
+    group_start = np.flatnonzero(np.r_[True, item[1:] != item[:-1]]) if len(item) else np.empty(0, dtype=np.int64)
+    rank = np.arange(len(item)) - np.repeat(group_start, np.diff(np.r_[group_start, len(item)]))
+    top = rank < top_k
+    return item[top], other[top], rank[top], both[top].astype(np.int64), support[top], confidence[top], lift[top]
+
+
+def compute(branch, now=None):
+    """Recompute the branch's ItemAssociation rows. Returns rows written."""
+    options = get_settings()
+    since = branch.business_date(now) - datetime.timedelta(days=options["window"])
+
+    matrix, item_ids = basket_matrix(branch, since)
+    rows = []
+    if matrix.shape[0]:
+        for item, other, rank, count, support, confidence, lift in zip(
+            *(array.tolist() for array in associations(matrix, options["min_count"], options["top_k"]))
+        ):
+            rows.append(ItemAssociation(
+                branch=branch, item_id=int(item_ids[item]), other_id=int(item_ids[other]), rank=rank,
+                pair_count=count, support=support, confidence=confidence, lift=lift,
+            ))
+    with transaction.atomic():
+        ItemAssociation.objects.filter(branch=branch).delete()
+        ItemAssociation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def compute_all(branch_ids=None):
+    """{branch id: rows written} for the given branches (all if None)."""
+    branches = Branch.objects.all()
+    if branch_ids:
+        branches = branches.filter(pk__in=branch_ids)
+    return {branch.pk: compute(branch) for branch in branches}
+
+
+def suggest(branch, cart_item_ids, limit=5):
+    """
+    Items to offer with a cart: partners of the cart's items that are not in
+    it and in stock, each once (best lift), best first. Reads at most
+    BASKET_TOP_K rows per cart item.
+    """
+    cart_item_ids = list(cart_item_ids)
+    rows = (
+        ItemAssociation.objects.filter(branch=branch, item_id__in=cart_item_ids)
+        .exclude(other_id__in=cart_item_ids)
+        .filter(other__stock__gt=0)
+        .select_related("other")
+        .order_by("-lift", "-confidence", "other_id")
+    )
+    suggestions = {}
+    for row in rows:
+        if row.other_id not in suggestions:
+            suggestions[row.other_id] = row
+            if len(suggestions) >= limit:
+                break
+    return list(suggestions.values())
@@ -0,0 +1,91 @@
+# reports/cache.py
+"""
+Cached report responses.
+
+Branch.reports_version goes up whenever something a report reads changes:
+a checkout (sales_recorded), a sale edited or deleted, an item saved or
+deleted (see reports/signals.py). A cached response is keyed by endpoint,
+branch, that version, the branch's business date (today is aggregated live,
+and "today" moves) and the query parameters, so a bump makes every entry of the branch
+unreachable and they simply expire; nothing has to be deleted.
+
+The same key is sent as the ETag: the dashboard sends it back with
+If-None-Match and gets a bodiless 304 while the branch is unchanged.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from branches.models import Branch
+
+
+def get_timeout():
+    return getattr(settings, "REPORTS_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_cache():
+    return caches[getattr(settings, "REPORTS_CACHE_ALIAS", "default")]
+
+
+def bump(branch_id):
+    """Invalidate every cached report of a branch."""
+    if branch_id:
+        Branch.objects.filter(pk=branch_id).update(reports_version=F("reports_version") + 1)
+
+
+def bump_all():
+    Branch.objects.update(reports_version=F("reports_version") + 1)
+
+
+def response_key(name, branch, params, args=(), kwargs=None):
+    """ETag of a report response; also its cache key."""
+    parts = [name, branch.business_date().isoformat(), repr(args), repr(sorted((kwargs or {}).items()))]
+    parts += [f"{key}={value}" for key, value in sorted(params.lists()) if key != "branch_id"]
+    digest = hashlib.sha1("\n".join(parts).encode()).hexdigest()[:16]
+    return f'"reports-{branch.pk}-{branch.reports_version}-{digest}"'
+
+
+def cached_report(resolve_branch):
+    """
+    Decorator for GET report views whose response depends only on the
+    branch and the request parameters. `resolve_branch(request)` does the
+    view's own permission check; requests it refuses (None) go straight to
+    the view. The branch it returns is left on request.report_branch, so the
+    view's own call need not look it up again. Only 200 responses are cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            branch = resolve_branch(request)
+            if branch is None:
+                return view(request, *args, **kwargs)
+            request.report_branch = branch
+
+            etag = response_key(view.__name__, branch, request.GET, args, kwargs)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+
+            store = get_cache()
+            key = "reports:" + etag.strip('"')
+            cached = store.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                store.set(key, (response.content, response["Content-Type"]), get_timeout())
+            response["ETag"] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
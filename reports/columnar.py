@@ -0,0 +1,263 @@
+# reports/columnar.py
+"""
+Columnar export of sales history for analytics (Parquet or Arrow IPC).
+
+Sale and SaleItem rows are written under ANALYTICS_EXPORT_ROOT, partitioned
+by branch and business month (of Sale.business_date) in the hive layout BI tools read directly:
+
+    sales/branch_id=3/month=2025-06/part.parquet
+    sale_items/branch_id=3/month=2025-06/part.parquet
+
+Money columns are decimal128, datetimes UTC timestamps. Each partition is
+streamed from the database chunk by chunk into record batches.
+
+A run is incremental: one grouped query per table fingerprints every
+partition (row count, highest id, sums of the money / quantity columns) and
+only partitions whose fingerprint differs from the last run's manifest are
+rewritten; partitions that no longer have rows are removed. An edit that
+leaves every fingerprint column unchanged is not noticed, so `full=True`
+rewrites everything.
+
+pyarrow is only imported when an export runs.
+"""
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from sales.models import Sale, SaleItem
+from .exports import get_chunk_size
+
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+MANIFEST = "_manifest.json"
+
+
+class ColumnarError(Exception):
+    pass
+
+
+def get_root():
+    return Path(getattr(settings, "ANALYTICS_EXPORT_ROOT", Path(settings.BASE_DIR) / "cache" / "analytics"))
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ColumnarError("pyarrow is not installed (pip install pyarrow)")
+    return pyarrow
+
+
+# -------------------------------
+# Tables
+# -------------------------------
+def _schemas(pa):
+    money = pa.decimal128(12, 2)
+    utc = pa.timestamp("us", tz="UTC")
+    sales = pa.schema([
+        ("id", pa.int64()),
+        ("branch_id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("customer_id", pa.int64()),
+        ("datetime", utc),
+        ("order_type", pa.string()),
+        ("table_number", pa.string()),
+        ("payment_method", pa.string()),
+        ("total", money),
+        ("discount_percent", pa.decimal128(5, 2)),
+        ("discount_amount", money),
+        ("final_total", money),
+        ("cash_amount", pa.decimal128(10, 2)),
+        ("card_amount", pa.decimal128(10, 2)),
+    ])
+    items = pa.schema([
+        ("id", pa.int64()),
+        ("sale_id", pa.int64()),
+        ("branch_id", pa.int64()),
+        ("sale_datetime", utc),
+        ("item_id", pa.int64()),
+        ("item_name", pa.string()),
+        ("quantity", pa.int64()),
+        ("price", pa.decimal128(10, 2)),
+        ("line_total", money),
+    ])
+    return {"sales": sales, "sale_items": items}
+
+
+def _sale_rows(branch_id, start, end):
+    rows = (
+        Sale.objects.filter(branch_id=branch_id, business_date__gte=start, business_date__lt=end)
+        .order_by("datetime", "id")
+        .values_list(
+            "id", "branch_id", "user_id", "customer_id", "datetime", "order_type", "table_number",
+            "payment_method", "total", "discount_percent", "discount_amount", "final_total",
+            "cash_amount", "card_amount",
+        )
+    )
+    return rows.iterator(chunk_size=get_chunk_size())
+
+
+def _item_rows(branch_id, start, end):
+    rows = (
+        SaleItem.objects.filter(
+            sale__branch_id=branch_id, sale__business_date__gte=start, sale__business_date__lt=end,
+        )
+        .order_by("sale__datetime", "sale_id", "id")
+        .values_list("id", "sale_id", "sale__branch_id", "sale__datetime", "item_id", "item__name", "quantity", "price")
+    )
+    for row in rows.iterator(chunk_size=get_chunk_size()):
+        yield row + (row[7] * row[6],)
+
+
+QUERIES = {"sales": _sale_rows, "sale_items": _item_rows}
+
+
+def fingerprints(branch_ids=None):
+    """{(table, branch id, "YYYY-MM"): [fingerprint]} for every partition that has rows."""
+    sales = Sale.objects.filter(branch__isnull=False)
+    items = SaleItem.objects.filter(sale__branch__isnull=False)
+    if branch_ids:
+        sales = sales.filter(branch_id__in=branch_ids)
+        items = items.filter(sale__branch_id__in=branch_ids)
+
+    result = {}
+    rows = (
+        sales.annotate(month=TruncMonth("business_date"))
+        .values("branch_id", "month")
+        .annotate(rows=Count("id"), last=Max("id"), final=Sum("final_total"), gross=Sum("total"))
+    )
+    for row in rows:
+        key = ("sales", row["branch_id"], _month_key(row["month"]))
+        result[key] = [row["rows"], row["last"], str(row["final"]), str(row["gross"])]
+    rows = (
+        items.annotate(month=TruncMonth("sale__business_date"))
+        .values("sale__branch_id", "month")
+        .annotate(rows=Count("id"), last=Max("id"), quantity=Sum("quantity"), price=Sum("price"))
+    )
+    for row in rows:
+        key = ("sale_items", row["sale__branch_id"], _month_key(row["month"]))
+        result[key] = [row["rows"], row["last"], row["quantity"], str(row["price"])]
+    return result
+
+
+def _month_key(value):
+    return value.strftime("%Y-%m")
+
+
+def month_bounds(month):
+    """[first day, first day of the next month) of a month given as "YYYY-MM"."""
+    first = datetime.date.fromisoformat(f"{month}-01")
+    return first, (first + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_dir(root, table, branch_id, month):
+    return root / table / f"branch_id={branch_id}" / f"month={month}"
+
+
+# -------------------------------
+# Export
+# -------------------------------
+def write_partition(path, table, branch_id, month, format="parquet", chunk_size=None):
+    """Stream one partition into `path` (written to a temporary file, then moved). Returns rows written."""
+    pa = _pyarrow()
+    schema = _schemas(pa)[table]
+    chunk_size = chunk_size or get_chunk_size()
+    start, end = month_bounds(month)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    written = 0
+    try:
+        if format == "parquet":
+            writer = pa.parquet.ParquetWriter(tmp, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(tmp, schema)
+        with writer:
+            chunk = []
+            for row in QUERIES[table](branch_id, start, end):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    writer.write_batch(_batch(pa, schema, chunk))
+                    written += len(chunk)
+                    chunk = []
+            if chunk or not written:
+                writer.write_batch(_batch(pa, schema, chunk))
+                written += len(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return written
+
+
+def _batch(pa, schema, rows):
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.record_batch(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+    )
+
+
+def export(root=None, format="parquet", branch_ids=None, full=False):
+    """
+    Bring the partitions under `root` up to date. Returns a dict with the
+    partitions written / removed / unchanged and the rows written.
+    """
+    if format not in FORMATS:
+        raise ColumnarError(f"Unknown format: {format}")
+    _pyarrow()
+    root = Path(root) if root else get_root()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest_path = root / MANIFEST
+
+    previous = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        previous = manifest["partitions"]
+        if manifest["format"] != format:
+            if branch_ids:
+                raise ColumnarError("Changing format needs an export of every branch")
+            for table in QUERIES:
+                shutil.rmtree(root / table, ignore_errors=True)
+            previous = {}
+
+    partitions = {"/".join(map(str, key)): value for key, value in fingerprints(branch_ids).items()}
+    if branch_ids:
+        # partitions of the other branches are kept as they are
+        wanted = {str(branch_id) for branch_id in branch_ids}
+        others = {key: value for key, value in previous.items() if key.split("/")[1] not in wanted}
+        partitions.update(others)
+    else:
+        others = {}
+    unchanged = others if full else previous
+
+    stats = {"written": 0, "removed": 0, "unchanged": 0, "rows": 0}
+    extension = FORMATS[format]
+    for key, fingerprint in sorted(partitions.items()):
+        table, branch_id, month = key.split("/")
+        if unchanged.get(key) == fingerprint:
+            stats["unchanged"] += 1
+            continue
+        path = partition_dir(root, table, branch_id, month) / f"part.{extension}"
+        stats["rows"] += write_partition(path, table, int(branch_id), month, format)
+        stats["written"] += 1
+    for key in set(previous) - set(partitions):
+        shutil.rmtree(partition_dir(root, *key.split("/")), ignore_errors=True)
+        stats["removed"] += 1
+
+    manifest_path.write_text(json.dumps({
+        "format": format,
+        "exported_at": timezone.now().isoformat(),
+        "partitions": partitions,
+    }, indent=1, sort_keys=True))
+    return stats
@@ -0,0 +1,243 @@
+# reports/cube.py
+"""
+Hourly sales cube.
+
+HourlySalesCube has one cell per (branch, business date, local hour, payment
+method, order type) holding the sums of the Sale money fields and an order count.
+Checkout adds each sale to its cell in the same transaction (reports/signals.py),
+edited or deleted sales have their days recomputed there, and
+`manage.py rebuild_sales_rollups` recomputes cells from Sale.
+
+query() answers any slice of the cube: filter on the dimensions, group by
+any of them (hour of day included), per day / week / month / year or as one
+total for the whole range, without reading Sale.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DateField, F, FilteredRelation, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, ExtractHour, NullIf, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from branches.models import Branch
+from sales.models import Sale
+from .models import HourlySalesCube
+from .rollups import increment_row, lock_branches
+
+
+ZERO = Decimal("0.00")
+DIMENSIONS = ("hour", "payment_method", "order_type")
+MEASURES = ("orders", "total", "discount_amount", "final_total", "cash_amount", "card_amount")
+MONEY_MEASURES = MEASURES[1:]
+PERIODS = {"day": None, "week": TruncWeek, "month": TruncMonth, "year": TruncYear}
+PAYMENT_METHODS = [value for value, _ in Sale.PAYMENT_CHOICES]
+COMPARE_SORTS = ("revenue", "gross", "orders", "avg_ticket", "discount_rate", "name")
+
+
+class CubeError(ValueError):
+    pass
+
+
+# -------------------------------
+# Maintenance
+# -------------------------------
+def record_sales(branch, sales):
+    """Add freshly saved sales to their cells. Call inside the checkout transaction."""
+    cells = defaultdict(lambda: dict.fromkeys(MEASURES, ZERO) | {"orders": 0})
+    for sale in sales:
+        hour = timezone.localtime(sale.datetime).hour
+        cell = cells[(sale.business_date, hour, sale.payment_method, sale.order_type)]
+        cell["orders"] += 1
+        for field in MONEY_MEASURES:
+            cell[field] += getattr(sale, field) or ZERO
+
+    for (day, hour, payment_method, order_type), sums in cells.items():
+        key = {"branch": branch, "date": day, "hour": hour, "payment_method": payment_method, "order_type": order_type}
+        increment_row(HourlySalesCube, key, sums)
+
+
+def rebuild(branch_ids=None, start=None, end=None):
+    """
+    Recompute cells from Sale for the given branches / business date range,
+    in one transaction under rollups.lock_branches(). Returns cells written.
+    """
+    with transaction.atomic():
+        lock_branches(branch_ids)
+        return _rebuild(branch_ids, start, end)
+
+
+def _rebuild(branch_ids, start, end):
+    sales = Sale.objects.filter(branch__isnull=False)
+    cells = HourlySalesCube.objects.all()
+    if branch_ids:
+        sales = sales.filter(branch_id__in=branch_ids)
+        cells = cells.filter(branch_id__in=branch_ids)
+    if start:
+        sales = sales.filter(business_date__gte=start)
+        cells = cells.filter(date__gte=start)
+    if end:
+        sales = sales.filter(business_date__lte=end)
+        cells = cells.filter(date__lte=end)
+
+    rows = (
+        sales.annotate(day=F("business_date"), hour=ExtractHour("datetime"))
+        .values("branch_id", "day", "hour", "payment_method", "order_type")
+        .annotate(
+            orders=Count("id"),
+            **{field: Coalesce(Sum(field), Value(ZERO)) for field in MONEY_MEASURES},
+        )
+    )
+    new_cells = [
+        HourlySalesCube(
+            branch_id=row["branch_id"], date=row["day"], hour=row["hour"],
+            payment_method=row["payment_method"], order_type=row["order_type"],
+            **{field: row[field] for field in MEASURES},
+        )
+        for row in rows
+    ]
+    cells.delete()
+    HourlySalesCube.objects.bulk_create(new_cells, batch_size=1000)
+    return len(new_cells)
+
+
+# -------------------------------
+# Queries
+# -------------------------------
+def query(branches=None, start=None, end=None, grain=None, group_by=(), filters=None, measures=MEASURES):
+    """
+    Slice / roll up the cube.
+      - branches: Branch or list of branch ids (None = all)
+      - start, end: local dates (inclusive)
+      - grain: None (one bucket for the range), or day | week | month | year
+      - group_by: any of DIMENSIONS, plus "branch"
+      - filters: {dimension: value or list of values}
+    Returns a list of dicts: "period" (if grain), the group_by keys, then the measures.
+    """
+    group_by = list(group_by)
+    for name in group_by:
+        if name not in DIMENSIONS and name != "branch":
+            raise CubeError(f"Unknown dimension: {name}")
+    for name in measures:
+        if name not in MEASURES:
+            raise CubeError(f"Unknown measure: {name}")
+    if grain is not None and grain not in PERIODS:
+        raise CubeError(f"Unknown grain: {grain}")
+
+    cells = HourlySalesCube.objects.all()
+    if branches is not None:
+        if isinstance(branches, (list, tuple, set)):
+            cells = cells.filter(branch_id__in=branches)
+        else:
+            cells = cells.filter(branch=branches)
+    if start:
+        cells = cells.filter(date__gte=start)
+    if end:
+        cells = cells.filter(date__lte=end)
+    for name, value in (filters or {}).items():
+        if name not in DIMENSIONS:
+            raise CubeError(f"Unknown dimension: {name}")
+        if isinstance(value, (list, tuple, set)):
+            cells = cells.filter(**{f"{name}__in": value})
+        else:
+            cells = cells.filter(**{name: value})
+
+    keys = ["branch_id" if name == "branch" else name for name in group_by]
+    if grain is not None:
+        trunc = PERIODS[grain]
+        cells = cells.annotate(period=trunc("date") if trunc else F("date"))
+        keys.insert(0, "period")
+
+    sums = {name: Sum(name) for name in measures}
+    if keys:
+        rows = cells.values(*keys).annotate(**sums).order_by(*keys)
+    else:
+        rows = [cells.aggregate(**sums)]
+    result = []
+    for row in rows:
+        if "branch_id" in row:
+            row["branch"] = row.pop("branch_id")
+        for name in measures:
+            row[name] = row[name] or (0 if name == "orders" else ZERO)
+        result.append(row)
+    return result
+
+
+def business_windows(start=None, end=None, days=30):
+    """
+    [(branches, start, end)]: the date window of the branches whose business
+    day is the local date now, and of those still on yesterday's (before
+    their day_rollover_hour). A missing end is that business day, a missing
+    start `days` business days before the end; explicit dates are the same for both.
+    """
+    local = timezone.localtime()
+    windows = []
+    for branches, today in (
+        (Q(day_rollover_hour__lte=local.hour), local.date()),
+        (Q(day_rollover_hour__gt=local.hour), local.date() - timedelta(days=1)),
+    ):
+        last = end or today
+        windows.append((branches, start or last - timedelta(days=days - 1), last))
+    return windows
+
+
+def compare_branches(start=None, end=None, branch_ids=None, sort="revenue", descending=True, days=30):
+    """
+    One row per branch (branches without sales included) over a window of
+    business dates: revenue (final_total), gross (total), orders, avg_ticket,
+    discount_rate and, per payment method, orders and revenue, plus the
+    branch's own window (start, end; see business_windows()). A single
+    grouped query: the window is a FilteredRelation (in the JOIN, so only
+    the window's cells are read) and the payment mix conditional sums.
+    Sorted in the database by any of COMPARE_SORTS.
+    """
+    if sort not in COMPARE_SORTS:
+        raise CubeError(f"Unknown sort: {sort}")
+
+    windows = business_windows(start, end, days)
+    in_window = Q()
+    for branches, first, last in windows:
+        in_window |= branches & Q(cells__date__gte=first, cells__date__lte=last)
+
+    def total(field, **condition):
+        empty = Value(0) if field == "orders" else Value(ZERO)
+        return Coalesce(Sum(f"cells__{field}", filter=in_window & Q(**condition)), empty)
+
+    def window_edge(position):
+        (today_branches, *today), (_, *yesterday) = windows
+        return Case(When(today_branches, then=Value(today[position])), default=Value(yesterday[position]),
+                    output_field=DateField())
+
+    mix = {}
+    for method in PAYMENT_METHODS:
+        mix[f"{method}_orders"] = total("orders", cells__payment_method=method)
+        mix[f"{method}_revenue"] = total("final_total", cells__payment_method=method)
+
+    branches = Branch.objects.all()
+    if branch_ids:
+        branches = branches.filter(pk__in=branch_ids)
+    rows = (
+        branches.annotate(cells=FilteredRelation(
+            "hourlysalescube", condition=Q(
+                hourlysalescube__date__gte=min(first for _, first, _ in windows),
+                hourlysalescube__date__lte=max(last for _, _, last in windows),
+            ),
+        ))
+        .values("id", "name")
+        .annotate(
+            start=window_edge(0),
+            end=window_edge(1),
+            revenue=total("final_total"),
+            gross=total("total"),
+            discount=total("discount_amount"),
+            orders=total("orders"),
+            **mix,
+        )
+        .annotate(
+            avg_ticket=Coalesce(Cast("revenue", FloatField()) / NullIf("orders", 0), Value(0.0)),
+            discount_rate=Coalesce(Cast("discount", FloatField()) / NullIf(Cast("gross", FloatField()), 0.0), Value(0.0)),
+        )
+    )
+    order = f"-{sort}" if descending else sort
+    return list(rows.order_by(order, "name" if sort != "name" else "id"))
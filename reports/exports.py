@@ -0,0 +1,284 @@
+# reports/exports.py
+"""
+Sales exports that stream.
+
+Rows are read with QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE) (a
+server-side cursor where the database has them), with the customer joined
+in the same query, and written out chunk by chunk, so memory stays flat
+however many sales are exported. A CSV response's first bytes leave before
+the last row is read.
+
+Excel files are written the same way through openpyxl's write-only
+workbook (write_xlsx), a new sheet being started at Excel's row limit. An
+xlsx file is a zip whose parts are only assembled once every row is in, so
+the Excel export builds the whole file on disk (not in memory) and starts
+sending it after that; above EXPORT_XLSX_INLINE_ROWS it is left to an
+export job (reports/jobs.py) rather than a request.
+"""
+import csv
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from inventory.models import Item
+from sales.models import Sale, SaleItem
+
+
+SALE_HEADER = ["ID", "Date", "Customer", "Total Before Discount", "Discount", "Final Total", "Payment Method"]
+ITEM_HEADER = ["Item", "Quantity", "Price", "Line Total"]
+
+
+def get_chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+def get_xlsx_inline_rows():
+    return getattr(settings, "EXPORT_XLSX_INLINE_ROWS", 20000)
+
+
+def filtered_sales(branch, start=None, end=None):
+    """Sales of a branch between two business dates (inclusive), on the (branch, business_date) index."""
+    sales = Sale.objects.filter(branch=branch)
+    if start:
+        sales = sales.filter(business_date__gte=start)
+    if end:
+        sales = sales.filter(business_date__lte=end)
+    return sales
+
+
+def export_queryset(sales, with_items=False):
+    """Sales ready to export: customer joined and, if asked, lines prefetched per chunk."""
+    sales = sales.select_related("customer").order_by("-datetime", "-id")
+    if with_items:
+        sales = sales.prefetch_related(
+            Prefetch("items", queryset=SaleItem.objects.select_related("item").order_by("id"))
+        )
+    return sales
+
+
+def customer_label(customer):
+    return str(customer) if customer else "Walk-in"
+
+
+def _cell(value, typed):
+    """Text for CSV; typed values (naive local datetimes, Decimals) for spreadsheets."""
+    if typed:
+        if hasattr(value, "tzinfo") and value.tzinfo is not None:
+            return timezone.localtime(value).replace(tzinfo=None)
+        return value
+    if hasattr(value, "tzinfo"):
+        return timezone.localtime(value).strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, Decimal):
+        return f"{value:.2f}"
+    return value
+
+
+def sale_row(sale, typed=False):
+    return [_cell(value, typed) for value in (
+        sale.id,
+        sale.datetime,
+        customer_label(sale.customer),
+        sale.total,
+        sale.discount_amount,
+        sale.final_total,
+        sale.payment_method,
+    )]
+
+
+def item_cells(sale_item, typed=False):
+    return [_cell(value, typed) for value in (
+        sale_item.item.name, sale_item.quantity, sale_item.price, sale_item.line_total(),
+    )]
+
+
+def _iterate(queryset, chunk_size=None, progress=None):
+    """queryset.iterator(), calling progress(n) after every chunk (n objects read so far) and at the end."""
+    chunk_size = chunk_size or get_chunk_size()
+    done = 0
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield obj
+        done += 1
+        if progress and done % chunk_size == 0:
+            progress(done)
+    if progress:
+        progress(done)
+
+
+def iter_sales(sales, with_items=False, chunk_size=None, progress=None):
+    """Export-ready sales, chunk by chunk; progress(n) is called after every chunk of n sales."""
+    return _iterate(export_queryset(sales, with_items), chunk_size, progress)
+
+
+def iter_rows(sales, with_items=False, chunk_size=None, progress=None, typed=False):
+    """
+    One list per output row, header first. With items, every sale line is a
+    row (the sale columns repeated); a sale without lines keeps one row.
+    """
+    yield SALE_HEADER + ITEM_HEADER if with_items else SALE_HEADER
+    for sale in iter_sales(sales, with_items, chunk_size, progress):
+        row = sale_row(sale, typed)
+        if not with_items:
+            yield row
+            continue
+        lines = sale.items.all()
+        if not lines:
+            yield row + [None, None, None, None]
+        for sale_item in lines:
+            yield row + item_cells(sale_item, typed)
+
+
+LINE_HEADER = ["Sale ID", "Date", "Customer", "Payment Method", "Item ID", "Item", "SKU", "Quantity", "Price", "Line Total"]
+
+
+def sale_lines(sales):
+    return SaleItem.objects.filter(sale__in=sales)
+
+
+def iter_line_rows(sales, chunk_size=None, progress=None, typed=False):
+    """One row per SaleItem of the given sales (sale, customer and item joined), header first."""
+    yield LINE_HEADER
+    lines = sale_lines(sales).select_related("sale", "sale__customer", "item").order_by("-sale__datetime", "-sale_id", "id")
+    for line in _iterate(lines, chunk_size, progress):
+        sale = line.sale
+        yield [_cell(value, typed) for value in (
+            sale.id, sale.datetime, customer_label(sale.customer), sale.payment_method,
+            line.item_id, line.item.name, line.item.sku or "", line.quantity, line.price, line.line_total(),
+        )]
+
+
+INVENTORY_HEADER = ["Item ID", "Name", "SKU", "Barcode", "Category", "Supplier", "Price", "Stock"]
+
+
+def iter_inventory_rows(branch, chunk_size=None, progress=None, typed=False):
+    """One row per item of the branch (category and supplier joined), header first."""
+    yield INVENTORY_HEADER
+    items = Item.objects.filter(branch=branch).select_related("category", "supplier").order_by("name", "id")
+    for item in _iterate(items, chunk_size, progress):
+        yield [_cell(value, typed) for value in (
+            item.id, item.name, item.sku or "", item.barcode or "",
+            item.category.name if item.category else "", item.supplier.name if item.supplier else "",
+            item.price, item.stock,
+        )]
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer into a generator."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, rows_per_chunk=500):
+    """Encode rows as CSV, yielding a few hundred rows per chunk."""
+    writer = csv.writer(Echo())
+    buffer = []
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= rows_per_chunk:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+# -------------------------------
+# File writers (Excel, export jobs)
+# -------------------------------
+def write_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in stream_csv(rows):
+            f.write(chunk)
+
+
+# Rows per worksheet in Excel (header included)
+XLSX_MAX_ROWS = 1048576
+
+
+def write_xlsx(rows, path, title="Sales", max_rows=None):
+    """
+    Write rows (header first, ideally typed=True) with openpyxl's write-only
+    workbook: each row goes to a temporary sheet file as it is appended, so
+    the workbook is never held in memory. When a sheet is full a new one
+    ("Sales (2)", ...) is started with the header repeated, after max_rows
+    rows (XLSX_MAX_ROWS by default). `path` may be a file name or a binary
+    file object.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    max_rows = max_rows or XLSX_MAX_ROWS
+    workbook = Workbook(write_only=True)
+    rows = iter(rows)
+    header = next(rows, None)
+    sheet, count, sheets = None, max_rows, 0
+    for row in rows:
+        if count >= max_rows:
+            sheets += 1
+            sheet = workbook.create_sheet(title if sheets == 1 else f"{title} ({sheets})")
+            if header:
+                cells = []
+                for value in header:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.font = Font(bold=True)
+                    cells.append(cell)
+                sheet.append(cells)
+            count = 1
+        sheet.append(row)
+        count += 1
+    if sheet is None:
+        sheet = workbook.create_sheet(title)
+        if header:
+            sheet.append(header)
+    workbook.save(path)
+
+
+# Excel export kinds and their sheet titles
+XLSX_KINDS = {"sales": "Sales", "lines": "Sale lines", "inventory": "Inventory"}
+
+
+def xlsx_export(kind, branch, start=None, end=None, with_items=False, progress=None):
+    """
+    (rows, sheet title, total) of an Excel export kind (XLSX_KINDS): typed rows
+    for write_xlsx and how many sales, lines or items they are read from
+    (one COUNT query). Dates are ignored for inventory.
+    """
+    if kind == "inventory":
+        return (
+            iter_inventory_rows(branch, progress=progress, typed=True), XLSX_KINDS[kind],
+            Item.objects.filter(branch=branch).count(),
+        )
+    sales = filtered_sales(branch, start, end)
+    if kind == "lines":
+        return iter_line_rows(sales, progress=progress, typed=True), XLSX_KINDS[kind], sale_lines(sales).count()
+    return (
+        iter_rows(sales, with_items=with_items, progress=progress, typed=True), XLSX_KINDS["sales"], sales.count(),
+    )
+
+
+def sales_pdf_html(sales, branch, chunk_size=None, progress=None):
+    """
+    HTML of reports/sales_pdf.html. The table rows are rendered chunk by
+    chunk from iter_sales() (customer joined, lines prefetched per chunk)
+    rather than by one template loop that queries each sale's items.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    rows_template = get_template("reports/sales_pdf_rows.html")
+    parts, chunk, total = [], [], Decimal("0.00")
+    for sale in iter_sales(sales, True, chunk_size, progress):
+        chunk.append(sale)
+        total += sale.final_total or 0
+        if len(chunk) >= chunk_size:
+            parts.append(rows_template.render({"sales": chunk}))
+            chunk = []
+    if chunk:
+        parts.append(rows_template.render({"sales": chunk}))
+    return get_template("reports/sales_pdf.html").render({
+        "branch": branch,
+        "rows": mark_safe("".join(parts)),
+        "totals": {"after": total},
+    })
@@ -0,0 +1,224 @@
+# reports/forecast.py
+"""
+Sales forecast and anomaly flags for the reports dashboard.
+
+The daily net sales of every branch asked for are read from DailySalesReport
+in one query and laid out as a branches x days NumPy matrix (a day without a
+row is a day without sales; days before a branch's first sale are ignored).
+Everything else is array arithmetic over that matrix, so all branches are
+computed together:
+
+  - 7 and 28 day trailing moving averages (cumulative sums),
+  - weekday seasonality: each weekday's median over the mean of the seven,
+  - simple exponential smoothing of the deseasonalized series (in closed
+    form, a weighted sum), re-seasonalized for the next FORECAST_HORIZON days,
+  - z-scores of each deseasonalized day against the 28 days before it;
+    |z| >= FORECAST_Z_THRESHOLD is flagged as an anomaly.
+
+Only complete business days (up to the branch's yesterday, see
+Branch.business_date) are used, so a branch's result only changes once a
+day: it is cached per branch and business date.
+"""
+import datetime
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from branches.models import Branch
+
+from .cache import get_cache
+from .models import DailySalesReport
+
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+ANOMALY_WINDOW = 28
+ANOMALY_MIN_DAYS = 7
+
+
+def get_settings():
+    return {
+        "history": getattr(settings, "FORECAST_HISTORY_DAYS", 182),
+        "horizon": getattr(settings, "FORECAST_HORIZON", 14),
+        "alpha": getattr(settings, "FORECAST_ALPHA", 0.3),
+        "z": getattr(settings, "FORECAST_Z_THRESHOLD", 3.0),
+    }
+
+
+def cache_key(branch_id, day):
+    return f"forecast:{branch_id}:{day.isoformat()}"
+
+
+def forecast(branch):
+    """Forecast of one branch (from the cache when it was computed this business day)."""
+    today = branch.business_date()
+    store = get_cache()
+    result = store.get(cache_key(branch.pk, today))
+    if result is None:
+        result = forecast_branches([branch.pk], today)[branch.pk]
+    return result
+
+
+def forecast_branches(branch_ids=None, today=None):
+    """
+    {branch id: forecast} for the given branches (None = every branch with
+    sales in the history window), computed together and cached for the day.
+    Without `today`, each branch is forecast from its own business date, so
+    branches are computed together per business date.
+    """
+    if today is not None:
+        return _forecast_day(branch_ids, today, branch_ids is not None)
+    branches = Branch.objects.only("pk", "day_rollover_hour")
+    if branch_ids is not None:
+        branches = branches.filter(pk__in=branch_ids)
+    now = timezone.now()
+    by_day = defaultdict(list)
+    for branch in branches:
+        by_day[branch.business_date(now)].append(branch.pk)
+    results = {}
+    for day, ids in by_day.items():
+        results.update(_forecast_day(ids, day, branch_ids is not None))
+    return results
+
+
+def _forecast_day(branch_ids, today, include_empty):
+    """
+    forecast_branches for one business date. `include_empty`: branches of
+    branch_ids without any sale in the window still get a (flat) result.
+    """
+    options = get_settings()
+    end = today - datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=options["history"] - 1)
+
+    rows = DailySalesReport.objects.filter(date__gte=start, date__lte=end)
+    if branch_ids is not None:
+        rows = rows.filter(branch_id__in=branch_ids)
+    ids, dates, totals = _columns(rows.values_list("branch_id", "date", "total_sales"))
+
+    branches, row_index = np.unique(ids, return_inverse=True)
+    if include_empty:
+        branches = np.union1d(branches, np.asarray(branch_ids, dtype=np.int64))
+        row_index = np.searchsorted(branches, ids)
+    if not len(branches):
+        return {}
+    days = options["history"]
+    sales = np.zeros((len(branches), days))
+    sales[row_index, (dates - np.datetime64(start)).astype(np.int64)] = totals
+
+    computed = _compute(sales, start, options)
+    history_dates = [(start + datetime.timedelta(days=i)).isoformat() for i in range(days)]
+    future_dates = [(today + datetime.timedelta(days=i)).isoformat() for i in range(options["horizon"])]
+
+    results = {}
+    for i, branch_id in enumerate(branches.tolist()):
+        flagged = np.flatnonzero(computed["anomaly"][i])
+        results[branch_id] = {
+            "branch": branch_id,
+            "as_of": end.isoformat(),
+            "history": {
+                "dates": history_dates,
+                "totals": sales[i].round(2).tolist(),
+                "ma7": computed["ma7"][i].round(2).tolist(),
+                "ma28": computed["ma28"][i].round(2).tolist(),
+            },
+            "seasonality": dict(zip(WEEKDAYS, computed["seasonality"][i].round(3).tolist())),
+            "forecast": {"dates": future_dates, "totals": computed["forecast"][i].round(2).tolist()},
+            "anomalies": [
+                {
+                    "date": history_dates[d],
+                    "total": round(float(sales[i, d]), 2),
+                    "expected": round(float(computed["expected"][i, d]), 2),
+                    "z": round(float(computed["z"][i, d]), 2),
+                }
+                for d in flagged.tolist()
+            ],
+        }
+    get_cache().set_many({cache_key(branch_id, today): result for branch_id, result in results.items()}, 24 * 60 * 60)
+    return results
+
+
+def _columns(rows):
+    rows = list(rows)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype="datetime64[D]"), np.empty(0)
+    ids, dates, totals = zip(*rows)
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(dates, dtype="datetime64[D]"),
+        np.array(totals, dtype=float),
+    )
+
+
+def _trailing(values, window, shift=0):
+    """
+    Sums of `values` (branches x days) over a trailing window, per day:
+    days [d - shift - window + 1, d - shift], cut at the first day.
+    """
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    stop = np.arange(values.shape[1]) + 1 - shift
+    start = np.clip(stop - window, 0, None)
+    stop = np.clip(stop, 0, None)
+    return cumulative[:, stop] - cumulative[:, start]
+
+
+def _compute(sales, start, options):
+    branches, days = sales.shape
+    # a branch's history starts at its first day with sales
+    active = np.maximum.accumulate(sales > 0, axis=1)
+    weight = active.astype(float)
+
+    def moving_average(window):
+        count = _trailing(weight, window)
+        return np.divide(_trailing(sales, window), count, out=np.zeros_like(sales), where=count > 0)
+
+    # weekday seasonality: median of each weekday (one odd day doesn't move it) over the
+    # mean of those medians; 1.0 where unknown. Days go in a branches x weeks x 7 grid.
+    offset = start.weekday()
+    weekday = (np.arange(days) + offset) % 7
+    grid = np.full((branches, (days + offset + 6) // 7 * 7), np.nan)
+    grid[:, offset:offset + days] = np.where(active, sales, np.nan)
+    grid = grid.reshape(branches, -1, 7)
+    known = ~np.isnan(grid).all(axis=1)                            # branches x 7
+    weekday_median = np.nanmedian(np.where(known[:, None, :], grid, 0.0), axis=1)
+    known_count = known.sum(axis=1, keepdims=True)
+    overall = np.divide(
+        np.where(known, weekday_median, 0.0).sum(axis=1, keepdims=True), known_count,
+        out=np.zeros((branches, 1)), where=known_count > 0,
+    )
+    seasonality = np.divide(weekday_median, overall, out=np.ones((branches, 7)), where=(overall > 0) & known)
+    seasonality = np.where(seasonality > 0, seasonality, 1.0)
+    factors = seasonality[:, weekday]                              # branches x days
+
+    # deseasonalized series; days before the first sale take the branch's mean so they don't pull the level
+    level_series = np.where(active, sales / factors, overall)
+
+    # simple exponential smoothing: l_t = a*y_t + (1-a)*l_(t-1), l_0 = y_0, as one weighted sum
+    alpha = options["alpha"]
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (days - 1)
+    level = level_series @ weights                                 # branches
+    future_weekday = (np.arange(options["horizon"]) + start.weekday() + days) % 7
+    forecast = np.maximum(level[:, None] * seasonality[:, future_weekday], 0)
+
+    # z-score of each day against the ANOMALY_WINDOW days before it (deseasonalized)
+    observed = np.where(active, sales / factors, 0.0)
+    count = _trailing(weight, ANOMALY_WINDOW, shift=1)
+    total = _trailing(observed, ANOMALY_WINDOW, shift=1)
+    squares = _trailing(observed ** 2, ANOMALY_WINDOW, shift=1)
+    mean = np.divide(total, count, out=np.zeros_like(sales), where=count > 0)
+    # sample variance (n - 1): a few weeks of days is a small sample
+    variance = np.divide(squares - count * mean ** 2, count - 1, out=np.zeros_like(sales), where=count > 1)
+    std = np.sqrt(np.clip(variance, 0, None))
+    usable = active & (count >= ANOMALY_MIN_DAYS) & (std > 1e-9)
+    z = np.divide(observed - mean, std, out=np.zeros_like(sales), where=usable)
+
+    return {
+        "ma7": moving_average(7),
+        "ma28": moving_average(28),
+        "seasonality": seasonality,
+        "forecast": forecast,
+        "expected": mean * factors,
+        "z": z,
+        "anomaly": usable & (np.abs(z) >= options["z"]),
+    }
@@ -0,0 +1,220 @@
+# reports/jobs.py
+"""
+Background report exports.
+
+The dashboard creates an ExportJob and polls it; `manage.py run_export_jobs`
+claims pending jobs one at a time, writes the file under EXPORT_ROOT chunk by
+chunk (sales read with iterator(), lines prefetched per chunk) and records
+progress as it goes. Excel jobs export sales, sale lines or inventory
+(params "kind"); /reports/export/xlsx/ queues one itself when the export is
+too big to build in the request. Files and job rows older than EXPORT_JOB_TTL are pruned
+by the worker.
+
+A job whose worker died stays "running". Once it has been running for
+EXPORT_JOB_TIMEOUT it is marked failed (the user can start it again) and
+its partial file is removed, so prune() can clean it up later.
+"""
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.text import slugify
+
+from pos_system import rendering
+from .models import ExportJob
+from . import exports
+
+
+FORMATS = {
+    "csv": {"extension": "csv", "content_type": "text/csv"},
+    "xlsx": {"extension": "xlsx", "content_type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "pdf": {"extension": "pdf", "content_type": "application/pdf"},
+}
+
+
+class JobError(Exception):
+    pass
+
+
+def get_export_root():
+    return Path(getattr(settings, "EXPORT_ROOT", Path(settings.BASE_DIR) / "cache" / "exports"))
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, "EXPORT_JOB_TTL", 24 * 60 * 60))
+
+
+def get_timeout():
+    return timedelta(seconds=getattr(settings, "EXPORT_JOB_TIMEOUT", 2 * 60 * 60))
+
+
+def create(user, branch, format, start=None, end=None, items=False, kind="sales"):
+    """kind (exports.XLSX_KINDS) picks what an xlsx job exports; other formats export sales."""
+    if format not in FORMATS:
+        raise JobError(f"Unknown export format: {format}")
+    if kind not in exports.XLSX_KINDS or (kind != "sales" and format != "xlsx"):
+        raise JobError(f"Unknown {format} export kind: {kind}")
+    params = {"start": start.isoformat() if start else None, "end": end.isoformat() if end else None, "items": bool(items)}
+    if kind != "sales":
+        params["kind"] = kind
+    return ExportJob.objects.create(user=user, branch=branch, format=format, params=params)
+
+
+def job_payload(job):
+    data = {
+        "id": job.pk,
+        "format": job.format,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_total": job.rows_total,
+        "rows_done": job.rows_done,
+        "status_url": reverse("reports:export_job", args=[job.pk]),
+    }
+    if job.status == "done":
+        data["download_url"] = reverse("reports:export_job_download", args=[job.pk])
+    if job.status == "failed":
+        data["error"] = job.error
+    return data
+
+
+def file_path(job):
+    return get_export_root() / job.file if job.file else None
+
+
+def file_name(job):
+    kind = (job.params or {}).get("kind", "sales")
+    return f"{job.pk}-{kind}-{slugify(job.branch.name) or job.branch_id}.{FORMATS[job.format]['extension']}"
+
+
+def temp_path(job):
+    """Where the file is written before it is complete (one per job, so a stale job's can be found)."""
+    return get_export_root() / f"{job.pk}.tmp"
+
+
+# -------------------------------
+# Worker side
+# -------------------------------
+def claim_next():
+    """Mark the oldest pending job running and return it (None if there is none)."""
+    fail_stale()
+    while True:
+        job = ExportJob.objects.filter(status="pending").order_by("id").first()
+        if job is None:
+            return None
+        # conditional UPDATE: if another worker got there first, try the next job
+        claimed = ExportJob.objects.filter(pk=job.pk, status="pending").update(
+            status="running", started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run(job):
+    """Write the job's file. Never raises: failures are recorded on the job."""
+    try:
+        path = _write(job)
+    except Exception as e:
+        ExportJob.objects.filter(pk=job.pk, status="running").update(
+            status="failed", error=str(e)[:2000], finished_at=timezone.now()
+        )
+        return False
+    # a job given up as stale meanwhile stays failed
+    finished = ExportJob.objects.filter(pk=job.pk, status="running").update(
+        status="done", progress=100, file=path.name, finished_at=timezone.now()
+    )
+    if not finished:
+        path.unlink(missing_ok=True)
+    return bool(finished)
+
+
+def fail_stale():
+    """
+    Mark jobs running for longer than EXPORT_JOB_TIMEOUT failed (their worker
+    stopped without finishing) and remove their partial files. Returns jobs failed.
+    """
+    stale = ExportJob.objects.filter(status="running", started_at__lt=timezone.now() - get_timeout())
+    failed = 0
+    for job in stale:
+        if ExportJob.objects.filter(pk=job.pk, status="running").update(
+            status="failed", error="The export stopped before finishing, please try again", finished_at=timezone.now(),
+        ):
+            temp_path(job).unlink(missing_ok=True)
+            failed += 1
+    return failed
+
+
+def _write(job):
+    params = job.params or {}
+    start = parse_date(params["start"]) if params.get("start") else None
+    end = parse_date(params["end"]) if params.get("end") else None
+    sales = exports.filtered_sales(job.branch, start, end)
+    # the PDF conversion itself is the last step, so rows only count for 90%
+    share = 90 if job.format == "pdf" else 99
+
+    def progress(done):
+        percent = share * done // total if total else share
+        ExportJob.objects.filter(pk=job.pk).update(rows_done=done, progress=percent)
+
+    if job.format == "xlsx":
+        # sales, sale lines or items (the rows are only read once the file is written)
+        rows, title, total = exports.xlsx_export(
+            params.get("kind", "sales"), job.branch, start, end, with_items=params.get("items", False),
+            progress=progress,
+        )
+    else:
+        total = sales.count()
+    ExportJob.objects.filter(pk=job.pk).update(rows_total=total)
+
+    root = get_export_root()
+    root.mkdir(parents=True, exist_ok=True)
+    name = file_name(job)
+    tmp = temp_path(job)
+    try:
+        if job.format == "pdf":
+            html = exports.sales_pdf_html(sales, job.branch, progress=progress)
+            # this process is already off the web path: convert here, without the pool's timeout
+            with open(tmp, "wb") as f:
+                f.write(rendering.html_to_pdf(html))
+        elif job.format == "csv":
+            exports.write_csv(exports.iter_rows(sales, with_items=params.get("items", False), progress=progress), tmp)
+        else:
+            # through a file object: openpyxl never sees the .tmp name
+            with open(tmp, "wb") as f:
+                exports.write_xlsx(rows, f, title=title)
+        os.replace(tmp, root / name)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return root / name
+
+
+def prune():
+    """
+    Delete jobs (and their files) older than EXPORT_JOB_TTL, and partial files
+    left that long by workers that died. Returns jobs removed.
+    """
+    fail_stale()
+    cutoff = timezone.now() - get_ttl()
+    old = ExportJob.objects.filter(created_at__lt=cutoff).exclude(status="running")
+    removed = 0
+    for job in old:
+        path = file_path(job)
+        if path is not None:
+            path.unlink(missing_ok=True)
+        job.delete()
+        removed += 1
+
+    root = get_export_root()
+    if root.exists():
+        for path in root.glob("*.tmp"):
+            try:
+                if path.stat().st_mtime < cutoff.timestamp():
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+    return removed
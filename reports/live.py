@@ -0,0 +1,129 @@
+# reports/live.py
+"""
+Live sales feed (Server-Sent Events).
+
+Once a checkout commits, each of its sales of the branch's current business
+day is announced on the branch's notification channel
+(reports/notifications.py):
+
+    sale        {sale, total, payment_method, order_type, revenue, orders}
+
+revenue and orders are the day's running totals right after that sale, read
+back from the DailySalesReport row checkout has just updated (one indexed
+read per checkout). Low stock crossings (reports/reorder.py) travel on the
+same channel as low_stock events.
+
+stream() is the body of the SSE view: a coroutine waits on the channel, so
+under ASGI (pos_system.asgi) an open dashboard tab costs no thread and no
+query until something happens. Every event carries its id; after a
+disconnect the browser's EventSource sends it back as Last-Event-ID and
+gets what it missed while the buffer holds (from any worker, best effort:
+see reports/notifications.py). A comment line every
+LIVE_FEED_HEARTBEAT seconds keeps proxies from closing an idle stream, and a
+stream ends after LIVE_FEED_MAX_SECONDS (the browser reconnects).
+"""
+import asyncio
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import DailySalesReport
+from . import notifications
+
+
+ZERO = Decimal("0.00")
+RETRY_MS = 5000
+
+
+def get_settings():
+    return {
+        "heartbeat": getattr(settings, "LIVE_FEED_HEARTBEAT", 15),
+        "max_seconds": getattr(settings, "LIVE_FEED_MAX_SECONDS", 300),
+    }
+
+
+def day_totals(branch, day):
+    """(revenue, orders) of the branch's business day, from its DailySalesReport row."""
+    row = DailySalesReport.objects.filter(branch=branch, date=day).values_list("total_sales", "total_orders").first()
+    return row or (ZERO, 0)
+
+
+def announce_sales(branch, sales):
+    """
+    Called in the checkout transaction, after the rollups were updated: the
+    branch's sale events, published once it commits.
+    """
+    today = branch.business_date()
+    todays = [sale for sale in sales if sale.business_date == today]
+    if not todays:
+        return
+
+    # the row already includes these sales: walk back from the day's totals
+    revenue, orders = day_totals(branch, today)
+    events = []
+    for sale in reversed(todays):
+        events.append({
+            "sale": sale.pk,
+            "total": float(sale.final_total or ZERO),
+            "payment_method": sale.payment_method,
+            "order_type": sale.order_type,
+            "revenue": float(revenue),
+            "orders": orders,
+        })
+        revenue -= sale.final_total or ZERO
+        orders -= 1
+    events.reverse()
+
+    def publish():
+        for event in events:
+            notifications.publish(branch.pk, "sale", **event)
+    transaction.on_commit(publish)
+
+
+def summary(branch):
+    """The "summary" event a stream starts with: today's totals so far."""
+    today = branch.business_date()
+    revenue, orders = day_totals(branch, today)
+    return {"type": "summary", "date": today.isoformat(), "revenue": float(revenue), "orders": orders}
+
+
+def format_event(event):
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, cls=DjangoJSONEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(branch_id, after=None, first=None, max_seconds=None):
+    """
+    Text chunks of an event stream: `first` (if any), the channel's events
+    after id `after` (None: only new ones), heartbeats, until max_seconds.
+    """
+    options = get_settings()
+    max_seconds = options["max_seconds"] if max_seconds is None else max_seconds
+    channel = notifications.channel(branch_id)
+    if after is None:
+        after = channel.last_id()
+
+    yield f"retry: {RETRY_MS}\n\n"
+    if first is not None:
+        yield format_event(first)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    events = channel.since(after)
+    while True:
+        for event in events:
+            yield format_event(event)
+            after = event["id"]
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return
+        events = await channel.wait_async(after, min(options["heartbeat"], remaining))
+        if not events:
+            yield ": keepalive\n\n"
@@ -0,0 +1,143 @@
+import csv
+import os
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+
+from branches.models import Branch
+from customers.models import Customer
+from reports import exports
+from sales.management.commands.bench_checkout import _Rollback
+from sales.models import Sale
+
+
+def _legacy_csv(sales):
+    """The HttpResponse export the streaming one replaced (one customer query per sale), for comparison."""
+    response = HttpResponse(content_type="text/csv")
+    writer = csv.writer(response)
+    writer.writerow(exports.SALE_HEADER)
+    for sale in sales.order_by("-datetime"):
+        writer.writerow([
+            sale.id,
+            sale.datetime.strftime("%Y-%m-%d %H:%M"),
+            str(sale.customer) if sale.customer else "Walk-in",
+            f"{sale.total:.2f}",
+            f"{sale.discount_amount:.2f}",
+            f"{sale.final_total:.2f}",
+            sale.payment_method,
+        ])
+    yield response.content
+
+
+def _peak_rss():
+    """Highest resident set size of this process so far, in bytes (getrusage)."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _rss():
+    """Resident set size of this process now in bytes (Linux), else its peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss()
+
+
+class RssSampler(threading.Thread):
+    """Samples the process RSS every few milliseconds; `peak` is the growth over the start."""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.baseline = self.high = _rss()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.high = max(self.high, _rss())
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        self.high = max(self.high, _rss())
+        return self.high - self.baseline
+
+
+def _xlsx(rows):
+    """The xlsx view's response body: the whole workbook to a temporary file, then read back."""
+    with tempfile.TemporaryFile() as out:
+        exports.write_xlsx(rows, out)
+        out.seek(0)
+        while chunk := out.read(64 * 1024):
+            yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Time-to-first-byte, total time and peak RSS growth of the streaming CSV export "
+        "(the legacy one and the Excel export too, up to their own limits) for growing "
+        "numbers of sales. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000,1000000,5000000", help="Comma separated sale counts")
+        parser.add_argument("--legacy-max", type=int, default=100000, help="Largest size to also run the legacy export on")
+        parser.add_argument("--xlsx-max", type=int, default=1000000, help="Largest size to also run the Excel export on")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options["sizes"].split(",") if s.strip())
+        try:
+            with transaction.atomic():
+                self._run(sizes, options["legacy_max"], options["xlsx_max"])
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(f"Process peak RSS: {_peak_rss() / 1024 / 1024:.1f} MB")
+
+    def _run(self, sizes, legacy_max, xlsx_max):
+        branch = Branch.objects.create(name="bench-exports")
+        user = get_user_model().objects.create(username=f"bench-exports-{branch.pk}", branch=branch)
+        customers = Customer.objects.bulk_create([Customer(name=f"Customer {i}", branch=branch) for i in range(100)])
+
+        self.stdout.write(f"{'sales':>9} {'export':>9} {'ttfb ms':>9} {'total s':>9} {'RSS +MB':>9}")
+        created = 0
+        for size in sizes:
+            while created < size:
+                batch = min(5000, size - created)
+                Sale.objects.bulk_create([
+                    Sale(user=user, branch=branch, customer=customers[n % 100] if n % 3 == 0 else None,
+                         business_date=branch.business_date(), total=Decimal("20.00"),
+                         discount_amount=Decimal("1.00"), final_total=Decimal("19.00"))
+                    for n in range(created, created + batch)
+                ])
+                created += batch
+
+            sales = Sale.objects.filter(branch=branch)
+            self._measure(size, "stream", lambda: exports.stream_csv(exports.iter_rows(sales)))
+            if size <= legacy_max:
+                self._measure(size, "legacy", lambda: _legacy_csv(sales))
+            if size <= xlsx_max:
+                self._measure(size, "xlsx", lambda: _xlsx(exports.iter_rows(sales, typed=True)))
+
+    def _measure(self, size, name, make_stream):
+        # RSS rather than tracemalloc: the database cursor's buffers and openpyxl's are counted too
+        sampler = RssSampler()
+        sampler.start()
+        started = time.perf_counter()
+        ttfb = None
+        for _ in make_stream():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+        total = time.perf_counter() - started
+        growth = sampler.stop()
+        self.stdout.write(f"{size:>9} {name:>9} {ttfb * 1000:>9.1f} {total:>9.2f} {growth / 1024 / 1024:>9.1f}")
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reports import baskets
+
+
+class Command(BaseCommand):
+    help = "Recompute the frequently-bought-together pairs (ItemAssociation) of every branch from recent sales."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", type=int, action="append", help="Only this branch id (repeatable)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = baskets.compute_all(options["branch"])
+        self.stdout.write(
+            f"{sum(written.values())} pairs for {len(written)} branches in {time.perf_counter() - started:.2f}s"
+        )
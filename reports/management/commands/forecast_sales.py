@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reports import forecast
+
+
+class Command(BaseCommand):
+    help = "Compute (and cache for its business day) the dashboard sales forecast of every branch at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", type=int, action="append", help="Only this branch id (repeatable)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        results = forecast.forecast_branches(options["branch"])
+        elapsed = time.perf_counter() - started
+        anomalies = sum(len(result["anomalies"]) for result in results.values())
+        self.stdout.write(f"{len(results)} branches forecast in {elapsed:.2f}s, {anomalies} anomalous days flagged")
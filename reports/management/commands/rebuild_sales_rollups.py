@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from reports import cache, cube, rollups, sketches
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales report rollups from Sale (backfill, or after sales were edited outside checkout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", type=int, action="append", help="Only this branch id (repeatable)")
+        parser.add_argument("--start", help="First local date to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--end", help="Last local date to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ("start", "end"):
+            value = options[name]
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise CommandError(f"--{name} must be YYYY-MM-DD")
+
+        args = (options["branch"], dates["start"], dates["end"])
+        days, items = rollups.rebuild(*args)
+        self.stdout.write(f"Daily sales: {days} rows, item daily sales: {items} rows")
+        self.stdout.write(f"Hourly cube: {cube.rebuild(*args)} cells")
+        self.stdout.write(f"Live sketches: {sketches.prune()} stale rows deleted")
+        for branch_id in options["branch"] or ():
+            cache.bump(branch_id)
+        if not options["branch"]:
+            cache.bump_all()
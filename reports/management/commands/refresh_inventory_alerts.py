@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from reports import reorder
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every item's reorder point from recent sales velocity and refresh the "
+        "low stock alerts (InventoryAlert). Run it on a schedule, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branch", type=int, action="append", help="Only this branch id (repeatable)")
+
+    def handle(self, *args, **options):
+        stats = reorder.refresh_alerts(options["branch"])
+        self.stdout.write(
+            f"{stats['items']} items, {stats['reorder_points']} reorder points changed, "
+            f"{stats['alerts']} alerts written, {stats['cleared']} cleared"
+        )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reports import jobs
+
+
+class Command(BaseCommand):
+    help = "Run pending report export jobs (CSV, Excel, PDF), polling for new ones unless --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the jobs pending now, then exit")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds between polls when idle")
+
+    def handle(self, *args, **options):
+        last_prune = 0
+        while True:
+            if time.monotonic() - last_prune > 3600:
+                removed = jobs.prune()
+                if removed:
+                    self.stdout.write(f"Pruned {removed} old export jobs")
+                last_prune = time.monotonic()
+
+            job = jobs.claim_next()
+            if job is None:
+                if options["once"]:
+                    return
+                close_old_connections()
+                time.sleep(options["sleep"])
+                continue
+
+            started = time.monotonic()
+            ok = jobs.run(job)
+            job.refresh_from_db()
+            outcome = "done" if ok else f"failed: {job.error}"
+            self.stdout.write(f"Export #{job.pk} ({job.format}, {job.rows_total} sales) {outcome} in {time.monotonic() - started:.1f}s")
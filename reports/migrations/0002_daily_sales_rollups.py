@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailysalesreport',
+            name='gross_sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailysalesreport',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='dailysalesreport',
+            name='total_sales',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0004_branch_receipt_renderer'),
+        ('reports', '0002_daily_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySalesCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('order_type', models.CharField(max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('final_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cash_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('card_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='branches.branch')),
+            ],
+            options={
+                'unique_together': {('branch', 'date', 'hour', 'payment_method', 'order_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0004_branch_receipt_renderer'),
+        ('inventory', '0013_item_barcode_index'),
+        ('reports', '0003_hourly_sales_cube'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='branches.branch')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='inventory.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'date', 'item', 'quantity', 'revenue'], name='reports_ite_branch__96b865_idx')],
+                'unique_together': {('branch', 'date', 'item')},
+            },
+        ),
+    ]
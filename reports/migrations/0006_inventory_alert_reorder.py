@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0005_branch_reports_version'),
+        ('inventory', '0014_item_reorder_point'),
+        ('reports', '0005_export_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryalert',
+            name='daily_velocity',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='inventoryalert',
+            name='days_of_cover',
+            field=models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryalert',
+            name='suggested_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventoryalert',
+            name='supplier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.supplier'),
+        ),
+        migrations.AddField(
+            model_name='inventoryalert',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(fields=['branch', 'supplier'], name='reports_inv_branch__79d4e3_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryalert',
+            constraint=models.UniqueConstraint(fields=('item',), name='inventory_alert_one_per_item'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0005_branch_reports_version'),
+        ('inventory', '0014_item_reorder_point'),
+        ('reports', '0006_inventory_alert_reorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemAssociation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('pair_count', models.PositiveIntegerField()),
+                ('support', models.FloatField()),
+                ('confidence', models.FloatField()),
+                ('lift', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='branches.branch')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='associations', to='inventory.item')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.item')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'item', 'rank'], name='reports_ite_branch__445422_idx')],
+                'unique_together': {('item', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0005_branch_reports_version'),
+        ('reports', '0007_item_associations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sales', models.PositiveIntegerField(default=0)),
+                ('state', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='branches.branch')),
+            ],
+            options={
+                'unique_together': {('branch', 'date')},
+            },
+        ),
+    ]
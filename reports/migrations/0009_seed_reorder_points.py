@@ -0,0 +1,75 @@
+# Seeds Item.reorder_point and InventoryAlert from the sales of the last
+# REORDER_WINDOW_DAYS complete business days, as `manage.py
+# refresh_inventory_alerts` would (reports/reorder.py), so the low stock
+# report works right after upgrading instead of after the first scheduled run.
+
+import datetime
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def seed_reorder_points(apps, schema_editor):
+    Branch = apps.get_model("branches", "Branch")
+    Item = apps.get_model("inventory", "Item")
+    SaleItem = apps.get_model("sales", "SaleItem")
+    InventoryAlert = apps.get_model("reports", "InventoryAlert")
+    db = schema_editor.connection.alias
+
+    window = getattr(settings, "REORDER_WINDOW_DAYS", 28)
+    days = getattr(settings, "REORDER_LEAD_TIME_DAYS", 3) + getattr(settings, "REORDER_SAFETY_DAYS", 2)
+    cover = getattr(settings, "REORDER_COVER_DAYS", 14)
+    min_point = getattr(settings, "REORDER_MIN_POINT", 1)
+
+    sold = {}
+    for branch_id, rollover in Branch.objects.using(db).values_list("id", "day_rollover_hour"):
+        today = (timezone.localtime() - datetime.timedelta(hours=rollover)).date()
+        sold.update(
+            SaleItem.objects.using(db)
+            .filter(sale__branch_id=branch_id, sale__business_date__gte=today - datetime.timedelta(days=window),
+                    sale__business_date__lt=today)
+            .values("item_id").annotate(sold=Sum("quantity")).values_list("item_id", "sold")
+        )
+
+    points, alerts = [], defaultdict(list)
+    for item_id, branch_id, supplier_id, stock in Item.objects.using(db).values_list(
+        "id", "branch_id", "supplier_id", "stock"
+    ).iterator(chunk_size=2000):
+        velocity = Decimal(sold.get(item_id, 0)) / window
+        point = max(math.ceil(velocity * days), min_point)
+        points.append(Item(pk=item_id, reorder_point=point))
+        if stock > point:
+            continue
+        target = math.ceil(velocity * (days + cover))
+        alerts[supplier_id].append(InventoryAlert(
+            item_id=item_id, branch_id=branch_id, supplier_id=supplier_id, stock_level=stock, threshold=point,
+            daily_velocity=velocity.quantize(Decimal("0.001")),
+            days_of_cover=(Decimal(max(stock, 0)) / velocity).quantize(Decimal("0.1")) if velocity else None,
+            suggested_quantity=max(target - max(stock, 0), 0),
+        ))
+
+    Item.objects.using(db).bulk_update(points, ["reorder_point"], batch_size=1000)
+    for supplier_alerts in alerts.values():
+        InventoryAlert.objects.using(db).bulk_create(
+            supplier_alerts, batch_size=1000, update_conflicts=True, unique_fields=["item"],
+            update_fields=["branch", "supplier", "stock_level", "threshold", "daily_velocity", "days_of_cover",
+                           "suggested_quantity"],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_item_reorder_point'),
+        ('sales', '0014_backfill_sale_business_date'),
+        ('reports', '0008_live_sketches'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_reorder_points, migrations.RunPython.noop),
+    ]
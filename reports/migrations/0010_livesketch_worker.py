@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0006_branch_day_rollover_hour'),
+        ('reports', '0009_seed_reorder_points'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='livesketch',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='livesketch',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AlterUniqueTogether(
+            name='livesketch',
+            unique_together={('branch', 'date', 'worker')},
+        ),
+    ]
@@ -1,16 +1,24 @@
+from django.conf import settings
 from django.db import models
 from sales.models import Sale
-from inventory.models import Item
+from inventory.models import Item, Supplier
 from branches.models import Branch
 
 
 class DailySalesReport(models.Model):
+    """
+    One row per branch and local day, kept up to date by checkout
+    (reports/rollups.py) and rebuilt with `manage.py rebuild_sales_rollups`.
+    total_sales is revenue after discount (Sale.final_total), gross_sales before it (Sale.total).
+    """
     date = models.DateField()
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
-    total_sales = models.DecimalField(max_digits=10, decimal_places=2)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
     total_orders = models.IntegerField(default=0)
     top_item = models.CharField(max_length=200, blank=True, null=True)
     generated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ("date", "branch")
@@ -19,12 +27,162 @@ class DailySalesReport(models.Model):
         return f"Report {self.date} - {self.total_sales}"
 
 
+class ItemDailySales(models.Model):
+    """
+    Quantity and revenue of one item in one branch on one local day, kept up to
+    date by checkout (reports/rollups.py). Revenue is at the line price, before
+    the sale-level discount.
+    """
+    date = models.DateField()
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="daily_sales")
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("branch", "date", "item")
+        indexes = [
+            # covers top-N over a date window without reading the table
+            models.Index(fields=["branch", "date", "item", "quantity", "revenue"]),
+        ]
+
+    def __str__(self):
+        return f"{self.item} {self.date}: {self.quantity}"
+
+
 class InventoryAlert(models.Model):
+    """
+    An item at or below its reorder point (`threshold`), at most one per item.
+    Written by `manage.py refresh_inventory_alerts` (reports/reorder.py) from
+    recent sales velocity; the low stock report reads these rows.
+    """
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="alerts")
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True)
     stock_level = models.IntegerField(default=0)  
     threshold = models.IntegerField(default=10)
+    daily_velocity = models.DecimalField(max_digits=10, decimal_places=3, default=0)  # units sold per day
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)  # null: not selling
+    suggested_quantity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["item"], name="inventory_alert_one_per_item")]
+        indexes = [models.Index(fields=["branch", "supplier"])]
+
+    def __str__(self):
+        return f"{self.item.name} - {self.stock_level} left in {self.branch}"
+
+class HourlySalesCube(models.Model):
+    """
+    Sales pre-aggregated per branch, local hour, payment method and order type,
+    maintained by checkout (reports/cube.py). Any grouping of those dimensions
+    at hour, day, week, month or year grain is a small GROUP BY over this table.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()  # 0-23, local time
+    payment_method = models.CharField(max_length=20)
+    order_type = models.CharField(max_length=20)
+
+    orders = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    final_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cash_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    card_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("branch", "date", "hour", "payment_method", "order_type")
+
+    def __str__(self):
+        return f"{self.branch} {self.date} {self.hour:02d}h {self.payment_method}/{self.order_type}"
+
+
+
+class ExportJob(models.Model):
+    """
+    A report export run in the background by `manage.py run_export_jobs`
+    (reports/jobs.py). The dashboard polls its progress and downloads the
+    file from EXPORT_ROOT once it is done.
+    """
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="export_jobs")
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    format = models.CharField(max_length=10, choices=FORMATS)
+    params = models.JSONField(default=dict, blank=True)  # start, end, items
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    file = models.CharField(max_length=255, blank=True)  # relative to EXPORT_ROOT
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_format_display()} export #{self.pk} ({self.status})"
+
+
+class ItemAssociation(models.Model):
+    """
+    "Bought together" pair: customers who bought `item` also bought `other`.
+    The top BASKET_TOP_K partners of each item (by lift), recomputed per branch
+    by `manage.py compute_item_associations` (reports/baskets.py).
+      support    = share of the branch's sales with both items
+      confidence = share of the sales with `item` that also have `other`
+      lift       = confidence / share of all sales with `other` (> 1: bought together more than by chance)
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="associations")
+    other = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()  # 0 = best partner of `item`
+    pair_count = models.PositiveIntegerField()
+    support = models.FloatField()
+    confidence = models.FloatField()
+    lift = models.FloatField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("item", "rank")
+        indexes = [
+            # cart lookups: the partners of a few items of one branch
+            models.Index(fields=["branch", "item", "rank"]),
+        ]
+
+    def __str__(self):
+        return f"{self.item} -> {self.other} (lift {self.lift:.2f})"
+
+
+class LiveSketch(models.Model):
+    """
+    Saved state of a branch's live summaries for one business day, one row
+    per worker process: the Space-Saving item counters and ticket t-digest
+    of reports/sketches.py, written every few sales; the live views merge
+    the rows of the other processes with their own.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    date = models.DateField()
+    worker = models.CharField(max_length=40, default="", blank=True)  # process that counted these sales
+    sales = models.PositiveIntegerField(default=0)
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("branch", "date", "worker")
 
     def __str__(self):
-        return f"{self.item.name} - {self.stock_level} left in {self.branch}"
\ No newline at end of file
+        return f"Live sketch {self.branch} {self.date} ({self.sales} sales)"
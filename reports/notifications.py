@@ -0,0 +1,224 @@
+# reports/notifications.py
+"""
+Per-branch notification channels.
+
+Every branch has a channel holding its last NOTIFICATION_BUFFER events in
+the order they arrived. A client remembers the id of the last event it saw
+and asks for what came after it (waiting up to a timeout if nothing did), so
+no subscription is kept and nothing is lost between two polls as long as the
+buffer holds. An id the channel doesn't know (too old, or from before a
+restart) means "from now on".
+Threads wait on a Condition (the long-poll view); coroutines (the SSE stream,
+reports/live.py) wait on a future that publish() resolves on their event loop.
+
+Events live in this process. With several worker processes, set
+NOTIFICATION_SOCKET_DIR: every process that listens binds a Unix datagram
+socket there and publish() also sends the event to the other processes'
+sockets, so every channel sees every event. Ids are global: the publishing
+process's pid and a random token, then a number ("<pid>.<token>-<n>"), so an
+id one worker handed out is found in another worker's channel too. Resuming
+there is best effort: two events published at the same moment by different
+processes can arrive in a different order, and one of them may be missed or
+sent twice. A process that stopped reading misses events (the drop is
+logged). It is a stand-in for a real broker on one machine; sockets of
+processes that died are removed by the next publish.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def get_buffer_size():
+    return getattr(settings, "NOTIFICATION_BUFFER", 200)
+
+
+def get_socket_dir():
+    return getattr(settings, "NOTIFICATION_SOCKET_DIR", None)
+
+
+logger = logging.getLogger(__name__)
+
+_origin = None  # (pid, "<pid>.<token>"): a forked process gets its own
+_numbers = itertools.count(1)
+
+
+def next_id():
+    """A new event id, unique across processes and restarts."""
+    global _origin
+    if _origin is None or _origin[0] != os.getpid():
+        _origin = (os.getpid(), f"{os.getpid()}.{uuid.uuid4().hex[:8]}")
+    return f"{_origin[1]}-{next(_numbers)}"
+
+
+class Channel:
+    """
+    Events in arrival order. Each gets a position in this channel (a counter)
+    that waiting compares against; clients only see the events' global ids.
+    """
+
+    def __init__(self, size):
+        self.events = deque(maxlen=size)   # (position, event)
+        self.positions = {}                # event id -> position, for the events held
+        self.last = 0
+        self.condition = threading.Condition()
+        self.waiters = []  # (event loop, future) of coroutines in wait_async()
+
+    def publish(self, event):
+        with self.condition:
+            if event["id"] in self.positions:
+                return event
+            if len(self.events) == self.events.maxlen:
+                self.positions.pop(self.events[0][1]["id"], None)
+            self.last += 1
+            self.events.append((self.last, event))
+            self.positions[event["id"]] = self.last
+            self.condition.notify_all()
+            waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return event
+
+    def last_id(self):
+        """Id of the newest event (None when empty): what "from now on" resumes from."""
+        with self.condition:
+            return self.events[-1][1]["id"] if self.events else None
+
+    def _position(self, after):
+        # caller holds the condition; no id (or 0, from before ids were global): the whole
+        # buffer, an unknown one: from now on
+        if not after or after == "0":
+            return 0
+        return self.positions.get(after, self.last)
+
+    def since(self, after):
+        with self.condition:
+            position = self._position(after)
+            return [event for at, event in self.events if at > position]
+
+    def wait(self, after, timeout):
+        """Events after id `after`, waiting up to `timeout` seconds for the first one."""
+        with self.condition:
+            position = self._position(after)
+            self.condition.wait_for(lambda: self.last > position, timeout)
+            return [event for at, event in self.events if at > position]
+
+    async def wait_async(self, after, timeout):
+        """wait() for coroutines: the event loop is free while nothing happens."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.condition:
+            position = self._position(after)
+            if self.last <= position:
+                self.waiters.append((loop, future))
+            else:
+                future.set_result(None)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self.condition:
+                if (loop, future) in self.waiters:
+                    self.waiters.remove((loop, future))
+        with self.condition:
+            return [event for at, event in self.events if at > position]
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_channels = {}
+_lock = threading.Lock()
+
+
+def channel(branch_id):
+    _listen()
+    with _lock:
+        if branch_id not in _channels:
+            _channels[branch_id] = Channel(get_buffer_size())
+        return _channels[branch_id]
+
+
+def publish(branch_id, type, **data):
+    """Add an event to the branch's channel (and other processes'); returns it (with its id)."""
+    event = {"id": next_id(), "type": type, "at": timezone.now().isoformat(), **data}
+    _broadcast(branch_id, event)
+    return channel(branch_id).publish(event)
+
+
+def reset():
+    """Drop every channel (tests)."""
+    with _lock:
+        _channels.clear()
+
+
+# -------------------------------
+# Between processes (Unix datagram sockets)
+# -------------------------------
+_socket = None
+_socket_path = None
+
+
+def _listen():
+    """Bind this process's socket and start its reader thread, once, if NOTIFICATION_SOCKET_DIR is set."""
+    global _socket, _socket_path
+    directory = get_socket_dir()
+    if not directory or _socket is not None or not hasattr(socket, "AF_UNIX"):
+        return
+    with _lock:
+        if _socket is not None:
+            return
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.sock")
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        _socket, _socket_path = sock, path
+    threading.Thread(target=_receive, args=(sock,), name="notifications", daemon=True).start()
+
+
+def _receive(sock):
+    while True:
+        try:
+            message = json.loads(sock.recv(65536))
+            channel(message["branch"]).publish(message["event"])
+        except OSError:
+            return
+        except (ValueError, KeyError):
+            continue  # not one of ours
+
+
+def _broadcast(branch_id, event):
+    directory = get_socket_dir()
+    if not directory or not hasattr(socket, "AF_UNIX") or not os.path.isdir(directory):
+        return
+    message = json.dumps({"branch": branch_id, "event": event}, default=str).encode()
+    own = _socket_path
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+        sender.setblocking(False)  # a process that stopped reading drops events rather than stalling checkout
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".sock") or entry.path == own:
+                continue
+            try:
+                sender.sendto(message, entry.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # the process behind it is gone
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+            except OSError as error:
+                # its queue is full (or the message too large): it misses this event
+                logger.warning("Notification %s of branch %s not delivered to %s: %s",
+                               event["id"], branch_id, entry.name, error)
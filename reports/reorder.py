@@ -0,0 +1,211 @@
+# reports/reorder.py
+"""
+Demand-driven reorder points and low stock alerts.
+
+`manage.py refresh_inventory_alerts` (schedule it, e.g. nightly) reads every
+item's units sold over the last REORDER_WINDOW_DAYS complete days in one
+grouped query over ItemDailySales, and from that daily velocity derives:
+
+  - the reorder point: stock that lasts the supplier lead time plus some
+    safety days (REORDER_LEAD_TIME_DAYS + REORDER_SAFETY_DAYS), never below
+    REORDER_MIN_POINT; saved on Item.reorder_point,
+  - days of cover: how long the current stock lasts at that velocity,
+  - the suggested order: enough to cover REORDER_COVER_DAYS more on top.
+
+Items at or below their reorder point get an InventoryAlert (bulk upserted,
+supplier by supplier); alerts of items that are no longer low are removed.
+An item whose reorder point was never computed (a new item, or before the
+first run) is low at REORDER_DEFAULT_POINT, the old fixed threshold.
+
+Between runs, checkout keeps alerts current (record_sold_stock): an item
+whose stock a sale takes to or below its reorder point gets its alert
+created or refreshed in the checkout transaction, and once that commits the
+crossing is published on the branch's notification channel.
+"""
+import datetime
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory.models import Item
+from .models import InventoryAlert, ItemDailySales
+from . import cache, notifications
+
+
+ALERT_FIELDS = [
+    "branch", "supplier", "stock_level", "threshold", "daily_velocity", "days_of_cover",
+    "suggested_quantity", "updated_at",
+]
+
+
+def get_settings():
+    return {
+        "window": getattr(settings, "REORDER_WINDOW_DAYS", 28),
+        "lead_time": getattr(settings, "REORDER_LEAD_TIME_DAYS", 3),
+        "safety": getattr(settings, "REORDER_SAFETY_DAYS", 2),
+        "cover": getattr(settings, "REORDER_COVER_DAYS", 14),
+        "min_point": getattr(settings, "REORDER_MIN_POINT", 1),
+        "default_point": getattr(settings, "REORDER_DEFAULT_POINT", 10),
+    }
+
+
+def velocities(branch_ids=None, today=None):
+    """{item id: units sold per day} over the window's complete days, one grouped query."""
+    options = get_settings()
+    today = today or timezone.localdate()
+    rows = ItemDailySales.objects.filter(
+        date__gte=today - datetime.timedelta(days=options["window"]), date__lt=today,
+    )
+    if branch_ids:
+        rows = rows.filter(branch_id__in=branch_ids)
+    return {
+        item_id: Decimal(quantity) / options["window"]
+        for item_id, quantity in rows.values("item_id").annotate(sold=Sum("quantity")).values_list("item_id", "sold")
+    }
+
+
+def reorder_point(velocity, options):
+    return max(math.ceil(velocity * (options["lead_time"] + options["safety"])), options["min_point"])
+
+
+def plan(stock, velocity, options):
+    """(days of cover, suggested order quantity) for an item at `stock` selling `velocity` a day."""
+    days_of_cover = (Decimal(max(stock, 0)) / velocity).quantize(Decimal("0.1")) if velocity else None
+    target = math.ceil(velocity * (options["lead_time"] + options["safety"] + options["cover"]))
+    return days_of_cover, max(target - max(stock, 0), 0)
+
+
+def refresh_alerts(branch_ids=None, today=None):
+    """
+    Recompute reorder points and alerts for the given branches (all if None).
+    Returns counts: items, reorder_points (changed), alerts (written), cleared.
+    """
+    options = get_settings()
+    sold = velocities(branch_ids, today)
+
+    items = Item.objects.all()
+    if branch_ids:
+        items = items.filter(branch_id__in=branch_ids)
+
+    changed, by_supplier, count = [], defaultdict(list), 0
+    for item_id, branch_id, supplier_id, stock, current_point in items.values_list(
+        "id", "branch_id", "supplier_id", "stock", "reorder_point"
+    ).iterator(chunk_size=2000):
+        count += 1
+        velocity = sold.get(item_id, Decimal("0"))
+        point = reorder_point(velocity, options)
+        if point != current_point:
+            changed.append(Item(pk=item_id, reorder_point=point))
+        if stock > point:
+            continue
+        days_of_cover, suggested = plan(stock, velocity, options)
+        by_supplier[supplier_id].append(InventoryAlert(
+            item_id=item_id, branch_id=branch_id, supplier_id=supplier_id, stock_level=stock,
+            threshold=point, daily_velocity=velocity.quantize(Decimal("0.001")),
+            days_of_cover=days_of_cover, suggested_quantity=suggested,
+        ))
+
+    started = timezone.now()
+    written = 0
+    with transaction.atomic():
+        # reorder points are not shown on the POS: bulk_update skips Item.save() and its catalog version
+        Item.objects.bulk_update(changed, ["reorder_point"], batch_size=1000)
+        for supplier_id in sorted(by_supplier, key=lambda value: (value is None, value)):
+            alerts = by_supplier[supplier_id]
+            InventoryAlert.objects.bulk_create(
+                alerts, batch_size=1000, update_conflicts=True, unique_fields=["item"], update_fields=ALERT_FIELDS,
+            )
+            written += len(alerts)
+        stale = InventoryAlert.objects.filter(updated_at__lt=started)
+        if branch_ids:
+            stale = stale.filter(branch_id__in=branch_ids)
+        cleared = stale.delete()[0]
+
+    if branch_ids:
+        for branch_id in branch_ids:
+            cache.bump(branch_id)
+    else:
+        cache.bump_all()
+    return {"items": count, "reorder_points": len(changed), "alerts": written, "cleared": cleared}
+
+
+def low_stock(branch, limit=50, max_stock=None):
+    """
+    Alerts of a branch still at or below their reorder point (stock read live
+    from Item), least days of cover first, items not selling last. Items
+    without a reorder point or alert yet are included at the default point,
+    as unsaved alerts.
+    """
+    default_point = get_settings()["default_point"]
+    alerts = (
+        InventoryAlert.objects.filter(branch=branch, item__stock__lte=F("threshold"))
+        .select_related("item", "supplier")
+        .order_by(F("days_of_cover").asc(nulls_last=True), "item__stock", "item__name")
+    )
+    unrated = (
+        Item.objects.filter(branch=branch, reorder_point__isnull=True, stock__lte=default_point, alerts__isnull=True)
+        .select_related("supplier")
+        .order_by("stock", "name")
+    )
+    if max_stock is not None:
+        alerts = alerts.filter(item__stock__lte=max_stock)
+        unrated = unrated.filter(stock__lte=max_stock)
+    alerts = list(alerts[:limit]) + [
+        InventoryAlert(item=item, branch=branch, supplier=item.supplier, stock_level=item.stock,
+                       threshold=default_point, days_of_cover=None)
+        for item in unrated[:limit]
+    ]
+    alerts.sort(key=lambda alert: (alert.days_of_cover is None, alert.days_of_cover or 0,
+                                   alert.item.stock, alert.item.name))
+    return alerts[:limit]
+
+
+def record_sold_stock(branch, sale_items):
+    """
+    Called in the checkout transaction, after stock was decremented. One
+    query finds the sold items now at or below their reorder point (the
+    default point until one is computed); their alerts are upserted
+    (velocity and days of cover are left to the batch job) and items that
+    only just crossed it are announced after commit.
+    """
+    sold = defaultdict(int)
+    for sale_item in sale_items:
+        sold[sale_item.item_id] += sale_item.quantity
+    if not sold:
+        return []
+
+    low = list(
+        Item.objects.annotate(point=Coalesce("reorder_point", get_settings()["default_point"]))
+        .filter(pk__in=list(sold), stock__lte=F("point"))
+        .values_list("id", "name", "supplier_id", "stock", "point")
+    )
+    if not low:
+        return []
+
+    InventoryAlert.objects.bulk_create(
+        [
+            InventoryAlert(item_id=item_id, branch=branch, supplier_id=supplier_id, stock_level=stock, threshold=point)
+            for item_id, _, supplier_id, stock, point in low
+        ],
+        update_conflicts=True,
+        unique_fields=["item"],
+        update_fields=["supplier", "stock_level", "threshold", "updated_at"],
+    )
+
+    crossed = [
+        {"item": item_id, "name": name, "stock": stock, "reorder_point": point}
+        for item_id, name, _, stock, point in low
+        if stock + sold[item_id] > point
+    ]
+    if crossed:
+        def announce():
+            for event in crossed:
+                notifications.publish(branch.pk, "low_stock", **event)
+        transaction.on_commit(announce)
+    return crossed
@@ -0,0 +1,319 @@
+# reports/rollups.py
+"""
+Pre-aggregated sales rollups.
+
+DailySalesReport holds one row per branch and business day (Sale.business_date:
+the local date, shifted by the branch's day_rollover_hour), ItemDailySales one
+per branch, business day and item. Checkout adds each new sale to its rows in
+the same transaction (see reports/signals.py), so
+reports read a few hundred small rows instead of grouping the whole Sale
+table. Past days are read from the rollup only; today is always aggregated
+live from Sale (one (branch, business_date) index range), so a report is never ahead
+of or behind the checkouts it describes.
+
+Sales and sale lines edited or deleted one by one (admin, shell) have their
+business days recomputed by reports/signals.py. `manage.py
+rebuild_sales_rollups` recomputes rows from Sale after changes that send no
+signals (queryset update(), raw SQL).
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Subquery, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from branches.models import Branch
+from inventory.models import Item
+from sales.models import Sale, SaleItem
+from .models import DailySalesReport, ItemDailySales
+
+
+ZERO = Decimal("0.00")
+GRAINS = {"day": None, "week": TruncWeek, "month": TruncMonth, "year": TruncYear}
+
+
+def business_today(branch):
+    """The branch's current business day (the local date for every branch at once)."""
+    return branch.business_date() if branch is not None else timezone.localdate()
+
+
+def bucket(day, grain):
+    """First day of the week / month / year containing `day` (same as the Trunc functions)."""
+    if grain == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if grain == "month":
+        return day.replace(day=1)
+    if grain == "year":
+        return day.replace(month=1, day=1)
+    return day
+
+
+# -------------------------------
+# Incremental maintenance
+# -------------------------------
+def record_sales(branch, sales, items=()):
+    """
+    Add freshly saved sales (and their SaleItem rows) to the branch/day rows
+    of ItemDailySales and DailySalesReport. Call inside the checkout transaction.
+    """
+    item_days = defaultdict(lambda: [0, ZERO])
+    for sale_item in items:
+        row = item_days[(sale_item.sale.business_date, sale_item.item_id)]
+        row[0] += sale_item.quantity
+        row[1] += sale_item.price * sale_item.quantity
+    # every item of the cart in one statement, whatever its size
+    increment_rows(ItemDailySales, ("branch", "date", "item"), ("quantity", "revenue"), [
+        (branch.pk, day, item_id, quantity, revenue)
+        for (day, item_id), (quantity, revenue) in sorted(item_days.items())
+    ])
+
+    days = defaultdict(lambda: {"total_sales": ZERO, "gross_sales": ZERO, "total_orders": 0})
+    for sale in sales:
+        day = days[sale.business_date]
+        day["total_sales"] += sale.final_total or ZERO
+        day["gross_sales"] += sale.total or ZERO
+        day["total_orders"] += 1
+    for day, sums in days.items():
+        # the top item is re-read from the item rows just updated (a subquery in the same UPDATE)
+        top = Subquery(
+            ItemDailySales.objects.filter(branch=branch, date=day)
+            .order_by("-quantity", "item__name").values("item__name")[:1]
+        )
+        increment_row(DailySalesReport, {"branch": branch, "date": day}, sums, top_item=top, updated_at=timezone.now())
+
+
+def increment_row(model, key, sums, **assign):
+    """Add `sums` to the row identified by `key`, creating it if needed (one UPDATE when it exists)."""
+    rows = model.objects.filter(**key)
+    changes = {field: F(field) + value for field, value in sums.items()} | assign
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **sums)
+    except IntegrityError:
+        # another checkout created the row first
+        rows.update(**changes)
+        return
+    if assign:
+        rows.update(**assign)
+
+
+UPSERT_CHUNK = 500
+
+
+def increment_rows(model, keys, sums, rows):
+    """
+    Add to many rows of `model` at once, creating the missing ones: one
+    INSERT ... ON CONFLICT (keys) DO UPDATE SET field = field + excluded.field
+    per UPSERT_CHUNK rows (SQLite and PostgreSQL). `keys` must be the model's
+    unique fields; each row is (key values..., values to add...).
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in (*keys, *sums)]
+    columns = [quote(field.column) for field in fields]
+    conflict = ", ".join(columns[:len(keys)])
+    updates = ", ".join(f"{column} = {table}.{column} + excluded.{column}" for column in columns[len(keys):])
+    row_sql = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[start:start + UPSERT_CHUNK]
+        params = [field.get_db_prep_save(value, connection) for row in chunk for field, value in zip(fields, row)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(chunk))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                params,
+            )
+
+
+BUSINESS_DATE_CHUNK = 5000
+
+
+def reset_business_dates(branch):
+    """
+    Recompute Sale.business_date of the branch's sales from their time and the
+    branch's current day_rollover_hour, a chunk of rows per transaction (like
+    sales migration 0014). Returns sales whose business date moved. The
+    rollups then need a rebuild().
+    """
+    moved, last_pk = 0, 0
+    pending = Sale.objects.filter(branch=branch).order_by("pk")
+    while True:
+        rows = list(pending.filter(pk__gt=last_pk).values_list("pk", "datetime", "business_date")[:BUSINESS_DATE_CHUNK])
+        if not rows:
+            break
+        changed = []
+        for pk, when, day in rows:
+            business_date = branch.business_date(when)
+            if business_date != day:
+                changed.append(Sale(pk=pk, business_date=business_date))
+        with transaction.atomic():
+            Sale.objects.bulk_update(changed, ["business_date"], batch_size=1000)
+        moved += len(changed)
+        last_pk = rows[-1][0]
+    return moved
+
+
+def lock_branches(branch_ids=None):
+    """
+    Row-lock the given branches (all if None), in pk order. Checkout holds the
+    same lock from taking its catalog version until it commits, so a rebuild
+    that reads Sale under it sees every sale of those branches its rows will
+    have, and no checkout adds to the rows it replaces meanwhile.
+    """
+    branches = Branch.objects.select_for_update().order_by("pk")
+    if branch_ids:
+        branches = branches.filter(pk__in=branch_ids)
+    list(branches.values_list("pk", flat=True))
+
+
+def rebuild(branch_ids=None, start=None, end=None):
+    """
+    Recompute ItemDailySales and DailySalesReport rows from Sale for the given
+    branches (all if None) and business date range (inclusive, open ended if None).
+    Reads and rewrites in one transaction, under lock_branches().
+    Returns (daily rows, item rows) written.
+    """
+    with transaction.atomic():
+        lock_branches(branch_ids)
+        return _rebuild(branch_ids, start, end)
+
+
+def _rebuild(branch_ids, start, end):
+    sales = Sale.objects.filter(branch__isnull=False)
+    days = DailySalesReport.objects.all()
+    item_days = ItemDailySales.objects.all()
+    if branch_ids:
+        sales = sales.filter(branch_id__in=branch_ids)
+        days = days.filter(branch_id__in=branch_ids)
+        item_days = item_days.filter(branch_id__in=branch_ids)
+    if start:
+        sales = sales.filter(business_date__gte=start)
+        days = days.filter(date__gte=start)
+        item_days = item_days.filter(date__gte=start)
+    if end:
+        sales = sales.filter(business_date__lte=end)
+        days = days.filter(date__lte=end)
+        item_days = item_days.filter(date__lte=end)
+
+    totals = (
+        sales.annotate(day=F("business_date"))
+        .values("branch_id", "day")
+        .annotate(total_sales=Sum("final_total"), gross_sales=Sum("total"), total_orders=Count("id"))
+    )
+    per_item = (
+        SaleItem.objects.filter(sale__in=sales)
+        .annotate(day=F("sale__business_date"))
+        .values("sale__branch_id", "day", "item_id", "item__name")
+        .annotate(total_qty=Sum("quantity"), revenue=Sum(F("price") * F("quantity")))
+    )
+
+    item_rows, best = [], {}
+    for row in per_item:
+        key = (row["sale__branch_id"], row["day"])
+        item_rows.append(ItemDailySales(
+            branch_id=key[0], date=key[1], item_id=row["item_id"],
+            quantity=row["total_qty"], revenue=row["revenue"] or ZERO,
+        ))
+        candidate = (-row["total_qty"], row["item__name"])
+        if key not in best or candidate < best[key]:
+            best[key] = candidate
+
+    day_rows = [
+        DailySalesReport(
+            branch_id=row["branch_id"],
+            date=row["day"],
+            total_sales=row["total_sales"] or ZERO,
+            gross_sales=row["gross_sales"] or ZERO,
+            total_orders=row["total_orders"],
+            top_item=best.get((row["branch_id"], row["day"]), (0, None))[1],
+        )
+        for row in totals
+    ]
+    days.delete()
+    item_days.delete()
+    ItemDailySales.objects.bulk_create(item_rows, batch_size=1000)
+    DailySalesReport.objects.bulk_create(day_rows, batch_size=1000)
+    return len(day_rows), len(item_rows)
+
+
+# -------------------------------
+# Reads
+# -------------------------------
+def live_day(branch, day, user=None):
+    """Today's (or any business day's) sums straight from Sale. branch=None means every branch."""
+    sales = Sale.objects.filter(business_date=day)
+    if branch is not None:
+        sales = sales.filter(branch=branch)
+    if user is not None:
+        sales = sales.filter(user=user)
+    sums = sales.aggregate(total_sales=Sum("final_total"), gross_sales=Sum("total"), total_orders=Count("id"))
+    return {
+        "total_sales": sums["total_sales"] or ZERO,
+        "gross_sales": sums["gross_sales"] or ZERO,
+        "total_orders": sums["total_orders"],
+    }
+
+
+def sales_series(branch, grain="day", start=None, end=None, field="total_sales"):
+    """
+    [(bucket date, value)] of a rollup field per day / week / month / year,
+    oldest first. Past days come from DailySalesReport, today from live_day().
+    branch=None sums every branch.
+    """
+    today = business_today(branch)
+    rows = DailySalesReport.objects.filter(date__lt=today)
+    if branch is not None:
+        rows = rows.filter(branch=branch)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+
+    trunc = GRAINS[grain]
+    rows = rows.annotate(bucket=trunc("date") if trunc else F("date"))
+    series = defaultdict(lambda: ZERO)
+    for row in rows.values("bucket").annotate(value=Sum(field)).order_by("bucket"):
+        series[row["bucket"]] += row["value"] or ZERO
+
+    if (start is None or start <= today) and (end is None or end >= today):
+        live = live_day(branch, today)
+        if live["total_orders"]:
+            series[bucket(today, grain)] += live[field]
+    return sorted(series.items())
+
+
+def sales_total(branch, field="total_sales"):
+    """All-time value of a rollup field (past days from rollups plus today live)."""
+    today = business_today(branch)
+    rows = DailySalesReport.objects.filter(date__lt=today)
+    if branch is not None:
+        rows = rows.filter(branch=branch)
+    return (rows.aggregate(value=Sum(field))["value"] or ZERO) + live_day(branch, today)[field]
+
+
+def top_items(branch, start=None, end=None, limit=10, order_by="quantity"):
+    """
+    Best selling items of a branch over a local date window (inclusive, open
+    ended if None), from ItemDailySales: dicts with item_id, item__name,
+    quantity and revenue. Items are grouped by id, so two items sharing a
+    name stay apart; names are read for the top rows only.
+    """
+    rows = ItemDailySales.objects.filter(branch=branch)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    rows = list(
+        rows.values("item_id")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .order_by(f"-{order_by}", "item_id")[:limit]
+    )
+    names = dict(Item.objects.filter(pk__in=[row["item_id"] for row in rows]).values_list("pk", "name"))
+    for row in rows:
+        row["item__name"] = names.get(row["item_id"])
+    return rows
@@ -0,0 +1,83 @@
+# reports/signals.py
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from inventory.models import Item
+from sales.models import Sale, SaleItem
+from sales.signals import sales_recorded
+from . import cache, cube, live, reorder, rollups, sketches
+
+
+# Keep the daily rollups, the hourly cube and low stock alerts in step with checkout,
+# in the checkout's own transaction (the live sketches and feed once it commits)
+@receiver(sales_recorded)
+def update_rollups(sender, branch, sales, items, **kwargs):
+    rollups.record_sales(branch, sales, items)
+    live.announce_sales(branch, sales)
+    cube.record_sales(branch, sales)
+    reorder.record_sold_stock(branch, items)
+    sketches.record_sales(branch, sales, items)
+    cache.bump(branch.pk)
+
+
+# -------------------------------
+# Edits and deletes (admin, shell)
+# -------------------------------
+def rebuild_days(days):
+    """Recompute the rollups and cube of the given (branch id, business date) days from Sale."""
+    with transaction.atomic():
+        for branch_id, day in sorted(day for day in days if day and day[0]):
+            rollups.rebuild([branch_id], day, day)
+            cube.rebuild([branch_id], day, day)
+            cache.bump(branch_id)
+
+
+def sale_day(sale_id):
+    return Sale.objects.filter(pk=sale_id).values_list("branch_id", "business_date").first()
+
+
+def deleting_sale(origin):
+    return isinstance(origin, Sale) or (isinstance(origin, QuerySet) and origin.model is Sale)
+
+
+# the day a sale or line leaves (moved to another branch, time or sale) is recomputed too
+@receiver(pre_save, sender=Sale)
+def sale_saving(sender, instance, raw=False, **kwargs):
+    instance._report_day = sale_day(instance.pk) if instance.pk and not raw else None
+
+
+@receiver(pre_save, sender=SaleItem)
+def sale_item_saving(sender, instance, raw=False, **kwargs):
+    old_sale_id = None
+    if instance.pk and not raw:
+        old_sale_id = SaleItem.objects.filter(pk=instance.pk).values_list("sale_id", flat=True).first()
+    instance._report_day = sale_day(old_sale_id) if old_sale_id else None
+
+
+# New sales arrive through sales_recorded; an edited sale's days are rebuilt
+@receiver(post_save, sender=Sale)
+def sale_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        rebuild_days({getattr(instance, "_report_day", None), (instance.branch_id, instance.business_date)})
+
+
+@receiver(post_delete, sender=Sale)
+def sale_deleted(sender, instance, **kwargs):
+    rebuild_days({(instance.branch_id, instance.business_date)})
+
+
+# Lines added in the admin, edited or removed; a deleted sale's lines are left to sale_deleted
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=SaleItem)
+def sale_item_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or deleting_sale(origin):
+        return
+    rebuild_days({getattr(instance, "_report_day", None), sale_day(instance.sale_id)})
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def report_source_changed(sender, instance, **kwargs):
+    cache.bump(instance.branch_id)
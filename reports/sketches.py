@@ -0,0 +1,373 @@
+# reports/sketches.py
+"""
+Live (today's) top sellers and ticket sizes from streaming sketches.
+
+Every branch keeps, for its current business day, two small summaries that
+checkout updates once its transaction commits (see reports/signals.py):
+
+  - a Space-Saving summary of units sold per item: at most LIVE_TOP_CAPACITY
+    counters; an item that is not tracked takes over the smallest counter.
+    Each count is an upper bound, over by at most its `error`, and any item
+    selling more than 1/capacity of today's units is sure to be tracked,
+  - a t-digest of Sale.final_total: a few hundred weighted centroids, finest
+    at the tails, from which any percentile of today's tickets is read.
+
+Both fit in a few kilobytes whatever the day's volume, so the live endpoints
+answer from memory without touching SaleItem. The summaries are saved as a
+LiveSketch row every LIVE_PERSIST_EVERY sales or LIVE_PERSIST_SECONDS; at
+worst a process that dies forgets the sales since its last save, which a
+live view can live with.
+
+Each worker process counts the checkouts it handled itself and saves them
+in its own row (LiveSketch.worker). The live views merge this process's
+summaries with the other rows of the day, re-read every LIVE_PERSIST_SECONDS
+(both summaries are mergeable), so every worker answers for all of them.
+
+Rows are only read for the current business day. Rows not saved for
+LIVE_SKETCH_KEEP_HOURS (past days, and processes long gone) are deleted by
+prune(): whenever a process moves a branch on to a new business day, and
+by `manage.py rebuild_sales_rollups`.
+"""
+import datetime
+import math
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LiveSketch
+
+
+def get_settings():
+    return {
+        "capacity": getattr(settings, "LIVE_TOP_CAPACITY", 200),
+        "compression": getattr(settings, "LIVE_TDIGEST_COMPRESSION", 100),
+        "persist_every": getattr(settings, "LIVE_PERSIST_EVERY", 25),
+        "persist_seconds": getattr(settings, "LIVE_PERSIST_SECONDS", 60),
+        "keep_hours": getattr(settings, "LIVE_SKETCH_KEEP_HOURS", 48),
+    }
+
+
+# -------------------------------
+# Space-Saving (heavy hitters)
+# -------------------------------
+class SpaceSaving:
+    def __init__(self, capacity, counters=None, total=0):
+        self.capacity = capacity
+        self.counters = counters or {}  # key -> [count, error]
+        self.total = total              # everything added, tracked or not
+
+    def add(self, key, weight=1):
+        self.total += weight
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+        else:
+            # the newcomer inherits the smallest count as its possible overestimate
+            smallest = min(self.counters, key=lambda k: self.counters[k][0])
+            floor = self.counters.pop(smallest)[0]
+            self.counters[key] = [floor + weight, floor]
+
+    def top(self, limit):
+        """[(key, count, error)] of the largest counts, largest first."""
+        rows = sorted(self.counters.items(), key=lambda kv: (-kv[1][0], kv[1][1]))[:limit]
+        return [(key, count, error) for key, (count, error) in rows]
+
+    def to_dict(self):
+        return {"total": self.total, "counters": [[key, c, e] for key, (c, e) in self.counters.items()]}
+
+    @classmethod
+    def from_dict(cls, data, capacity):
+        return cls(capacity, {key: [count, error] for key, count, error in data.get("counters", [])},
+                   data.get("total", 0))
+
+    @classmethod
+    def merged(cls, summaries, capacity):
+        """
+        One summary of several: counts add up. A full summary that doesn't
+        track a key may have seen it up to its smallest count, which is added
+        to both the key's count and its error, so the bounds still hold.
+        """
+        floors = [
+            min(count for count, _ in summary.counters.values()) if len(summary.counters) >= summary.capacity else 0
+            for summary in summaries
+        ]
+        counters = {}
+        for key in set().union(*(summary.counters for summary in summaries)):
+            count = error = 0
+            for summary, floor in zip(summaries, floors):
+                counter = summary.counters.get(key, (floor, floor))
+                count += counter[0]
+                error += counter[1]
+            counters[key] = [count, error]
+        kept = sorted(counters, key=lambda key: -counters[key][0])[:capacity]
+        return cls(capacity, {key: counters[key] for key in kept}, sum(summary.total for summary in summaries))
+
+
+# -------------------------------
+# t-digest (quantiles)
+# -------------------------------
+class TDigest:
+    """
+    Merging t-digest (k1 scale function). Values are buffered and merged into
+    the sorted centroids when the buffer fills or a quantile is asked for.
+    """
+
+    def __init__(self, compression, centroids=None, count=0, low=None, high=None):
+        self.compression = compression
+        self.centroids = centroids or []  # [mean, weight], sorted by mean
+        self.buffer = []
+        self.count = count
+        self.min = low
+        self.max = high
+
+    def add(self, value, weight=1):
+        value = float(value)
+        self.buffer.append([value, weight])
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.buffer) >= 5 * self.compression:
+            self._merge()
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _q(self, k):
+        angle = k * 2 * math.pi / self.compression
+        return 1.0 if angle >= math.pi / 2 else (math.sin(angle) + 1) / 2
+
+    def _merge(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        merged = [list(points[0])]
+        before = 0.0                                  # weight of the centroids before the current one
+        limit = self._q(self._k(0.0) + 1)
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            if (before + current[1] + weight) / self.count <= limit:
+                current[0] += (mean - current[0]) * weight / (current[1] + weight)
+                current[1] += weight
+            else:
+                before += current[1]
+                limit = self._q(self._k(before / self.count) + 1)
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q):
+        """Estimated value at quantile q (0..1); None when empty."""
+        self._merge()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        rank = min(max(q, 0.0), 1.0) * self.count
+        first_mean, first_weight = self.centroids[0]
+        if rank <= first_weight / 2:
+            return self.min + (first_mean - self.min) * rank / (first_weight / 2)
+        # between the centers of two neighbouring centroids: linear interpolation
+        before = 0.0
+        for (mean, weight), (next_mean, next_weight) in zip(self.centroids, self.centroids[1:]):
+            left = before + weight / 2
+            right = before + weight + next_weight / 2
+            if rank <= right:
+                return mean + (next_mean - mean) * (rank - left) / (right - left)
+            before += weight
+        last_mean, last_weight = self.centroids[-1]
+        tail = (rank - (self.count - last_weight / 2)) / (last_weight / 2)
+        return last_mean + (self.max - last_mean) * min(tail, 1.0)
+
+    def to_dict(self):
+        self._merge()
+        return {"centroids": self.centroids, "count": self.count, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data, compression):
+        return cls(compression, [list(c) for c in data.get("centroids", [])], data.get("count", 0),
+                   data.get("min"), data.get("max"))
+
+    @classmethod
+    def merged(cls, digests, compression):
+        """One digest of several: their centroids merged as weighted values."""
+        merged = cls(compression)
+        for digest in digests:
+            digest._merge()
+            merged.buffer.extend(list(centroid) for centroid in digest.centroids)
+            merged.count += digest.count
+            for value in (digest.min, digest.max):
+                if value is not None:
+                    merged.min = value if merged.min is None else min(merged.min, value)
+                    merged.max = value if merged.max is None else max(merged.max, value)
+        merged._merge()
+        return merged
+
+
+# -------------------------------
+# Per-branch live summaries
+# -------------------------------
+class BranchSketch:
+    def __init__(self, branch_id, day, options, state=None):
+        state = state or {}
+        self.branch_id = branch_id
+        self.date = day
+        self.items = SpaceSaving.from_dict(state.get("items", {}), options["capacity"])
+        self.tickets = TDigest.from_dict(state.get("tickets", {}), options["compression"])
+        self.sales = state.get("sales", 0)
+        self.revenue = state.get("revenue", 0.0)
+        self.lock = threading.Lock()
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+        self.peers = None  # the other processes' rows of the day, as BranchSketches
+        self.peers_at = None
+
+    def add(self, totals, quantities):
+        with self.lock:
+            for total in totals:
+                self.tickets.add(total)
+                self.revenue += float(total)
+            self.sales += len(totals)
+            for item_id, quantity in quantities:
+                self.items.add(item_id, quantity)
+            self.unsaved += len(totals)
+
+    def state(self):
+        return {
+            "sales": self.sales,
+            "revenue": round(self.revenue, 2),
+            "items": self.items.to_dict(),
+            "tickets": self.tickets.to_dict(),
+        }
+
+    def persist_due(self, options):
+        return self.unsaved and (
+            self.unsaved >= options["persist_every"]
+            or time.monotonic() - self.saved_at >= options["persist_seconds"]
+        )
+
+    def persist(self):
+        with self.lock:
+            state = self.state()
+            self.unsaved = 0
+            self.saved_at = time.monotonic()
+        LiveSketch.objects.update_or_create(
+            branch_id=self.branch_id, date=self.date, worker=worker_id(),
+            defaults={"sales": state["sales"], "state": state},
+        )
+
+    def combined(self, options):
+        """(items, tickets, sales, revenue) of this process merged with the other processes' saved rows."""
+        if self.peers is None or time.monotonic() - self.peers_at >= options["persist_seconds"]:
+            states = (
+                LiveSketch.objects.filter(branch_id=self.branch_id, date=self.date)
+                .exclude(worker=worker_id()).values_list("state", flat=True)
+            )
+            self.peers = [BranchSketch(self.branch_id, self.date, options, state) for state in states]
+            self.peers_at = time.monotonic()
+        sketches = [self] + self.peers
+        with self.lock:
+            return (
+                SpaceSaving.merged([sketch.items for sketch in sketches], options["capacity"]),
+                TDigest.merged([sketch.tickets for sketch in sketches], options["compression"]),
+                sum(sketch.sales for sketch in sketches),
+                sum(sketch.revenue for sketch in sketches),
+            )
+
+
+_sketches = {}
+_lock = threading.Lock()
+_worker = None  # (pid, id): a forked process gets its own id
+
+
+def worker_id():
+    """This process's LiveSketch.worker."""
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():
+        _worker = (os.getpid(), f"{os.getpid()}-{uuid.uuid4().hex[:12]}")
+    return _worker[1]
+
+
+def sketch(branch, day=None):
+    """
+    This process's summaries of the branch for `day` (default its business
+    day now). A process starts empty: what a previous one saved is merged
+    in as one of the other rows.
+    """
+    branch_id = branch.pk
+    day = day or branch.business_date()
+    previous = None
+    with _lock:
+        current = _sketches.get(branch_id)
+        if current is None or current.date != day:
+            previous = current
+            current = _sketches[branch_id] = BranchSketch(branch_id, day, get_settings())
+    if previous is not None:
+        # yesterday's last sales, saved outside _lock: other branches' checkouts don't wait on it
+        if previous.unsaved:
+            previous.persist()
+        prune()
+    return current
+
+
+def prune():
+    """Delete LiveSketch rows not saved for LIVE_SKETCH_KEEP_HOURS. Returns rows deleted."""
+    cutoff = timezone.now() - datetime.timedelta(hours=get_settings()["keep_hours"])
+    return LiveSketch.objects.filter(updated_at__lt=cutoff).delete()[0]
+
+
+def record_sales(branch, sales, items=()):
+    """
+    Called in the checkout transaction; today's sales are added to the
+    branch's summaries once it commits (a rolled back checkout never counts).
+    """
+    today = branch.business_date()
+    totals = [sale.final_total or 0 for sale in sales if sale.business_date == today]
+    quantities = [
+        (sale_item.item_id, sale_item.quantity) for sale_item in items
+        if sale_item.sale.business_date == today
+    ]
+    if not totals and not quantities:
+        return
+
+    def apply():
+        current = sketch(branch, today)
+        current.add(totals, quantities)
+        if current.persist_due(get_settings()):
+            current.persist()
+    transaction.on_commit(apply)
+
+
+def top_items(branch, limit=10):
+    """
+    Today's best sellers, ([(item id, units, error)], units sold in all);
+    each item's units are over by at most its error.
+    """
+    items, _, _, _ = sketch(branch).combined(get_settings())
+    return items.top(limit), items.total
+
+
+def ticket_summary(branch, quantiles):
+    """Today's number of sales, revenue, min / max ticket and {q: ticket at quantile q}."""
+    _, digest, sales, revenue = sketch(branch).combined(get_settings())
+    return {
+        "sales": sales,
+        "revenue": round(revenue, 2),
+        "min": digest.min,
+        "max": digest.max,
+        "quantiles": {q: digest.quantile(q) for q in quantiles},
+    }
+
+
+def reset():
+    """Drop every in-memory summary and the worker id, like a restart (tests)."""
+    global _worker
+    with _lock:
+        _sketches.clear()
+        _worker = None
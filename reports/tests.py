@@ -1,3 +1,870 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import functools
+import importlib
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as default_cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from branches.models import Branch
+from customers.models import Customer
+from inventory.models import Item
+from sales.models import Sale, SaleItem
+from .models import (
+    DailySalesReport, ExportJob, HourlySalesCube, InventoryAlert, ItemAssociation, ItemDailySales, LiveSketch,
+)
+from . import baskets, columnar, cube, exports, forecast, jobs, live, notifications, reorder, rollups, sketches
+
+
+User = get_user_model()
+
+
+class ReportTestCase(TestCase):
+    def setUp(self):
+        self.branch = Branch.objects.create(name="Main")
+        self.admin = User.objects.create_user("admin", password="pw", role="admin", branch=self.branch)
+        self.tea = Item.objects.create(name="Tea", price=Decimal("2.50"), stock=500, branch=self.branch)
+        self.cake = Item.objects.create(name="Cake", price=Decimal("4.00"), stock=500, branch=self.branch)
+        self.client.force_login(self.admin)
+
+    def cart(self, *lines, **extra):
+        return {"items": [{"id": item.pk, "quantity": qty} for item, qty in lines], "order_type": "takeaway", **extra}
+
+    def sell(self, *lines, **extra):
+        response = self.client.post(reverse("sales:checkout"), json.dumps(self.cart(*lines, **extra)),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return Sale.objects.get(pk=response.json()["sale_id"])
+
+    def sell_batch(self, *entries):
+        response = self.client.post(reverse("sales:checkout_batch"), json.dumps({"sales": list(entries)}),
+                                    content_type="application/json")
+        self.assertEqual({result["status"] for result in response.json()["results"]}, {"created"})
+
+
+class RollupTests(ReportTestCase):
+    def rollup_rows(self):
+        return (
+            sorted(DailySalesReport.objects.values_list("branch_id", "date", "total_sales", "gross_sales",
+                                                        "total_orders", "top_item")),
+            sorted(ItemDailySales.objects.values_list("branch_id", "date", "item_id", "quantity", "revenue")),
+        )
+
+    def test_checkout_matches_rebuild(self):
+        self.sell((self.tea, 1))
+        self.sell((self.cake, 3), (self.tea, 2), discount=10)
+        two_days_ago = timezone.now() - datetime.timedelta(days=2)
+        self.sell_batch(
+            self.cart((self.tea, 4), sold_at=two_days_ago.isoformat()),
+            self.cart((self.cake, 1), sold_at=two_days_ago.isoformat()),
+        )
+        incremental = self.rollup_rows()
+        self.assertEqual(len(incremental[0]), 2)
+
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+        today = DailySalesReport.objects.get(date=self.branch.business_date())
+        self.assertEqual((today.total_orders, today.gross_sales, today.total_sales),
+                         (2, Decimal("19.50"), Decimal("17.80")))
+        self.assertEqual(today.top_item, "Cake")
+
+    def test_manual_sale(self):
+        self.client.post(reverse("sales:sale_create"), {
+            "items": [self.tea.pk, self.cake.pk], "quantities": ["2", "1"],
+            "payment_method": "cash", "order_type": "takeaway", "discount": "50",
+        })
+        sale = Sale.objects.get()
+        self.assertEqual((sale.total, sale.discount_amount, sale.final_total),
+                         (Decimal("9.00"), Decimal("4.50"), Decimal("4.50")))
+        incremental = self.rollup_rows()
+        self.assertEqual(incremental[0][0][2], Decimal("4.50"))
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_edits_and_deletes_follow(self):
+        first = self.sell((self.tea, 1), (self.cake, 1))
+        second = self.sell((self.tea, 2))
+
+        def assertMatchesRebuild():
+            cells = lambda: sorted(HourlySalesCube.objects.values_list("date", "hour", "payment_method", *cube.MEASURES))
+            kept = self.rollup_rows(), cells()
+            rollups.rebuild()
+            cube.rebuild()
+            self.assertEqual((self.rollup_rows(), cells()), kept)
+
+        # moved to another day: both days are recomputed
+        first.datetime -= datetime.timedelta(days=3)
+        first.payment_method = "card"
+        first.save()
+        assertMatchesRebuild()
+        self.assertEqual(DailySalesReport.objects.count(), 2)
+
+        line = second.items.get()
+        line.quantity = 5
+        line.save()
+        assertMatchesRebuild()
+        self.assertEqual(ItemDailySales.objects.get(date=second.business_date).quantity, 5)
+
+        first.items.get(item=self.cake).delete()
+        assertMatchesRebuild()
+        second.delete()
+        assertMatchesRebuild()
+        self.assertEqual(list(DailySalesReport.objects.values_list("date", "total_orders", "top_item")),
+                         [(first.business_date, 1, "Tea")])
+
+    def test_sales_series(self):
+        today = self.branch.business_date()
+        DailySalesReport.objects.create(branch=self.branch, date=today - datetime.timedelta(days=1),
+                                        total_sales=Decimal("7.00"), total_orders=1)
+        self.sell((self.tea, 2))
+        # past days from the rollup, today live
+        DailySalesReport.objects.filter(date=today).update(total_sales=Decimal("999.00"))
+        self.assertEqual(
+            rollups.sales_series(self.branch, start=today - datetime.timedelta(days=1)),
+            [(today - datetime.timedelta(days=1), Decimal("7.00")), (today, Decimal("5.00"))],
+        )
+        self.assertEqual(rollups.sales_total(self.branch), Decimal("12.00"))
+        if (today - datetime.timedelta(days=1)).month == today.month:
+            self.assertEqual(rollups.sales_series(self.branch, grain="month"),
+                             [(today.replace(day=1), Decimal("12.00"))])
+
+    def test_top_items(self):
+        twin = Item.objects.create(name="Tea", price=Decimal("10.00"), stock=500, branch=self.branch)
+        self.sell((self.tea, 3), (self.cake, 2), (twin, 1))
+        by_quantity = rollups.top_items(self.branch)
+        self.assertEqual([(row["item_id"], row["quantity"]) for row in by_quantity],
+                         [(self.tea.pk, 3), (self.cake.pk, 2), (twin.pk, 1)])
+        self.assertEqual(by_quantity[2]["item__name"], "Tea")  # two items named Tea stay apart
+        by_revenue = rollups.top_items(self.branch, order_by="revenue", limit=2)
+        self.assertEqual([(row["item_id"], row["revenue"]) for row in by_revenue],
+                         [(twin.pk, Decimal("10.00")), (self.cake.pk, Decimal("8.00"))])
+
+    def test_checkout_queries_independent_of_cart_size(self):
+        items = [Item.objects.create(name=f"Item {n}", price=Decimal("1.00"), stock=500, branch=self.branch)
+                 for n in range(30)]
+        lines = [(item, 2) for item in items]
+
+        def first_sale_of_day(*cart):
+            DailySalesReport.objects.all().delete()
+            ItemDailySales.objects.all().delete()
+            HourlySalesCube.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.sell(*cart)
+            return len(queries)
+
+        # the day's first sale creates its rows, later ones only add to them: either way the
+        # same number of queries for 1 line or 30
+        self.assertEqual(first_sale_of_day(*lines), first_sale_of_day((self.tea, 1)))
+        with CaptureQueriesContext(connection) as queries:
+            self.sell((self.tea, 1))
+        with self.assertNumQueries(len(queries)):
+            self.sell(*lines)
+        with self.assertNumQueries(len(queries)):
+            self.sell(*lines)
+        self.assertEqual(ItemDailySales.objects.get(item=items[0]).quantity, 4)
+        self.assertEqual(ItemDailySales.objects.get(item=items[0]).revenue, Decimal("4.00"))
+
+
+class CubeTests(ReportTestCase):
+    def cells(self):
+        return sorted(HourlySalesCube.objects.values_list(
+            "branch_id", "date", "hour", "payment_method", "order_type", *cube.MEASURES,
+        ))
+
+    def test_checkout_matches_rebuild(self):
+        self.branch.day_rollover_hour = 4
+        self.branch.save()
+        self.sell((self.tea, 1))
+        self.sell((self.cake, 2), discount=10, payment_method="card")
+        self.sell((self.tea, 2), payment_method="mixed", cash_amount="2", card_amount="3")
+        # 01:30 local two days ago counts for the business day before, in hour 1
+        local = timezone.localtime() - datetime.timedelta(days=2)
+        night = local.replace(hour=1, minute=30, second=0, microsecond=0)
+        self.sell_batch(
+            self.cart((self.cake, 1), sold_at=night.isoformat()),
+            self.cart((self.tea, 1), sold_at=night.isoformat(), order_type="delivery"),
+        )
+        incremental = self.cells()
+        night_cells = [cell for cell in incremental if cell[1] == night.date() - datetime.timedelta(days=1)]
+        self.assertEqual({(cell[2], cell[4]) for cell in night_cells}, {(1, "takeaway"), (1, "delivery")})
+
+        cube.rebuild()
+        self.assertEqual(self.cells(), incremental)
+
+    def test_query(self):
+        self.sell((self.tea, 2), payment_method="card")
+        self.sell((self.cake, 1))
+        self.sell((self.cake, 1), payment_method="card", order_type="delivery")
+        by_method = cube.query(self.branch, group_by=["payment_method"], measures=["orders", "final_total"])
+        self.assertEqual(by_method, [
+            {"payment_method": "card", "orders": 2, "final_total": Decimal("9.00")},
+            {"payment_method": "cash", "orders": 1, "final_total": Decimal("4.00")},
+        ])
+        [total] = cube.query(self.branch, filters={"order_type": "takeaway"}, measures=["orders"])
+        self.assertEqual(total, {"orders": 2})
+        with self.assertRaises(cube.CubeError):
+            cube.query(self.branch, group_by=["cashier"])
+
+
+class ExportJobTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(EXPORT_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.sell((self.tea, 2))
+        self.sell((self.cake, 1))
+
+    def test_csv_and_xlsx(self):
+        from openpyxl import load_workbook
+
+        for format in ("csv", "xlsx"):
+            job = jobs.create(self.admin, self.branch, format, items=True)
+            self.assertEqual(jobs.claim_next(), job)
+            self.assertTrue(jobs.run(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.progress, job.rows_total), ("done", 100, 2))
+            self.assertEqual(list(jobs.get_export_root().glob("*.tmp")), [])
+            path = jobs.file_path(job)
+            if format == "csv":
+                self.assertEqual(len(path.read_text().splitlines()), 3)
+            else:
+                rows = list(load_workbook(path, read_only=True).active.values)
+                self.assertEqual([row[7] for row in rows[1:]], ["Cake", "Tea"])
+
+    def test_stale_job_fails(self):
+        job = jobs.create(self.admin, self.branch, "csv")
+        jobs.claim_next()
+        # the worker died while writing
+        jobs.get_export_root().mkdir(parents=True, exist_ok=True)
+        jobs.temp_path(job).write_text("ID,Date\n")
+        ExportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - jobs.get_timeout())
+        self.assertIsNone(jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertFalse(jobs.temp_path(job).exists())
+
+        ExportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - jobs.get_ttl())
+        self.assertEqual(jobs.prune(), 1)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_late_finish_stays_failed(self):
+        job = jobs.create(self.admin, self.branch, "csv")
+        jobs.claim_next()
+        ExportJob.objects.filter(pk=job.pk).update(status="failed")
+        self.assertFalse(jobs.run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(list(jobs.get_export_root().iterdir()), [])
+
+
+class ExportTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        three_days_ago = timezone.now() - datetime.timedelta(days=3)
+        self.sell_batch(self.cart((self.tea, 4), sold_at=three_days_ago.isoformat()))
+        self.old = Sale.objects.get()
+        self.sales = [self.sell((self.tea, 1)), self.sell((self.tea, 2)), self.sell((self.cake, 1), (self.tea, 3))]
+        customer = Customer.objects.create(name="Café Nour", branch=self.branch)
+        Sale.objects.filter(pk=self.sales[0].pk).update(customer=customer)
+        other = Branch.objects.create(name="Other")
+        Sale.objects.create(user=self.admin, branch=other, total=Decimal("9.00"), final_total=Decimal("9.00"))
+
+    def csv(self, **params):
+        response = self.client.get(reverse("reports:export_sales_csv"), params)
+        self.assertEqual(response.status_code, 200)
+        chunks = list(response.streaming_content)
+        return chunks, list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+    def test_csv_streams_in_chunks(self):
+        # two rows per database read and per response chunk
+        with (
+            override_settings(EXPORT_CHUNK_SIZE=2),
+            mock.patch("reports.exports.stream_csv", functools.partial(exports.stream_csv, rows_per_chunk=2)),
+        ):
+            response = self.client.get(reverse("reports:export_sales_csv"))
+            chunks = list(response.streaming_content)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="sales_report_Main.csv"')
+        # header + 4 sales, newest first; every chunk holds whole rows
+        self.assertEqual(len(chunks), 3)
+        rows = [list(csv.reader(io.StringIO(chunk.decode("utf-8")))) for chunk in chunks]
+        self.assertEqual([len(chunk_rows) for chunk_rows in rows], [2, 2, 1])
+        rows = sum(rows, [])
+        self.assertEqual(rows[0], exports.SALE_HEADER)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [sale.pk for sale in reversed(self.sales)] + [self.old.pk])
+        self.assertEqual(rows[3][2:], ["Café Nour (Regular)", "2.50", "0.00", "2.50", "cash"])
+        self.assertEqual(rows[4][3], "10.00")
+        # UTF-8 on the wire
+        self.assertIn("Café Nour".encode("utf-8"), chunks[1])
+
+    def test_csv_filters(self):
+        day = self.old.business_date.isoformat()
+        _, rows = self.csv(start=day, end=day)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.old.pk])
+
+        today = self.branch.business_date().isoformat()
+        _, rows = self.csv(start=today, end=today, items="1")
+        self.assertEqual(rows[0], exports.SALE_HEADER + exports.ITEM_HEADER)
+        # one row per line: the two-line sale first, its sale columns repeated
+        self.assertEqual([(int(row[0]), row[7], row[8]) for row in rows[1:]], [
+            (self.sales[2].pk, "Cake", "1"), (self.sales[2].pk, "Tea", "3"),
+            (self.sales[1].pk, "Tea", "2"), (self.sales[0].pk, "Tea", "1"),
+        ])
+
+        response = self.client.get(reverse("reports:export_sales_csv"), {"start": "yesterday", "end": today})
+        self.assertEqual(response.status_code, 400)
+
+    def xlsx(self, **params):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse("reports:export_sales_xlsx"), params)
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)
+        return {sheet.title: list(sheet.values) for sheet in workbook.worksheets}
+
+    def test_xlsx_splits_sheets(self):
+        # 4 sales at 3 rows a sheet, the header repeated on each
+        with mock.patch("reports.exports.XLSX_MAX_ROWS", 3):
+            sheets = self.xlsx()
+        self.assertEqual(list(sheets), ["Sales", "Sales (2)"])
+        self.assertEqual([len(rows) for rows in sheets.values()], [3, 3])
+        self.assertEqual({rows[0] for rows in sheets.values()}, {tuple(exports.SALE_HEADER)})
+        self.assertEqual([row[0] for rows in sheets.values() for row in rows[1:]],
+                         [sale.pk for sale in reversed(self.sales)] + [self.old.pk])
+        # typed cells: money as numbers, the time as a local datetime
+        self.assertEqual(sheets["Sales"][1][5], 11.5)
+        self.assertIsInstance(sheets["Sales"][1][1], datetime.datetime)
+
+    def test_xlsx_lines_and_inventory(self):
+        today = self.branch.business_date().isoformat()
+        sheets = self.xlsx(kind="lines", start=today, end=today)
+        self.assertEqual(list(sheets), ["Sale lines"])
+        rows = sheets["Sale lines"]
+        self.assertEqual(rows[0], tuple(exports.LINE_HEADER))
+        self.assertEqual([(row[0], row[5], row[7]) for row in rows[1:]], [
+            (self.sales[2].pk, "Cake", 1), (self.sales[2].pk, "Tea", 3),
+            (self.sales[1].pk, "Tea", 2), (self.sales[0].pk, "Tea", 1),
+        ])
+
+        sheets = self.xlsx(kind="inventory")
+        self.assertEqual(list(sheets), ["Inventory"])
+        self.assertEqual(sheets["Inventory"][0], tuple(exports.INVENTORY_HEADER))
+        # the branch's items by name, with the stock left after the sales
+        self.assertEqual([(row[1], row[7]) for row in sheets["Inventory"][1:]], [("Cake", 499), ("Tea", 490)])
+
+        response = self.client.get(reverse("reports:export_sales_xlsx"), {"kind": "customers"})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(EXPORT_XLSX_INLINE_ROWS=3)
+    def test_large_xlsx_is_queued(self):
+        from openpyxl import load_workbook
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        # 2 items are built in the request, 4 of today's lines go to a job
+        self.assertEqual(list(self.xlsx(kind="inventory")), ["Inventory"])
+        today = self.branch.business_date().isoformat()
+        response = self.client.get(reverse("reports:export_sales_xlsx"), {"kind": "lines", "start": today, "end": today})
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get(pk=response.json()["id"])
+        self.assertEqual((job.format, job.params["kind"], job.params["start"]), ("xlsx", "lines", today))
+
+        with override_settings(EXPORT_ROOT=root):
+            self.assertTrue(jobs.run(jobs.claim_next()))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.rows_total, job.rows_done), ("done", 4, 4))
+            self.assertTrue(job.file.endswith("-lines-main.xlsx"))
+            sheet = load_workbook(jobs.file_path(job), read_only=True)["Sale lines"]
+            self.assertEqual([row[5] for row in list(sheet.values)[1:]], ["Cake", "Tea", "Tea", "Tea"])
+
+        with self.assertRaises(jobs.JobError):
+            jobs.create(self.admin, self.branch, "csv", kind="lines")
+
+
+class ColumnarExportTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.sell_batch(self.cart((self.tea, 4), sold_at=(timezone.now() - datetime.timedelta(days=45)).isoformat()))
+        self.old = Sale.objects.get()
+        self.sale = self.sell((self.tea, 1), (self.cake, 2))
+        self.other = Branch.objects.create(name="Other")
+        juice = Item.objects.create(name="Juice", price=Decimal("3.00"), stock=50, branch=self.other)
+        other_sale = Sale.objects.create(user=self.admin, branch=self.other, total=Decimal("3.00"),
+                                         final_total=Decimal("3.00"))
+        SaleItem.objects.create(sale=other_sale, item=juice, quantity=1, price=Decimal("3.00"))
+
+    def part(self, table, sale, extension="parquet"):
+        month = sale.business_date.strftime("%Y-%m")
+        return columnar.partition_dir(self.root, table, sale.branch_id, month) / f"part.{extension}"
+
+    def export(self, *args, **options):
+        out = io.StringIO()
+        call_command("export_sales_columnar", "--out", str(self.root), *args, stdout=out, **options)
+        return out.getvalue().strip()
+
+    def test_incremental(self):
+        import pyarrow.parquet as pq
+
+        # two months of Main and one of Other, sales and lines each
+        self.assertEqual(columnar.export(self.root), {"written": 6, "removed": 0, "unchanged": 0, "rows": 7})
+        sales = pq.read_table(self.part("sales", self.sale))
+        self.assertEqual(sales.column("id").to_pylist(), [self.sale.pk])
+        self.assertEqual(sales.column("final_total").to_pylist(), [Decimal("10.50")])
+        lines = pq.read_table(self.part("sale_items", self.old))
+        self.assertEqual((lines.column("quantity").to_pylist(), lines.column("line_total").to_pylist()),
+                         ([4], [Decimal("10.00")]))
+
+        self.assertEqual(columnar.export(self.root), {"written": 0, "removed": 0, "unchanged": 6, "rows": 0})
+        # a new sale only rewrites its own month
+        stamp = self.part("sales", self.old).stat().st_mtime_ns
+        self.sell((self.cake, 1))
+        self.assertEqual(columnar.export(self.root), {"written": 2, "removed": 0, "unchanged": 4, "rows": 5})
+        self.assertEqual(pq.read_table(self.part("sales", self.sale)).num_rows, 2)
+        self.assertEqual(self.part("sales", self.old).stat().st_mtime_ns, stamp)
+
+        self.assertEqual(columnar.export(self.root, full=True)["written"], 6)
+
+    def test_removes_empty_partitions(self):
+        columnar.export(self.root)
+        self.old.delete()
+        self.assertEqual(columnar.export(self.root), {"written": 0, "removed": 2, "unchanged": 4, "rows": 0})
+        self.assertFalse(self.part("sales", self.old).parent.exists())
+        self.assertFalse(self.part("sale_items", self.old).parent.exists())
+        manifest = json.loads((self.root / columnar.MANIFEST).read_text())
+        self.assertEqual(len(manifest["partitions"]), 4)
+
+    def test_branch_keeps_other_partitions(self):
+        import pyarrow.parquet as pq
+
+        columnar.export(self.root)
+        other_sale = Sale.objects.get(branch=self.other)
+        Sale.objects.create(user=self.admin, branch=self.other, total=Decimal("1.00"), final_total=Decimal("1.00"))
+        self.sell((self.cake, 1))
+        output = self.export("--branch", str(self.branch.pk))
+        self.assertEqual(output, "Partitions written: 2 (5 rows), unchanged: 4, removed: 0")
+        # Other was left alone, new sale and all, and stays in the manifest
+        self.assertEqual(pq.read_table(self.part("sales", other_sale)).num_rows, 1)
+        manifest = json.loads((self.root / columnar.MANIFEST).read_text())
+        self.assertEqual(len([key for key in manifest["partitions"] if key.split("/")[1] == str(self.other.pk)]), 2)
+        # until a run without --branch picks it up
+        self.assertEqual(self.export(), "Partitions written: 1 (2 rows), unchanged: 5, removed: 0")
+
+    def test_format_change(self):
+        import pyarrow.ipc
+
+        columnar.export(self.root)
+        with self.assertRaisesMessage(CommandError, "Changing format needs an export of every branch"):
+            self.export("--format", "arrow", "--branch", str(self.branch.pk))
+        self.assertTrue(self.part("sales", self.sale).exists())
+
+        # without --branch every partition is rewritten in the new format
+        self.assertEqual(self.export("--format", "arrow"), "Partitions written: 6 (7 rows), unchanged: 0, removed: 0")
+        self.assertFalse(self.part("sales", self.sale).exists())
+        table = pyarrow.ipc.open_file(self.part("sales", self.sale, "arrow")).read_all()
+        self.assertEqual(table.column("id").to_pylist(), [self.sale.pk])
+        self.assertEqual(json.loads((self.root / columnar.MANIFEST).read_text())["format"], "arrow")
+
+
+class ReportCacheTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        default_cache.clear()
+        self.sell((self.tea, 1))
+
+    def trends(self, **headers):
+        return self.client.get(reverse("reports:sales_trends", args=["daily"]), headers=headers)
+
+    def assertChangesETag(self, change):
+        etag = self.trends()["ETag"]
+        self.assertEqual(self.trends(**{"If-None-Match": etag}).status_code, 304)
+        change()
+        response = self.trends(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_checkout_changes_etag(self):
+        self.assertChangesETag(lambda: self.sell((self.cake, 1)))
+
+    def test_sale_edit_changes_etag(self):
+        def edit():
+            sale = Sale.objects.get()
+            sale.final_total = Decimal("1.00")
+            sale.save()
+        self.assertChangesETag(edit)
+
+    def test_item_save_changes_etag(self):
+        def rename():
+            self.tea.name = "Green tea"
+            self.tea.save()
+        self.assertChangesETag(rename)
+
+    def test_cached_response(self):
+        first = self.trends()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.trends()
+        self.assertEqual(second.content, first.content)
+        self.assertFalse([q for q in queries.captured_queries if "reports_dailysalesreport" in q["sql"]])
+
+    def test_branch_resolved_once(self):
+        url = reverse("reports:sales_trends", args=["daily"])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"branch_id": self.branch.pk})
+        self.assertEqual(response.status_code, 200)
+        lookups = [q for q in queries.captured_queries
+                   if 'FROM "branches_branch"' in q["sql"] and "reports_version" in q["sql"] and "WHERE" in q["sql"]
+                   and "UPDATE" not in q["sql"]]
+        # request.user.branch, then the ?branch_id= lookup: once, not again in the view
+        self.assertEqual(len(lookups), 2)
+
+
+class BranchComparisonTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.night = Branch.objects.create(name="Night", day_rollover_hour=4)
+        # 02:00 local: Main's business day is the 10th, Night's still the 9th
+        self.now = timezone.make_aware(datetime.datetime(2026, 3, 10, 2, 0))
+        self.today = datetime.date(2026, 3, 10)
+        self.admin.is_superuser = True
+        self.admin.save()
+
+    def cell(self, branch, day, final_total):
+        HourlySalesCube.objects.create(branch=branch, date=day, hour=12, payment_method="cash",
+                                       order_type="takeaway", orders=1, total=final_total, final_total=final_total)
+
+    def test_default_window_per_business_day(self):
+        days = datetime.timedelta
+        self.cell(self.branch, self.today, Decimal("10.00"))
+        self.cell(self.branch, self.today - days(30), Decimal("1000.00"))   # before Main's window
+        self.cell(self.night, self.today - days(1), Decimal("20.00"))
+        self.cell(self.night, self.today - days(30), Decimal("5.00"))       # Night's window starts a day earlier
+        with mock.patch("django.utils.timezone.now", return_value=self.now):
+            data = self.client.get(reverse("reports:branch_comparison"), {"sort": "name"}).json()
+        rows = {row["name"]: row for row in data["branches"]}
+        self.assertEqual((rows["Main"]["start"], rows["Main"]["end"], rows["Main"]["revenue"]),
+                         ("2026-02-09", "2026-03-10", 10.0))
+        self.assertEqual((rows["Night"]["start"], rows["Night"]["end"], rows["Night"]["revenue"]),
+                         ("2026-02-08", "2026-03-09", 25.0))
+        self.assertEqual((data["start"], data["end"]), ("2026-02-08", "2026-03-10"))
+
+    def test_explicit_window(self):
+        self.cell(self.branch, self.today, Decimal("10.00"))
+        self.cell(self.night, self.today, Decimal("20.00"))
+        rows = cube.compare_branches(self.today, self.today, sort="revenue")
+        self.assertEqual([(row["name"], row["revenue"], row["orders"]) for row in rows],
+                         [("Night", Decimal("20.00"), 1), ("Main", Decimal("10.00"), 1)])
+
+
+class ForecastTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        default_cache.clear()
+        self.night = Branch.objects.create(name="Night", day_rollover_hour=4)
+        # 02:00 local: Main's business day is the 10th, Night's still the 9th
+        self.now = timezone.make_aware(datetime.datetime(2026, 3, 10, 2, 0))
+        for branch in (self.branch, self.night):
+            for days in range(1, 15):
+                DailySalesReport.objects.create(branch=branch, date=datetime.date(2026, 3, 10) - datetime.timedelta(days),
+                                                total_sales=Decimal("100.00"), total_orders=10)
+
+    def test_complete_business_days_only(self):
+        with mock.patch("django.utils.timezone.now", return_value=self.now):
+            main = forecast.forecast(self.branch)
+            night = forecast.forecast(self.night)
+        self.assertEqual((main["as_of"], main["forecast"]["dates"][0]), ("2026-03-09", "2026-03-10"))
+        self.assertEqual((night["as_of"], night["forecast"]["dates"][0]), ("2026-03-08", "2026-03-09"))
+        self.assertIsNotNone(default_cache.get(forecast.cache_key(self.night.pk, datetime.date(2026, 3, 9))))
+
+    def test_branches_grouped_by_business_day(self):
+        with mock.patch("django.utils.timezone.now", return_value=self.now):
+            results = forecast.forecast_branches()
+        self.assertEqual({pk: result["as_of"] for pk, result in results.items()},
+                         {self.branch.pk: "2026-03-09", self.night.pk: "2026-03-08"})
+
+
+class LowStockTests(ReportTestCase):
+    def low_stock(self):
+        return self.client.get(reverse("reports:low_stock")).json()["items"]
+
+    def test_default_point_until_computed(self):
+        self.tea.stock = 8
+        self.tea.save()
+        self.assertEqual([(row["name"], row["reorder_point"]) for row in self.low_stock()], [("Tea", 10)])
+
+    def test_out_of_stock_without_sales_alerts(self):
+        self.cake.stock = 0
+        self.cake.save()
+        self.assertEqual(reorder.refresh_alerts([self.branch.pk])["alerts"], 1)
+        self.assertEqual([(row["name"], row["stock"], row["reorder_point"]) for row in self.low_stock()],
+                         [("Cake", 0, 1)])
+
+    def test_seed_migration(self):
+        seed = importlib.import_module("reports.migrations.0009_seed_reorder_points").seed_reorder_points
+        self.sell((self.tea, 490))
+        Sale.objects.update(business_date=self.branch.business_date() - datetime.timedelta(days=1))
+        seed(django_apps, mock.Mock(connection=connection))
+        self.tea.refresh_from_db()
+        # 490 sold over 28 days: 17.5 a day, for 3 lead time + 2 safety days; cake hasn't sold
+        self.assertEqual((self.tea.reorder_point, Item.objects.get(pk=self.cake.pk).reorder_point), (88, 1))
+        alert = InventoryAlert.objects.get()
+        self.assertEqual((alert.item, alert.stock_level, alert.threshold, alert.days_of_cover, alert.suggested_quantity),
+                         (self.tea, 10, 88, Decimal("0.6"), 323))
+
+    def test_one_event_per_crossing(self):
+        notifications.reset()
+        Item.objects.filter(pk=self.tea.pk).update(stock=12, reorder_point=10)
+
+        def low_stock_events():
+            return [event for event in notifications.channel(self.branch.pk).since(None) if event["type"] == "low_stock"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell((self.tea, 1))                  # 11: still above
+        self.assertEqual(low_stock_events(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell((self.tea, 2), (self.tea, 1))   # 8: crossed, in one sale of two lines
+        events = low_stock_events()
+        self.assertEqual([(event["item"], event["stock"], event["reorder_point"]) for event in events],
+                         [(self.tea.pk, 8, 10)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell((self.tea, 1))                  # 7: already below, no new event
+        self.assertEqual(low_stock_events(), events)
+        self.assertEqual(InventoryAlert.objects.get().stock_level, 7)
+
+
+@override_settings(BASKET_MIN_COUNT=2)
+class BasketTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.juice = Item.objects.create(name="Juice", price=Decimal("3.00"), stock=500, branch=self.branch)
+        # 8 sales: tea in 6, cake in 4, juice in 3; tea and cake together in 4, the others once
+        for _ in range(3):
+            self.sell((self.tea, 1), (self.cake, 1))
+        self.sell((self.tea, 1), (self.cake, 1), (self.juice, 1))
+        self.sell((self.tea, 1), (self.tea, 2))   # two lines, one basket
+        self.sell((self.tea, 1))
+        self.sell((self.juice, 1))
+        self.sell((self.juice, 2))
+        baskets.compute(self.branch)
+
+    def suggestions(self, *items, **params):
+        return self.client.get(reverse("reports:cart_suggestions"),
+                               {"items": ",".join(str(item.pk) for item in items), **params})
+
+    def test_metrics(self):
+        rows = {(row.item_id, row.other_id): row for row in ItemAssociation.objects.filter(branch=self.branch)}
+        self.assertEqual(set(rows), {(self.tea.pk, self.cake.pk), (self.cake.pk, self.tea.pk)})
+        tea_cake, cake_tea = rows[self.tea.pk, self.cake.pk], rows[self.cake.pk, self.tea.pk]
+        self.assertEqual((tea_cake.pair_count, tea_cake.rank), (4, 0))
+        self.assertAlmostEqual(tea_cake.support, 4 / 8)
+        self.assertAlmostEqual(tea_cake.confidence, 4 / 6)
+        self.assertAlmostEqual(tea_cake.lift, (4 / 6) / (4 / 8))
+        self.assertAlmostEqual(cake_tea.confidence, 4 / 4)
+        self.assertAlmostEqual(cake_tea.lift, 1 / (6 / 8))
+
+    def test_suggest_endpoint(self):
+        self.assertEqual(self.suggestions(self.tea).json()["items"], [
+            {"id": self.cake.pk, "name": "Cake", "price": 4.0, "because": self.tea.pk, "confidence": 0.667, "lift": 1.33},
+        ])
+        self.assertEqual(self.suggestions(self.tea, self.cake).json()["items"], [])
+        Item.objects.filter(pk=self.cake.pk).update(stock=0)
+        self.assertEqual(self.suggestions(self.tea).json()["items"], [])
+        self.assertEqual(self.suggestions().json()["items"], [])
+        self.assertEqual(self.client.get(reverse("reports:cart_suggestions"), {"items": "tea"}).status_code, 400)
+
+
+@override_settings(LIVE_PERSIST_EVERY=2)
+class LiveSketchTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        sketches.reset()
+        self.today = self.branch.business_date()
+
+    def sell_committed(self, *lines):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.sell(*lines)
+
+    def other_worker(self, worker, sales):
+        """A LiveSketch row as another process would save it."""
+        other = sketches.BranchSketch(self.branch.pk, self.today, sketches.get_settings())
+        other.add([total for total, _ in sales], [line for _, lines in sales for line in lines])
+        LiveSketch.objects.create(branch=self.branch, date=self.today, worker=worker, sales=other.sales,
+                                  state=other.state())
+
+    def test_rows_of_other_workers_are_merged(self):
+        self.other_worker("other", [(Decimal("8.00"), [(self.cake.pk, 2)]), (Decimal("40.00"), [(self.cake.pk, 10)])])
+        self.sell_committed((self.tea, 3))
+        self.sell_committed((self.tea, 1), (self.cake, 1))
+        rows, units = sketches.top_items(self.branch)
+        self.assertEqual((rows, units), ([(self.cake.pk, 13, 0), (self.tea.pk, 4, 0)], 17))
+        summary = sketches.ticket_summary(self.branch, [0, 1])
+        self.assertEqual((summary["sales"], summary["revenue"], summary["min"], summary["max"]), (4, 62.0, 6.5, 40.0))
+
+    def test_each_worker_saves_its_own_row(self):
+        self.other_worker("other", [(Decimal("8.00"), [(self.cake.pk, 2)])])
+        self.sell_committed((self.tea, 1))
+        self.sell_committed((self.tea, 1))
+        self.assertEqual(dict(LiveSketch.objects.values_list("worker", "sales")), {"other": 1, sketches.worker_id(): 2})
+        # a restart starts a new row; the old one is still counted
+        sketches.reset()
+        self.sell_committed((self.tea, 1))
+        self.sell_committed((self.tea, 1))
+        self.assertEqual(LiveSketch.objects.count(), 3)
+        self.assertEqual(sketches.ticket_summary(self.branch, [0.5])["sales"], 5)
+
+    def test_rollover_saves_outside_lock(self):
+        self.sell_committed((self.tea, 1))
+        saved = []
+        original = LiveSketch.objects.update_or_create
+
+        def update_or_create(**kwargs):
+            saved.append((kwargs["date"], sketches._lock.locked()))
+            return original(**kwargs)
+
+        with mock.patch.object(LiveSketch.objects, "update_or_create", side_effect=update_or_create):
+            sketches.sketch(self.branch, self.today + datetime.timedelta(days=1))
+        self.assertEqual(saved, [(self.today, False)])
+
+    def test_stale_rows_are_pruned(self):
+        yesterday = self.today - datetime.timedelta(days=1)
+        for day, worker in ((yesterday, "gone"), (yesterday, "recent"), (self.today, "other")):
+            LiveSketch.objects.create(branch=self.branch, date=day, worker=worker)
+        LiveSketch.objects.filter(worker="gone").update(updated_at=timezone.now() - datetime.timedelta(hours=49))
+        LiveSketch.objects.filter(worker="recent").update(updated_at=timezone.now() - datetime.timedelta(hours=47))
+        # the first day a process sees doesn't prune; moving on to the next does
+        sketches.sketch(self.branch)
+        self.assertEqual(LiveSketch.objects.count(), 3)
+        sketches.sketch(self.branch, self.today + datetime.timedelta(days=1))
+        self.assertEqual(set(LiveSketch.objects.values_list("worker", flat=True)), {"recent", "other"})
+
+        LiveSketch.objects.filter(worker="recent").update(updated_at=timezone.now() - datetime.timedelta(hours=49))
+        out = io.StringIO()
+        call_command("rebuild_sales_rollups", stdout=out)
+        self.assertIn("Live sketches: 1 stale rows deleted", out.getvalue())
+        self.assertEqual(list(LiveSketch.objects.values_list("worker", flat=True)), ["other"])
+
+    def test_merged_space_saving_bounds(self):
+        first, second = sketches.SpaceSaving(2), sketches.SpaceSaving(2)
+        for key, weight in (("a", 5), ("b", 3), ("c", 1)):   # c takes b's counter: c = 4 (error 3)
+            first.add(key, weight)
+        for key, weight in (("b", 6), ("d", 2)):
+            second.add(key, weight)
+        merged = sketches.SpaceSaving.merged([first, second], 2)
+        # a key one full summary doesn't track may have had up to its smallest count there (4 and 2):
+        # b really sold 9, a 5, each within [count - error, count]
+        self.assertEqual(merged.top(2), [("b", 10, 4), ("a", 7, 2)])
+        self.assertEqual(merged.total, 17)
+
+
+class LiveFeedTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        notifications.reset()
+        self.addCleanup(notifications.reset)
+
+    def sell_committed(self, *lines):
+        # the events are published once the checkout commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.sell(*lines)
+
+    def test_announced_sales_reach_subscriber(self):
+        channel = notifications.channel(self.branch.pk)
+        after = channel.last_id()
+        self.sell_committed((self.tea, 2))
+        sale = self.sell_committed((self.cake, 1))
+        events = channel.wait(after, 1)
+        self.assertEqual([(event["type"], event["revenue"], event["orders"]) for event in events],
+                         [("sale", 5.0, 1), ("sale", 9.0, 2)])
+        self.assertEqual((events[1]["sale"], events[1]["total"]), (sale.pk, 4.0))
+
+    @override_settings(LIVE_FEED_HEARTBEAT=0.05)
+    async def test_stream_over_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse("reports:live_feed"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = aiter(response.streaming_content)
+
+        async def frame():
+            return (await asyncio.wait_for(anext(frames), 2)).decode()
+
+        try:
+            self.assertEqual(await frame(), f"retry: {live.RETRY_MS}\n\n")
+            summary = await frame()
+            self.assertTrue(summary.startswith("event: summary\n"))
+            self.assertEqual(json.loads(summary.split("data: ")[1])["orders"], 0)
+
+            # a checkout committed while the stream waits is pushed to it
+            sale = await sync_to_async(self.sell_committed)((self.tea, 2))
+            sale_frame = await frame()
+            event_id, event_type, data = sale_frame.rstrip("\n").split("\n")
+            self.assertEqual(event_id, f"id: {notifications.channel(self.branch.pk).last_id()}")
+            self.assertEqual(event_type, "event: sale")
+            self.assertEqual(json.loads(data.removeprefix("data: "))["sale"], sale.pk)
+            self.assertEqual(await frame(), ": keepalive\n\n")
+        finally:
+            await frames.aclose()
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        notifications.reset()
+
+    def test_resume_in_another_worker(self):
+        # what two workers' channels hold once the sockets delivered: the same events, the same ids
+        events = [notifications.publish(1, "sale", sale=sale) for sale in range(3)]
+        other = notifications.Channel(10)
+        for event in events:
+            other.publish(dict(event))
+        self.assertEqual(len({event["id"] for event in events}), 3)
+        self.assertEqual([event["sale"] for event in other.since(events[0]["id"])], [1, 2])
+        self.assertEqual([event["sale"] for event in other.since(None)], [0, 1, 2])
+        # an id this channel doesn't know (from before a restart): from now on
+        self.assertEqual(other.since("1.deadbeef-1"), [])
+        self.assertEqual(other.wait(events[2]["id"], 0), [])
+        # an event that comes back through the sockets is not added twice
+        other.publish(dict(events[1]))
+        self.assertEqual(len(other.since(None)), 3)
+
+    def test_buffer_forgets_ids(self):
+        channel = notifications.Channel(2)
+        events = [channel.publish({"id": notifications.next_id(), "type": "sale"}) for _ in range(3)]
+        self.assertEqual(set(channel.positions), {events[1]["id"], events[2]["id"]})
+        self.assertEqual(channel.since(events[1]["id"]), [events[2]])
+
+    def test_full_peer_queue_is_logged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        peer = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(peer.close)
+        peer.bind(os.path.join(directory, "peer.sock"))
+        full = BlockingIOError(11, "Resource temporarily unavailable")
+        with (
+            override_settings(NOTIFICATION_SOCKET_DIR=directory),
+            mock.patch.object(notifications, "_listen"),
+            mock.patch("socket.socket.sendto", side_effect=full),
+            self.assertLogs("reports.notifications", "WARNING") as logs,
+        ):
+            event = notifications.publish(1, "sale", sale=1)
+        self.assertIn(f"Notification {event['id']} of branch 1 not delivered to peer.sock", logs.output[0])
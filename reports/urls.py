@@ -7,9 +7,21 @@ urlpatterns = [
     path("", views.reports_dashboard, name="dashboard"),
     path("sales_trends/<str:period>/", views.sales_trends, name="sales_trends"),
     path("sales_trends_range/", views.sales_trends_range, name="sales_trends_range"),
+    path("cube/", views.sales_cube, name="sales_cube"),
+    path("compare/", views.branch_comparison, name="branch_comparison"),
+    path("forecast/", views.sales_forecast, name="sales_forecast"),
     path("top_items/", views.top_items, name="top_items"),
+    path("live/top_items/", views.live_top_items, name="live_top_items"),
+    path("live/tickets/", views.live_tickets, name="live_tickets"),
     path("low_stock/", views.low_stock, name="low_stock"),
+    path("alerts/", views.stock_alerts, name="stock_alerts"),
+    path("live/feed/", views.live_feed, name="live_feed"),
+    path("suggestions/", views.cart_suggestions, name="cart_suggestions"),
     path("export/csv/", views.export_sales_csv, name="export_sales_csv"),
+    path("export/xlsx/", views.export_sales_xlsx, name="export_sales_xlsx"),
     path("export/pdf/", views.export_sales_pdf, name="export_sales_pdf"),
     path("sales-pdf/<int:branch_id>/", views.sales_pdf, name="sales_pdf"),
+    path("export/jobs/", views.export_job_create, name="export_job_create"),
+    path("export/jobs/<int:job_id>/", views.export_job, name="export_job"),
+    path("export/jobs/<int:job_id>/download/", views.export_job_download, name="export_job_download"),
 ]
@@ -1,17 +1,21 @@
+import tempfile
+
+from asgiref.sync import sync_to_async
+
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
-from django.db.models import Sum
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+from django.http import FileResponse, JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.utils.dateparse import parse_date
-import csv
-import datetime
+from django.core.handlers.asgi import ASGIRequest
 
-from sales.models import Sale, SaleItem
-from inventory.models import Item
+from sales.models import Sale
 from branches.models import Branch
+from inventory.models import Item
+from pos_system import rendering
+from .models import ExportJob
+from . import baskets, cube, exports, forecast, jobs, live, notifications, reorder, rollups, sketches
+from .cache import cached_report
 
 
 def _resolve_branch_for_request(request):
@@ -22,6 +26,11 @@ def _resolve_branch_for_request(request):
     - If a non-admin provides branch_id different from their branch -> forbidden.
     Returns branch instance or None.
     """
+    # already resolved for this request by reports/cache.py's cached_report
+    resolved = getattr(request, "report_branch", None)
+    if resolved is not None:
+        return resolved
+
     branch_id = request.GET.get("branch_id") or request.POST.get("branch_id")
     user_branch = getattr(request.user, "branch", None)
 
@@ -70,7 +79,18 @@ def get_branch_sales_qs(request):
 
 
 # --- API: Sales trends (daily/weekly/monthly/yearly) ---
+TREND_GRAINS = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year"}
+
+
+def _trend_response(series):
+    return JsonResponse({
+        "labels": [day.strftime("%Y-%m-%d") for day, _ in series],
+        "totals": [float(total) for _, total in series],
+    })
+
+
 @login_required
+@cached_report(_resolve_branch_for_request)
 def sales_trends(request, period):
     """
     Query params:
@@ -78,39 +98,17 @@ def sales_trends(request, period):
     path param:
       - period: daily | weekly | monthly | yearly
     Returns JSON: { labels: [...], totals: [...] }
+    Read from the daily rollups (reports/rollups.py); only today is aggregated live.
     """
-    qs = get_branch_sales_qs(request)
-
-    if period == "daily":
-        qs = qs.annotate(date=TruncDay("datetime"))
-    elif period == "weekly":
-        qs = qs.annotate(date=TruncWeek("datetime"))
-    elif period == "monthly":
-        qs = qs.annotate(date=TruncMonth("datetime"))
-    elif period == "yearly":
-        qs = qs.annotate(date=TruncYear("datetime"))
-    else:
+    branch = _resolve_branch_for_request(request)
+    if branch is None or period not in TREND_GRAINS:
         return JsonResponse({"labels": [], "totals": []})
-
-    qs = qs.values("date").annotate(total=Sum("final_total")).order_by("date")
-
-    labels = []
-    totals = []
-    for row in qs:
-        dt = row.get("date")
-        total = row.get("total") or 0
-        # dt may be None in weird cases; guard
-        if isinstance(dt, (datetime.date, datetime.datetime)):
-            labels.append(dt.strftime("%Y-%m-%d"))
-        else:
-            labels.append(str(dt))
-        totals.append(float(total))
-
-    return JsonResponse({"labels": labels, "totals": totals})
+    return _trend_response(rollups.sales_series(branch, TREND_GRAINS[period]))
 
 
 # --- API: Sales trends by custom date range ---
 @login_required
+@cached_report(_resolve_branch_for_request)
 def sales_trends_range(request):
     """
     Query params:
@@ -131,112 +129,503 @@ def sales_trends_range(request):
     except Exception:
         return JsonResponse({"labels": [], "totals": []})
 
-    qs = get_branch_sales_qs(request).filter(datetime__date__range=[start_date, end_date])
-    qs = qs.annotate(date=TruncDay("datetime")).values("date").annotate(total=Sum("final_total")).order_by("date")
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"labels": [], "totals": []})
+    return _trend_response(rollups.sales_series(branch, "day", start_date, end_date))
+
+
+# --- API: Hourly sales cube (slice / roll up) ---
+@login_required
+@cached_report(_resolve_branch_for_request)
+def sales_cube(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - start, end=YYYY-MM-DD (optional, inclusive)
+      - grain: day | week | month | year (optional; omitted = one total for the range)
+      - group_by: comma separated hour, payment_method, order_type (optional)
+      - payment_method, order_type, hour: filters, comma separated values (optional)
+      - measures: comma separated subset of orders, total, discount_amount,
+        final_total, cash_amount, card_amount (optional, default all)
+    Returns JSON: { grain, group_by, rows: [{period?, <group_by keys>, <measures>}] }
+    Answered from reports.models.HourlySalesCube only.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"error": "Not allowed or no branch selected"}, status=403)
+
+    def csv_param(name):
+        value = request.GET.get(name, "")
+        return [part.strip() for part in value.split(",") if part.strip()]
+
+    dates = {}
+    for name in ("start", "end"):
+        value = request.GET.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            return JsonResponse({"error": f"Invalid {name} date"}, status=400)
+
+    filters = {}
+    for name in cube.DIMENSIONS:
+        values = csv_param(name)
+        if name == "hour":
+            if not all(v.isdigit() for v in values):
+                return JsonResponse({"error": "Invalid hour"}, status=400)
+            values = [int(v) for v in values]
+        if values:
+            filters[name] = values
+
+    grain = request.GET.get("grain") or None
+    group_by = csv_param("group_by")
+    try:
+        rows = cube.query(
+            branch, dates["start"], dates["end"], grain=grain, group_by=group_by,
+            filters=filters, measures=csv_param("measures") or cube.MEASURES,
+        )
+    except cube.CubeError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    for row in rows:
+        if "period" in row:
+            row["period"] = row["period"].strftime("%Y-%m-%d")
+        for name in cube.MONEY_MEASURES:
+            if name in row:
+                row[name] = float(row[name])
+    return JsonResponse({"grain": grain, "group_by": group_by, "rows": rows})
+
+
+# --- API: Forecast and anomalies ---
+@login_required
+def sales_forecast(request):
+    """
+    Query params:
+      - branch_id (optional)
+    Returns JSON: { branch, as_of, history: {dates, totals, ma7, ma28},
+    seasonality: {Mon..Sun: factor}, forecast: {dates, totals}, anomalies: [...] }
+    Computed by reports/forecast.py from complete days and cached per branch per day.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"error": "Not allowed or no branch selected"}, status=403)
+    return JsonResponse(forecast.forecast(branch))
+
+
+# --- API: Branch comparison (head office) ---
+@login_required
+def branch_comparison(request):
+    """
+    Query params:
+      - start, end=YYYY-MM-DD (optional, inclusive business dates; default the
+        last 30 business days of each branch, which may end yesterday for a branch
+        before its day_rollover_hour)
+      - branch_ids: comma separated (optional, default every branch)
+      - sort: revenue | gross | orders | avg_ticket | discount_rate | name (default revenue)
+      - order: desc | asc (default desc)
+    Returns JSON: { start, end, sort, order, branches: [{id, name, start, end, revenue, gross,
+    orders, avg_ticket, discount_rate, payment_mix: {method: {orders, revenue, share}}}] }
+    Admins and superusers only. Every branch comes from one grouped query over
+    the hourly cube (reports/cube.py compare_branches).
+    """
+    if not (request.user.is_superuser or getattr(request.user, "role", "") == "admin"):
+        return JsonResponse({"error": "Not allowed"}, status=403)
+
+    dates = {}
+    for name in ("start", "end"):
+        value = request.GET.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            return JsonResponse({"error": f"Invalid {name} date"}, status=400)
 
-    labels = [x["date"].strftime("%Y-%m-%d") for x in qs]
-    totals = [float(x["total"] or 0) for x in qs]
-    return JsonResponse({"labels": labels, "totals": totals})
+    branch_ids = request.GET.get("branch_ids", "")
+    try:
+        branch_ids = [int(part) for part in branch_ids.split(",") if part.strip()]
+    except ValueError:
+        return JsonResponse({"error": "Invalid branch_ids"}, status=400)
+
+    sort = request.GET.get("sort", "revenue")
+    order = request.GET.get("order", "desc")
+    try:
+        rows = cube.compare_branches(dates["start"], dates["end"], branch_ids, sort=sort, descending=order != "asc")
+    except cube.CubeError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    branches = []
+    for row in rows:
+        revenue = row["revenue"]
+        branches.append({
+            "id": row["id"],
+            "name": row["name"],
+            "start": row["start"].isoformat(),
+            "end": row["end"].isoformat(),
+            "revenue": float(revenue),
+            "gross": float(row["gross"]),
+            "orders": row["orders"],
+            "avg_ticket": round(row["avg_ticket"], 2),
+            "discount_rate": round(row["discount_rate"], 4),
+            "payment_mix": {
+                method: {
+                    "orders": row[f"{method}_orders"],
+                    "revenue": float(row[f"{method}_revenue"]),
+                    "share": round(float(row[f"{method}_revenue"] / revenue), 4) if revenue else 0.0,
+                }
+                for method in cube.PAYMENT_METHODS
+            },
+        })
+    # the span of the branches' windows
+    windows = [(row["start"], row["end"]) for row in rows] or [
+        (first, last) for _, first, last in cube.business_windows(dates["start"], dates["end"])
+    ]
+    return JsonResponse({
+        "start": min(first for first, _ in windows).isoformat(),
+        "end": max(last for _, last in windows).isoformat(),
+        "sort": sort,
+        "order": "asc" if order == "asc" else "desc",
+        "branches": branches,
+    })
 
 
 # --- API: Top selling items ---
 @login_required
+@cached_report(_resolve_branch_for_request)
 def top_items(request):
     """
     Query params:
       - branch_id (optional)
-    Returns top 5 items for the branch (labels and totals)
+      - start, end=YYYY-MM-DD (optional, inclusive; default the whole history)
+      - limit (optional, default 10, max 100)
+      - order_by: quantity | revenue (optional, default quantity)
+    Returns top items for the branch (labels, totals, plus ids and revenue),
+    from the per-item daily rollup (reports.models.ItemDailySales).
     """
     branch = _resolve_branch_for_request(request)
     if branch is None:
         return JsonResponse({"labels": [], "totals": []})
 
-    qs = (
-        SaleItem.objects.filter(sale__branch=branch)
-        .values("item__name")
-        .annotate(total_qty=Sum("quantity"))
-        .order_by("-total_qty")[:10]
-    )
+    dates = {}
+    for name in ("start", "end"):
+        value = request.GET.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            return JsonResponse({"error": f"Invalid {name} date"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 100)
+    except ValueError:
+        limit = 10
+    order_by = request.GET.get("order_by", "quantity")
+    if order_by not in ("quantity", "revenue"):
+        return JsonResponse({"error": "order_by must be quantity or revenue"}, status=400)
+
+    rows = list(rollups.top_items(branch, dates["start"], dates["end"], limit=limit, order_by=order_by))
+    return JsonResponse({
+        "labels": [x["item__name"] for x in rows],
+        "totals": [int(x["quantity"] or 0) for x in rows],
+        "ids": [x["item_id"] for x in rows],
+        "revenue": [float(x["revenue"] or 0) for x in rows],
+    })
+
+
+# --- API: Live top sellers and ticket sizes (today, from memory) ---
+LIVE_QUANTILES = (0.5, 0.75, 0.9, 0.95, 0.99)
+
 
-    labels = [x["item__name"] for x in qs]
-    totals = [int(x["total_qty"] or 0) for x in qs]
-    return JsonResponse({"labels": labels, "totals": totals})
+@login_required
+def live_top_items(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - limit (optional, default 10, max 50)
+    Returns today's best sellers from the branch's Space-Saving summary
+    (reports/sketches.py): labels, totals, ids, errors (a total is at most
+    this much over), and units, the units sold today in all.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"labels": [], "totals": []})
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    rows, units = sketches.top_items(branch, limit)
+    names = dict(Item.objects.filter(pk__in=[item_id for item_id, _, _ in rows]).values_list("id", "name"))
+    rows = [row for row in rows if row[0] in names]
+    return JsonResponse({
+        "labels": [names[item_id] for item_id, _, _ in rows],
+        "totals": [count for _, count, _ in rows],
+        "ids": [item_id for item_id, _, _ in rows],
+        "errors": [error for _, _, error in rows],
+        "units": units,
+    })
+
+
+@login_required
+def live_tickets(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - q (optional): comma separated quantiles between 0 and 1 (default 0.5,0.75,0.9,0.95,0.99)
+    Returns JSON: { sales, revenue, average, min, max, percentiles: {"p50": ..., ...} }
+    for today's tickets (Sale.final_total), from the branch's t-digest.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"error": "Not allowed or no branch selected"}, status=403)
+    try:
+        quantiles = [float(part) for part in request.GET["q"].split(",") if part.strip()] if "q" in request.GET else LIVE_QUANTILES
+    except ValueError:
+        return JsonResponse({"error": "q must be numbers between 0 and 1"}, status=400)
+    if not quantiles or len(quantiles) > 20 or any(not 0 <= q <= 1 for q in quantiles):
+        return JsonResponse({"error": "q must be numbers between 0 and 1"}, status=400)
+
+    summary = sketches.ticket_summary(branch, quantiles)
+
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+
+    return JsonResponse({
+        "sales": summary["sales"],
+        "revenue": summary["revenue"],
+        "average": round(summary["revenue"] / summary["sales"], 2) if summary["sales"] else None,
+        "min": rounded(summary["min"]),
+        "max": rounded(summary["max"]),
+        "percentiles": {f"p{q * 100:g}": rounded(value) for q, value in summary["quantiles"].items()},
+    })
 
 
 # --- API: Low stock items ---
 @login_required
+@cached_report(_resolve_branch_for_request)
 def low_stock(request):
     """
     Query params:
       - branch_id (optional)
-    Returns small list of items in that branch with stock <= threshold
+      - threshold (optional): only items with at most this much stock
+    Returns the branch's items at or below their reorder point, least days of
+    cover first, from the precomputed alerts (reports/reorder.py; items
+    without a reorder point yet use REORDER_DEFAULT_POINT), with the same
+    items also grouped by supplier for ordering.
     """
     branch = _resolve_branch_for_request(request)
     if branch is None:
-        return JsonResponse({"items": []})
+        return JsonResponse({"items": [], "suppliers": []})
 
     threshold = request.GET.get("threshold")
     try:
-        threshold = int(threshold) if threshold is not None else 10
+        threshold = int(threshold) if threshold is not None else None
     except Exception:
-        threshold = 10
+        threshold = None
+
+    data, suppliers = [], {}
+    for alert in reorder.low_stock(branch, max_stock=threshold):
+        supplier = alert.supplier
+        data.append({
+            "id": alert.item_id,
+            "name": alert.item.name,
+            "stock": alert.item.stock,
+            "reorder_point": alert.threshold,
+            "daily_velocity": float(alert.daily_velocity),
+            "days_of_cover": float(alert.days_of_cover) if alert.days_of_cover is not None else None,
+            "suggested_quantity": alert.suggested_quantity,
+            "supplier": supplier.name if supplier else None,
+        })
+        group = suppliers.setdefault(alert.supplier_id, {
+            "id": alert.supplier_id, "name": supplier.name if supplier else None, "items": [],
+        })
+        group["items"].append(alert.item_id)
+    return JsonResponse({"items": data, "suppliers": list(suppliers.values())})
+
+
+# --- API: Frequently bought together (POS cart suggestions) ---
+@login_required
+def cart_suggestions(request):
+    """
+    Query params:
+      - items: comma separated item ids in the cart (at most 50 are used)
+      - limit (optional, default 5, max 20)
+      - branch_id (optional)
+    Returns JSON: { items: [{id, name, price, because, confidence, lift}] }
+    from the precomputed pairs in reports.models.ItemAssociation.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"items": []})
+    try:
+        cart = [int(part) for part in request.GET.get("items", "").split(",") if part.strip()][:50]
+        limit = min(max(int(request.GET.get("limit", 5)), 1), 20)
+    except ValueError:
+        return JsonResponse({"error": "items and limit must be numbers"}, status=400)
+    if not cart:
+        return JsonResponse({"items": []})
+
+    return JsonResponse({"items": [
+        {
+            "id": row.other_id,
+            "name": row.other.name,
+            "price": float(row.other.price),
+            "because": row.item_id,
+            "confidence": round(row.confidence, 3),
+            "lift": round(row.lift, 2),
+        }
+        for row in baskets.suggest(branch, cart, limit)
+    ]})
+
+
+# --- API: Live stock alerts (long poll) ---
+ALERTS_MAX_WAIT = 25
+
+
+@login_required
+def stock_alerts(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - after: id of the last event seen (optional; omitted = the recent events, no waiting)
+      - wait: seconds to wait for a new event (optional, default 0, max 25)
+    Returns JSON: { events: [{id, type, at, ...}], last_id } (ids are opaque strings)
+    Events come from the branch's channel (reports/notifications.py): checkout
+    publishes a sale event per sale (reports/live.py) and a low_stock event when
+    a sale takes an item to its reorder point. Browsers with EventSource use live_feed.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"error": "Not allowed or no branch selected"}, status=403)
+    after = request.GET.get("after") or None
+    try:
+        wait = min(max(float(request.GET.get("wait", 0)), 0), ALERTS_MAX_WAIT)
+    except ValueError:
+        return JsonResponse({"error": "wait must be a number"}, status=400)
 
-    items = Item.objects.filter(branch=branch, stock__lte=threshold).order_by("stock")[:50]
-    data = [{"name": i.name, "stock": i.stock} for i in items]
-    return JsonResponse({"items": data})
+    channel = notifications.channel(branch.pk)
+    events = channel.wait(after, wait) if wait and "after" in request.GET else channel.since(after)
+    return JsonResponse({"events": events, "last_id": events[-1]["id"] if events else after or channel.last_id()})
+
+
+# --- Live feed: Server-Sent Events (async, served through pos_system.asgi) ---
+@login_required
+async def live_feed(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - after: id of the last event seen (optional; the Last-Event-ID header wins)
+    An event stream (text/event-stream) of the branch's channel: a "summary"
+    of today's revenue and orders first, then "sale" and "low_stock" events
+    as checkouts commit (reports/live.py). Under WSGI the stream only sends
+    what is pending and ends, so EventSource falls back to polling.
+    """
+    branch = await sync_to_async(_resolve_branch_for_request)(request)
+    if branch is None:
+        return JsonResponse({"error": "Not allowed or no branch selected"}, status=403)
+    after = request.headers.get("Last-Event-ID") or request.GET.get("after") or None
+
+    first = await sync_to_async(live.summary)(branch)
+    max_seconds = None if isinstance(request, ASGIRequest) else 0
+    response = StreamingHttpResponse(
+        live.stream(branch.pk, after, first, max_seconds), content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pass events through as they come
+    return response
 
 
 # --- Export: CSV ---
 @login_required
 def export_sales_csv(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - start, end=YYYY-MM-DD (optional, both or neither)
+      - items=1 (optional): one row per sale line, with item, quantity, price and line total
+    Streamed in chunks (reports/exports.py), so memory stays flat for any range.
+    """
     branch = _resolve_branch_for_request(request)
     if branch is None:
         return HttpResponseForbidden("Not allowed or no branch selected")
 
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-    sales = Sale.objects.filter(branch=branch)
-    if start and end:
-        sales = sales.filter(datetime__date__range=[start, end])
+    start, end = _export_range(request.GET)
+    if start is False:
+        return HttpResponse("Invalid start or end date", status=400)
+    with_items = request.GET.get("items") in ("1", "true", "yes")
 
-    response = HttpResponse(content_type="text/csv")
+    rows = exports.iter_rows(exports.filtered_sales(branch, start, end), with_items=with_items)
+    response = StreamingHttpResponse(exports.stream_csv(rows), content_type="text/csv")
     response["Content-Disposition"] = f'attachment; filename="sales_report_{branch.name}.csv"'
-    writer = csv.writer(response)
-    writer.writerow(["ID", "Date", "Customer", "Total Before Discount", "Discount", "Final Total", "Payment Method"])
-
-    for sale in sales.order_by("-datetime"):
-        writer.writerow([
-            sale.id,
-            sale.datetime.strftime("%Y-%m-%d %H:%M"),
-            str(sale.customer) if sale.customer else "Walk-in",
-            f"{sale.total:.2f}",
-            f"{sale.discount_amount:.2f}",
-            f"{sale.final_total:.2f}",
-            sale.payment_method,
-        ])
     return response
 
 
-# --- Export: PDF (xhtml2pdf) ---
+# --- Export: Excel (openpyxl write-only) ---
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+@login_required
+def export_sales_xlsx(request):
+    """
+    Query params:
+      - branch_id (optional)
+      - start, end=YYYY-MM-DD (optional, both or neither; ignored for inventory)
+      - kind: sales (default) | lines (one row per sale line) | inventory (the branch's items)
+    The workbook is written row by row to a temporary file (reports/exports.py
+    write_xlsx), splitting sheets at Excel's row limit, then streamed from disk.
+    Exports of more than EXPORT_XLSX_INLINE_ROWS sales, lines or items are
+    queued as an export job instead: 202 with the job, as export_job_create.
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return HttpResponseForbidden("Not allowed or no branch selected")
+
+    start, end = _export_range(request.GET)
+    if start is False:
+        return HttpResponse("Invalid start or end date", status=400)
+
+    kind = request.GET.get("kind", "sales")
+    if kind not in exports.XLSX_KINDS:
+        return HttpResponse("kind must be sales, lines or inventory", status=400)
+    rows, title, total = exports.xlsx_export(kind, branch, start, end)
+    if total > exports.get_xlsx_inline_rows():
+        job = jobs.create(request.user, branch, "xlsx", start, end, kind=kind)
+        return JsonResponse(jobs.job_payload(job), status=202)
+
+    out = tempfile.TemporaryFile()
+    exports.write_xlsx(rows, out, title=title)
+    out.seek(0)
+    return FileResponse(
+        out, as_attachment=True, filename=f"{kind}_report_{branch.name}.xlsx", content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+def _export_range(params):
+    """(start, end) dates of an export request; (None, None) if not both given, (False, False) if invalid."""
+    start = params.get("start")
+    end = params.get("end")
+    if not (start and end):
+        return None, None
+    try:
+        start, end = parse_date(start), parse_date(end)
+    except ValueError:
+        return False, False
+    if start is None or end is None:
+        return False, False
+    return start, end
+
+
+# --- Export: PDF (xhtml2pdf, in the shared render pool) ---
 @login_required
 def export_sales_pdf(request):
     branch = _resolve_branch_for_request(request)
     if branch is None:
         return HttpResponseForbidden("Not allowed or no branch selected")
 
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-    sales = Sale.objects.filter(branch=branch)
-    if start and end:
-        sales = sales.filter(datetime__date__range=[start, end])
+    start, end = _export_range(request.GET)
+    if start is False:
+        return HttpResponse("Invalid start or end date", status=400)
+    sales = exports.filtered_sales(branch, start, end)
 
-    template = get_template("reports/sales_pdf.html")
-    html = template.render({"sales": sales, "branch": branch})
-    response = HttpResponse(content_type="application/pdf")
+    try:
+        pdf = rendering.render_html_pdf(exports.sales_pdf_html(sales, branch))
+    except rendering.RenderError as e:
+        return rendering.error_response(e)
+    response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = f'attachment; filename="sales_report_{branch.name}.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Error generating PDF", status=500)
     return response
 
 
@@ -255,12 +644,65 @@ def sales_pdf(request, branch_id):
     if not is_admin and (user_branch is None or user_branch.id != branch.id):
         return HttpResponseForbidden("Not allowed")
 
-    sales = Sale.objects.filter(branch=branch).order_by("-datetime")
-    template = get_template("reports/sales_pdf.html")
-    html = template.render({"sales": sales, "branch": branch})
-    response = HttpResponse(content_type="application/pdf")
+    sales = Sale.objects.filter(branch=branch)
+    try:
+        pdf = rendering.render_html_pdf(exports.sales_pdf_html(sales, branch))
+    except rendering.RenderError as e:
+        return rendering.error_response(e)
+    response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = f'attachment; filename="sales_{branch.name}.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Error generating PDF", status=500)
     return response
+
+
+# --- Export jobs (large exports, run by `manage.py run_export_jobs`) ---
+@login_required
+@require_POST
+def export_job_create(request):
+    """
+    POST params (form encoded):
+      - format: csv | xlsx | pdf
+      - branch_id, start, end (as for export_sales_csv), items=1 (csv / xlsx)
+      - kind: sales (default) | lines | inventory (xlsx, as for export_sales_xlsx)
+    Returns 202 with the job (poll its status_url, then fetch download_url).
+    """
+    branch = _resolve_branch_for_request(request)
+    if branch is None:
+        return JsonResponse({"error": "Not allowed or no branch selected"}, status=403)
+
+    params = request.POST
+    start, end = _export_range(params)
+    if start is False:
+        return JsonResponse({"error": "Invalid start or end date"}, status=400)
+
+    try:
+        job = jobs.create(
+            request.user, branch, params.get("format"), start, end,
+            items=str(params.get("items", "")).lower() in ("1", "true", "yes"), kind=params.get("kind", "sales"),
+        )
+    except jobs.JobError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(jobs.job_payload(job), status=202)
+
+
+def _user_job(request, job_id):
+    jobs_qs = ExportJob.objects.select_related("branch")
+    if not request.user.is_superuser:
+        jobs_qs = jobs_qs.filter(user=request.user)
+    return get_object_or_404(jobs_qs, pk=job_id)
+
+
+@login_required
+def export_job(request, job_id):
+    return JsonResponse(jobs.job_payload(_user_job(request, job_id)))
+
+
+@login_required
+def export_job_download(request, job_id):
+    job = _user_job(request, job_id)
+    path = jobs.file_path(job)
+    if job.status != "done" or path is None or not path.exists():
+        return HttpResponse("Export not ready", status=404)
+    return FileResponse(
+        open(path, "rb"), as_attachment=True, filename=path.name.split("-", 1)[1],
+        content_type=jobs.FORMATS[job.format]["content_type"],
+    )
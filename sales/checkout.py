@@ -0,0 +1,437 @@
+# sales/checkout.py
+"""
+Set-based checkout engine.
+
+A cart is sold with a fixed number of queries whatever its size:
+  1. one locked fetch of every cart item, in pk order (so two checkouts that
+     share items always take their row locks in the same order),
+  2. one conditional UPDATE that decrements every stock level with F()
+     (and stamps the branch's next catalog version on those items),
+  3. one INSERT for the Sale (totals are computed before it is written),
+  4. one bulk INSERT for its SaleItem rows,
+then sales_recorded (sales/signals.py) lets the report rollups add the sale
+in the same transaction.
+
+ingest_sales() applies the same steps to a whole batch of queued sales
+(offline terminals), chunk by chunk.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from customers.models import Customer
+from inventory.catalog import next_version
+from inventory.models import Item
+from .models import CheckoutRequest, Sale, SaleItem
+from .signals import sales_recorded
+from . import idempotency
+
+
+TWO_PLACES = Decimal("0.01")
+# Clock skew allowed between an offline terminal and the server
+SOLD_AT_TOLERANCE = timedelta(minutes=5)
+
+
+class CheckoutError(Exception):
+    """
+    Raised when a cart cannot be sold.
+    - errors: one human readable message per problem (every bad line, not only the first).
+    - details: optional machine readable info per failing line.
+    """
+
+    def __init__(self, errors, status=400, details=None):
+        if isinstance(errors, str):
+            errors = [errors]
+        self.errors = list(errors)
+        self.status = status
+        self.details = details or []
+        super().__init__("; ".join(self.errors))
+
+    def as_json(self):
+        data = {"error": str(self), "errors": self.errors}
+        if self.details:
+            data["details"] = self.details
+        return data
+
+
+# -------------------------------
+# Parsing / validation
+# -------------------------------
+def parse_cart(items_data):
+    """
+    Turn raw cart lines ([{"id": .., "quantity": ..}, ...]) into an ordered
+    {item_id: quantity} dict. Repeated lines for the same item are summed.
+    """
+    lines = {}
+    errors = []
+    for it in items_data or []:
+        try:
+            item_id = int(it["id"])
+            qty = int(it["quantity"])
+        except (KeyError, TypeError, ValueError):
+            errors.append(f"Invalid cart line: {it}")
+            continue
+        if qty <= 0:
+            errors.append(f"Invalid quantity for item: {item_id}")
+            continue
+        lines[item_id] = lines.get(item_id, 0) + qty
+
+    if errors:
+        raise CheckoutError(errors)
+    if not lines:
+        raise CheckoutError("Cart is empty")
+    return lines
+
+
+def parse_order(payload):
+    """
+    Validate a checkout payload (same shape the POS screen posts) and return
+    a plain dict describing the order. Nothing is read from the database here.
+    """
+    order_type = payload.get("order_type", "dine_in")
+    payment_method = payload.get("payment_method", "cash")
+
+    try:
+        discount_percent = Decimal(str(payload.get("discount", 0)))
+        cash_amount = Decimal(str(payload.get("cash_amount", 0)))
+        card_amount = Decimal(str(payload.get("card_amount", 0)))
+    except Exception:
+        raise CheckoutError("Invalid numeric values")
+
+    lines = parse_cart(payload.get("items", []))
+
+    table_number = payload.get("table_number") if order_type == "dine_in" else None
+    if order_type == "dine_in" and not table_number:
+        raise CheckoutError("Please enter a table number for dine-in orders")
+
+    return {
+        "lines": lines,
+        "customer_id": payload.get("customer_id"),
+        "order_type": order_type,
+        "table_number": table_number,
+        "payment_method": payment_method,
+        "discount_percent": discount_percent,
+        "cash_amount": cash_amount,
+        "card_amount": card_amount,
+    }
+
+
+def parse_sold_at(value):
+    """
+    Parse the time an offline terminal made a sale (ISO 8601). Naive values
+    are read in the server time zone; missing values mean "now".
+    """
+    if not value:
+        return timezone.now()
+    sold_at = parse_datetime(str(value))
+    if sold_at is None:
+        raise CheckoutError("Invalid sale time")
+    if timezone.is_naive(sold_at):
+        sold_at = timezone.make_aware(sold_at)
+    if sold_at > timezone.now() + SOLD_AT_TOLERANCE:
+        raise CheckoutError("Sale time is in the future")
+    return sold_at
+
+
+def resolve_customer(customer_id):
+    if not customer_id:
+        return None
+    try:
+        return Customer.objects.get(pk=int(customer_id))
+    except (Customer.DoesNotExist, TypeError, ValueError):
+        raise CheckoutError("Invalid customer")
+
+
+# -------------------------------
+# Set-based building blocks
+# -------------------------------
+def lock_items(branch, item_ids):
+    """Fetch and row-lock all of the branch's cart items in one query, always in pk order."""
+    qs = Item.objects.select_for_update().filter(branch=branch, pk__in=list(item_ids)).order_by("pk")
+    return {item.pk: item for item in qs}
+
+
+def check_stock(lines, items, available=None):
+    """
+    Raise a CheckoutError listing every missing or out-of-stock line.
+    `available` optionally overrides item.stock (stock left after earlier sales of a batch).
+    """
+    errors, details = [], []
+    for item_id, qty in lines.items():
+        item = items.get(item_id)
+        if item is None:
+            errors.append(f"Item not found: {item_id}")
+            details.append({"id": item_id, "reason": "not_found"})
+            continue
+        stock = available[item_id] if available is not None else item.stock
+        if stock < qty:
+            errors.append(f"Insufficient stock for item: {item.name}")
+            details.append({
+                "id": item_id,
+                "name": item.name,
+                "reason": "insufficient_stock",
+                "requested": qty,
+                "available": stock,
+            })
+    if errors:
+        raise CheckoutError(errors, details=details)
+
+
+def decrement_stock(branch, lines):
+    """
+    Decrement every item's stock in a single UPDATE, stamping the items with
+    a new catalog version so POS terminals pick up the new stock levels.
+    Each row is only touched if it still has enough stock, so if fewer rows
+    than expected were updated someone else sold the stock first (this also
+    protects databases where select_for_update is a no-op, like SQLite).
+    """
+    guard = Q()
+    whens = []
+    for item_id, qty in lines.items():
+        guard |= Q(pk=item_id, stock__gte=qty)
+        whens.append(When(pk=item_id, then=F("stock") - qty))
+
+    updated = Item.objects.filter(guard).update(
+        stock=Case(*whens, default=F("stock"), output_field=IntegerField()),
+        version=next_version(branch.pk),
+    )
+    if updated != len(lines):
+        raise CheckoutError("Stock changed during checkout, please try again", status=409)
+
+
+def build_sale(user, branch, order, items, customer=None):
+    """
+    Build (without saving) the Sale and its SaleItem rows, with totals
+    already computed so the Sale is written once.
+    """
+    payment_method = order["payment_method"]
+    discount_percent = order["discount_percent"]
+    cash_amount = order["cash_amount"]
+    card_amount = order["card_amount"]
+
+    sale_items = []
+    total = Decimal("0.00")
+    for item_id, qty in order["lines"].items():
+        item = items[item_id]
+        sale_items.append(SaleItem(item=item, quantity=qty, price=item.price))
+        total += item.price * qty
+
+    discount_amount = (total * discount_percent / 100).quantize(TWO_PLACES)
+    final_total = (total - discount_amount).quantize(TWO_PLACES)
+
+    if payment_method == "mixed" and cash_amount + card_amount != final_total:
+        raise CheckoutError("Cash + Card amount must equal final total")
+
+    sale = Sale(
+        user=user,
+        branch=branch,
+        customer=customer,
+        order_type=order["order_type"],
+        table_number=order["table_number"],
+        payment_method=payment_method,
+        discount_percent=discount_percent,
+        cash_amount=cash_amount if payment_method == "mixed" else None,
+        card_amount=card_amount if payment_method == "mixed" else None,
+        total=total.quantize(TWO_PLACES),
+        discount_amount=discount_amount,
+        final_total=final_total,
+    )
+    return sale, sale_items
+
+
+# -------------------------------
+# Engine entry point
+# -------------------------------
+def place_order(user, branch, order, customer=None):
+    """Sell a parsed order atomically and return the saved Sale."""
+    if not branch:
+        raise CheckoutError("User has no assigned branch")
+
+    lines = order["lines"]
+    with transaction.atomic():
+        items = lock_items(branch, lines.keys())
+        check_stock(lines, items)
+        sale, sale_items = build_sale(user, branch, order, items, customer)
+        decrement_stock(branch, lines)
+        sale.save()
+        for sale_item in sale_items:
+            sale_item.sale = sale
+        SaleItem.objects.bulk_create(sale_items)
+        sales_recorded.send(sender=Sale, branch=branch, sales=[sale], items=sale_items)
+    return sale
+
+
+def sale_payload(sale):
+    """JSON body returned to the POS screen after a successful checkout."""
+    return {
+        "sale_id": sale.id,
+        "total": str(sale.total),
+        "final_total": str(sale.final_total),
+        "discount_percent": str(sale.discount_percent),
+        "discount_amount": str(sale.discount_amount),
+        "redirect_url": reverse("sales:sale_detail", args=[sale.id]),
+    }
+
+
+# -------------------------------
+# Batch ingestion (offline terminals)
+# -------------------------------
+def _customer_pk(value):
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CheckoutError("Invalid customer")
+
+
+def ingest_sales(user, branch, entries, chunk_size=None):
+    """
+    Sell a whole batch of queued sales. Returns one result dict per entry, in order:
+      - created:   the sale was written (same fields as a normal checkout response)
+      - duplicate: its idempotency key was already used, the stored response is returned
+      - conflict:  not enough stock (or an unknown item) at the time it was applied,
+                   or its key is being used by a request that has not finished yet
+      - invalid:   the entry itself is malformed
+    Entries are validated together, then applied in chunks of `chunk_size`,
+    each chunk in its own transaction with one locked fetch of its items, one
+    aggregated stock decrement and bulk inserts of its Sale/SaleItem rows.
+    Sales are applied in the order given, so earlier sales win the stock.
+    """
+    if not branch:
+        raise CheckoutError("User has no assigned branch")
+    chunk_size = chunk_size or getattr(settings, "SALES_BATCH_CHUNK_SIZE", 100)
+
+    results = []
+    pending = []  # (index, order, idempotency key)
+    for index, payload in enumerate(entries):
+        result = {"index": index}
+        results.append(result)
+        try:
+            if not isinstance(payload, dict):
+                raise CheckoutError("Invalid sale")
+            result["client_ref"] = payload.get("client_ref")
+            order = parse_order(payload)
+            order["customer_id"] = _customer_pk(order["customer_id"])
+            order["sold_at"] = parse_sold_at(payload.get("sold_at"))
+            key = payload.get("idempotency_key")
+            key = str(key).strip() if key else None
+            if key and len(key) > idempotency.MAX_KEY_LENGTH:
+                raise CheckoutError("Invalid idempotency key")
+        except CheckoutError as e:
+            result.update(status="invalid", errors=e.errors)
+            continue
+        pending.append((index, order, key))
+
+    # Customers for the whole batch in one query
+    customer_ids = {order["customer_id"] for _, order, _ in pending if order["customer_id"]}
+    customers = Customer.objects.in_bulk(customer_ids)
+
+    # Already-used idempotency keys for the whole batch in one query
+    stored = idempotency.lookup_many(user, [key for _, _, key in pending if key])
+
+    accepted, seen_keys = [], set()
+    for index, order, key in pending:
+        if key and key in stored:
+            results[index].update(status="duplicate", **stored[key].response)
+            continue
+        if key and key in seen_keys:
+            results[index].update(status="invalid", errors=["Duplicate idempotency key in batch"])
+            continue
+        if order["customer_id"] and order["customer_id"] not in customers:
+            results[index].update(status="invalid", errors=["Invalid customer"])
+            continue
+        if key:
+            seen_keys.add(key)
+        accepted.append((index, order, key))
+
+    for start in range(0, len(accepted), chunk_size):
+        chunk = accepted[start:start + chunk_size]
+        while chunk:
+            try:
+                outcome = _ingest_chunk(user, branch, chunk, customers)
+            except CheckoutError as e:
+                # Stock moved under us: the whole chunk was rolled back
+                outcome = {index: {"status": "conflict", "errors": e.errors} for index, _, _ in chunk}
+            except IntegrityError:
+                # A concurrent request used one of the chunk's keys after our lookup and the
+                # chunk was rolled back: those sales went through already (duplicate), the
+                # rest of the chunk is applied again.
+                keys = [key for _, _, key in chunk if key]
+                if not keys:
+                    raise
+                raced = idempotency.lookup_many(user, keys)
+                for index, _, key in chunk:
+                    if key in raced:
+                        results[index].update(status="duplicate", **raced[key].response)
+                    elif key and not raced:
+                        # the other request has not committed yet: can't tell which key it was
+                        results[index].update(status="conflict", errors=["Checkout already in progress, please retry"])
+                if raced:
+                    chunk = [entry for entry in chunk if entry[2] not in raced]
+                else:
+                    chunk = [entry for entry in chunk if not entry[2]]
+                continue
+            for index, update in outcome.items():
+                results[index].update(update)
+            break
+
+    return results
+
+
+def _ingest_chunk(user, branch, chunk, customers):
+    outcome = {}
+    with transaction.atomic():
+        item_ids = set()
+        for _, order, _ in chunk:
+            item_ids.update(order["lines"])
+        items = lock_items(branch, item_ids)
+        remaining = {pk: item.stock for pk, item in items.items()}
+
+        sold = {}
+        accepted = []  # (index, sale, sale_items, key)
+        for index, order, key in chunk:
+            try:
+                check_stock(order["lines"], items, remaining)
+            except CheckoutError as e:
+                outcome[index] = {"status": "conflict", "errors": e.errors, "details": e.details}
+                continue
+            try:
+                sale, sale_items = build_sale(user, branch, order, items, customers.get(order["customer_id"]))
+            except CheckoutError as e:
+                outcome[index] = {"status": "invalid", "errors": e.errors}
+                continue
+            sale.datetime = order["sold_at"]
+            sale.business_date = branch.business_date(sale.datetime)
+            for item_id, qty in order["lines"].items():
+                remaining[item_id] -= qty
+                sold[item_id] = sold.get(item_id, 0) + qty
+            accepted.append((index, sale, sale_items, key))
+
+        if not accepted:
+            return outcome
+
+        decrement_stock(branch, sold)
+        Sale.objects.bulk_create([sale for _, sale, _, _ in accepted])
+        lines = []
+        for _, sale, sale_items, _ in accepted:
+            for sale_item in sale_items:
+                sale_item.sale = sale
+                lines.append(sale_item)
+        SaleItem.objects.bulk_create(lines)
+        sales_recorded.send(sender=Sale, branch=branch, sales=[sale for _, sale, _, _ in accepted], items=lines)
+
+        replays = []
+        for index, sale, _, key in accepted:
+            data = sale_payload(sale)
+            outcome[index] = {"status": "created", **data}
+            if key:
+                replays.append(CheckoutRequest(user=user, key=key, sale=sale, response=data))
+        CheckoutRequest.objects.bulk_create(replays)
+    return outcome
@@ -0,0 +1,93 @@
+# sales/idempotency.py
+"""
+Idempotency keys for checkout.
+
+The POS screen sends an ``Idempotency-Key`` header (or ``idempotency_key`` in
+the JSON body) that stays the same while it retries one cart. The first
+successful checkout stores its JSON response in CheckoutRequest inside the
+same transaction as the Sale; any retry with that key gets the stored
+response back without touching stock again.
+
+The table is kept small: rows older than CHECKOUT_IDEMPOTENCY_TTL seconds are
+ignored and pruned, and at most CHECKOUT_IDEMPOTENCY_MAX_KEYS rows are kept.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import CheckoutRequest
+
+
+MAX_KEY_LENGTH = 64
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, "CHECKOUT_IDEMPOTENCY_TTL", 24 * 60 * 60))
+
+
+def get_key(request, payload):
+    """Return the client's idempotency key (None if not sent). Raises ValueError if malformed."""
+    key = request.headers.get("Idempotency-Key") or payload.get("idempotency_key")
+    if not key:
+        return None
+    key = str(key).strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError("Invalid idempotency key")
+    return key
+
+
+def lookup(user, key):
+    """Return the stored CheckoutRequest for this key, or None (expired rows are dropped)."""
+    record = CheckoutRequest.objects.filter(user=user, key=key).first()
+    if record is None:
+        return None
+    if record.created_at < timezone.now() - get_ttl():
+        record.delete()
+        return None
+    return record
+
+
+def lookup_many(user, keys):
+    """Batch version of lookup(): {key: CheckoutRequest} for the keys that are still fresh."""
+    if not keys:
+        return {}
+    cutoff = timezone.now() - get_ttl()
+    records = CheckoutRequest.objects.filter(user=user, key__in=keys)
+    records.filter(created_at__lt=cutoff).delete()
+    return {record.key: record for record in records.filter(created_at__gte=cutoff)}
+
+
+def store(user, key, sale, response):
+    """
+    Remember the response for this key. Must run in the checkout transaction:
+    a concurrent duplicate then fails on the (user, key) unique constraint and
+    its whole sale is rolled back. The occasional prune runs after the commit,
+    so the sale's row locks are not held through a table-wide DELETE.
+    """
+    CheckoutRequest.objects.create(user=user, key=key, sale=sale, response=response)
+    if random.random() < getattr(settings, "CHECKOUT_IDEMPOTENCY_PRUNE_RATE", 0.01):
+        transaction.on_commit(prune)
+
+
+def prune():
+    """Delete expired rows, then the oldest rows beyond the size bound."""
+    CheckoutRequest.objects.filter(created_at__lt=timezone.now() - get_ttl()).delete()
+
+    max_keys = getattr(settings, "CHECKOUT_IDEMPOTENCY_MAX_KEYS", 50000)
+    cutoff = (
+        CheckoutRequest.objects.order_by("-id")
+        .values_list("id", flat=True)[max_keys:max_keys + 1]
+    )
+    cutoff = list(cutoff)
+    if cutoff:
+        CheckoutRequest.objects.filter(id__lte=cutoff[0]).delete()
+
+
+def replay(record):
+    response = JsonResponse(record.response)
+    response["Idempotent-Replayed"] = "true"
+    return response
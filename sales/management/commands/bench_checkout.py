@@ -0,0 +1,103 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from branches.models import Branch
+from inventory.models import Category, Item
+from sales.checkout import place_order
+from sales.models import Sale, SaleItem
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples, pct):
+    """Nearest-rank percentile of a list of floats."""
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _legacy_checkout(user, branch, order):
+    """The per-line checkout loop the engine replaced, kept for comparison."""
+    with transaction.atomic():
+        sale = Sale.objects.create(user=user, branch=branch, order_type=order["order_type"])
+        total = Decimal("0.00")
+        for item_id, qty in order["lines"].items():
+            item = Item.objects.select_for_update().get(pk=item_id)
+            item.stock -= qty
+            item.save()
+            SaleItem.objects.create(sale=sale, item=item, quantity=qty, price=item.price)
+            total += item.price * qty
+        sale.total = total
+        sale.final_total = total
+        sale.save()
+    return sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare p50/p99 checkout latency of the per-line legacy loop and the "
+        "set-based engine, by cart size. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,5,10,30,100", help="Comma separated cart sizes")
+        parser.add_argument("--runs", type=int, default=200, help="Checkouts per cart size and engine")
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        runs = options["runs"]
+
+        try:
+            with transaction.atomic():
+                self._run(sizes, runs)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, sizes, runs):
+        User = get_user_model()
+        branch = Branch.objects.create(name="bench-checkout")
+        user = User.objects.create(username=f"bench-checkout-{branch.pk}", branch=branch)
+        category = Category.objects.create(name="bench", branch=branch)
+        Item.objects.bulk_create([
+            Item(name=f"bench item {i}", price=Decimal("9.99"), stock=10**9, branch=branch, category=category)
+            for i in range(max(sizes))
+        ])
+        item_ids = list(Item.objects.filter(branch=branch).order_by("pk").values_list("pk", flat=True))
+
+        engines = [("legacy", _legacy_checkout), ("set-based", place_order)]
+
+        self.stdout.write(f"{'cart':>6} {'engine':>10} {'queries':>8} {'p50 ms':>9} {'p99 ms':>9}")
+        for size in sizes:
+            order = {
+                "lines": {item_id: 1 for item_id in item_ids[:size]},
+                "customer_id": None,
+                "order_type": "takeaway",
+                "table_number": None,
+                "payment_method": "cash",
+                "discount_percent": Decimal("0"),
+                "cash_amount": Decimal("0"),
+                "card_amount": Decimal("0"),
+            }
+            for name, engine in engines:
+                with CaptureQueriesContext(connection) as ctx:
+                    engine(user, branch, order)
+                queries = len(ctx.captured_queries)
+
+                samples = []
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    engine(user, branch, order)
+                    samples.append((time.perf_counter() - started) * 1000)
+
+                self.stdout.write(
+                    f"{size:>6} {name:>10} {queries:>8} "
+                    f"{_percentile(samples, 50):>9.2f} {_percentile(samples, 99):>9.2f}"
+                )
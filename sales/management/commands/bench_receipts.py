@@ -0,0 +1,61 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from branches.models import Branch
+from inventory.models import Item
+from sales import receipts
+from sales.models import Sale, SaleItem
+
+from .bench_checkout import _Rollback, _percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare receipt renderers (xhtml2pdf, reportlab, text, ESC/POS) on receipts "
+        "with 1, 20 and 100 lines. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", default="1,20,100", help="Comma separated receipt line counts")
+        parser.add_argument("--runs", type=int, default=20, help="Renders per renderer and size")
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["lines"].split(",") if s.strip()]
+        try:
+            with transaction.atomic():
+                self._run(sizes, options["runs"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, sizes, runs):
+        branch = Branch.objects.create(name="bench-receipts")
+        user = get_user_model().objects.create(username=f"bench-receipts-{branch.pk}", branch=branch)
+        items = Item.objects.bulk_create([
+            Item(name=f"Receipt item number {i}", price=Decimal("12.50"), stock=100, branch=branch)
+            for i in range(max(sizes))
+        ])
+
+        self.stdout.write(f"{'lines':>6} {'renderer':>10} {'bytes':>8} {'p50 ms':>9} {'p99 ms':>9}")
+        for size in sizes:
+            sale = Sale.objects.create(user=user, branch=branch, total=Decimal("12.50") * size,
+                                       final_total=Decimal("12.50") * size)
+            SaleItem.objects.bulk_create([
+                SaleItem(sale=sale, item=item, quantity=1, price=item.price) for item in items[:size]
+            ])
+            sale = receipts.receipt_queryset().get(pk=sale.pk)
+
+            for name, backend in receipts.RENDERERS.items():
+                samples, output = [], b""
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    output = backend["render"](sale)
+                    samples.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{size:>6} {name:>10} {len(output):>8} "
+                    f"{_percentile(samples, 50):>9.2f} {_percentile(samples, 99):>9.2f}"
+                )
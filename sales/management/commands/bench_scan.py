@@ -0,0 +1,81 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from branches.models import Branch
+from inventory.catalog import current_version
+from inventory.models import Item
+from sales.scan import ScanIndex
+
+from .bench_checkout import _Rollback, _percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark the in-memory scan index against a database lookup per scan. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100000, help="Items in the benchmark branch")
+        parser.add_argument("--lookups", type=int, default=10000, help="Scans to time")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options["items"], options["lookups"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, n_items, n_lookups):
+        branch = Branch.objects.create(name="bench-scan")
+        started = time.perf_counter()
+        Item.objects.bulk_create(
+            (
+                Item(
+                    name=f"scan item {i}", price=Decimal("1.00"), stock=10, branch=branch,
+                    sku=f"bench-{branch.pk}-{i}", barcode=f"{branch.pk:04d}{i:09d}",
+                )
+                for i in range(n_items)
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f"seeded {n_items} items in {time.perf_counter() - started:.2f}s")
+
+        codes = [f"{branch.pk:04d}{random.randrange(n_items):09d}" for _ in range(n_lookups)]
+        version = current_version(branch.pk)
+
+        index = ScanIndex(branch.pk)
+        started = time.perf_counter()
+        index.refresh(version)
+        self.stdout.write(f"index build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        self._time("index lookup", codes, lambda code: index.lookup(code, version))
+        self._time(
+            "db lookup",
+            codes[:min(len(codes), 2000)],
+            lambda code: Item.objects.filter(branch=branch, barcode=code)
+            .values_list("id", "name", "price", "stock", "sku", "barcode").first(),
+        )
+
+        # One item edit -> the next scan pays for a delta refresh only
+        item = Item.objects.filter(branch=branch).first()
+        item.price = Decimal("2.00")
+        item.save()
+        started = time.perf_counter()
+        index.lookup(item.barcode, current_version(branch.pk))
+        self.stdout.write(f"delta refresh after 1 edit: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    def _time(self, label, codes, fn):
+        samples = []
+        for code in codes:
+            started = time.perf_counter()
+            fn(code)
+            samples.append((time.perf_counter() - started) * 1e6)
+        self.stdout.write(
+            f"{label:>14}: p50 {_percentile(samples, 50):8.1f} us   p99 {_percentile(samples, 99):8.1f} us"
+        )
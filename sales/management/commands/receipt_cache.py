@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from pos_system.rendering import RenderError
+from sales import receipts
+
+
+class Command(BaseCommand):
+    help = "Pre-warm, evict, purge or inspect the on-disk receipt PDF cache."
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument("--warm", action="store_true", help="Render receipts that are not cached yet")
+        action.add_argument("--purge", action="store_true", help="Delete cached receipts")
+        action.add_argument("--evict", action="store_true", help="Evict least recently used receipts down to RECEIPT_CACHE_MAX_BYTES")
+        action.add_argument("--stats", action="store_true", help="Show cache size")
+
+        parser.add_argument("--days", type=int, default=1, help="--warm: sales of the last N days")
+        parser.add_argument("--branch", type=int, help="--warm: only this branch id")
+        parser.add_argument("--renderer", choices=sorted(receipts.RENDERERS), help="--warm: instead of each branch's own format")
+        parser.add_argument("--stale", action="store_true", help="--purge: only receipts of older template versions")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            stats = receipts.stats()
+            self.stdout.write(f"{stats['files']} receipts, {stats['bytes'] / 1024 / 1024:.1f} MB")
+        elif options["evict"]:
+            removed = receipts.evict()
+            self.stdout.write(f"Evicted {removed} receipts")
+        elif options["purge"]:
+            removed = receipts.purge(stale_only=options["stale"])
+            self.stdout.write(f"Removed {removed} receipts")
+        else:
+            self._warm(options["days"], options["branch"], options["renderer"])
+
+    def _warm(self, days, branch_id, renderer=None):
+        if days < 1:
+            raise CommandError("--days must be at least 1")
+
+        sales = receipts.receipt_queryset().filter(datetime__gte=timezone.now() - timedelta(days=days))
+        if branch_id:
+            sales = sales.filter(branch_id=branch_id)
+
+        rendered = cached = failed = 0
+        for sale in sales.order_by("-datetime").iterator(chunk_size=200):
+            name = receipts.renderer_for(sale, renderer)
+            if receipts.cache_path(sale, name).exists():
+                cached += 1
+                continue
+            try:
+                receipts.get_receipt(sale, name)
+                rendered += 1
+            except RenderError as e:
+                failed += 1
+                self.stderr.write(str(e))
+        self.stdout.write(f"Rendered {rendered}, already cached {cached}, failed {failed}")
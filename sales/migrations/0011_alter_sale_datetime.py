@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_checkoutrequest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='datetime',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
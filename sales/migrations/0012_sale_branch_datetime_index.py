@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0004_branch_receipt_renderer'),
+        ('customers', '0003_remove_customer_email'),
+        ('sales', '0011_alter_sale_datetime'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['branch', 'datetime'], name='sales_sale_branch__7a6c24_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0006_branch_day_rollover_hour'),
+        ('customers', '0003_remove_customer_email'),
+        ('sales', '0012_sale_branch_datetime_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='business_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['branch', 'business_date'], name='sales_sale_branch__9e6c02_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['user', 'business_date'], name='sales_sale_user_id_b6fc0e_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Fills Sale.business_date of existing sales, a chunk of rows per transaction,
+# so a large table is never locked in one long update.
+
+import datetime
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+
+CHUNK_SIZE = 5000
+
+
+def backfill_business_date(apps, schema_editor):
+    Branch = apps.get_model("branches", "Branch")
+    Sale = apps.get_model("sales", "Sale")
+    db = schema_editor.connection.alias
+    rollover = dict(Branch.objects.using(db).values_list("id", "day_rollover_hour"))
+    pending = Sale.objects.using(db).filter(business_date__isnull=True).order_by("pk")
+
+    last_pk = 0
+    while True:
+        rows = list(pending.filter(pk__gt=last_pk).values_list("pk", "datetime", "branch_id")[:CHUNK_SIZE])
+        if not rows:
+            break
+        sales = [
+            Sale(pk=pk, business_date=(
+                timezone.localtime(when) - datetime.timedelta(hours=rollover.get(branch_id, 0))
+            ).date())
+            for pk, when, branch_id in rows
+        ]
+        with transaction.atomic(using=db):
+            Sale.objects.using(db).bulk_update(sales, ["business_date"], batch_size=1000)
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('sales', '0013_sale_business_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_business_date, migrations.RunPython.noop),
+    ]
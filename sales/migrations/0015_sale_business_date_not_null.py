@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0014_backfill_sale_business_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='business_date',
+            field=models.DateField(editable=False),
+        ),
+    ]
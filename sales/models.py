@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 from customers.models import Customer
 
@@ -19,7 +20,10 @@ class Sale(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     branch = models.ForeignKey('branches.Branch', on_delete=models.SET_NULL, null=True)
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
-    datetime = models.DateTimeField(auto_now_add=True)
+    # default (not auto_now_add) so sales queued by offline terminals keep the time they were made
+    datetime = models.DateTimeField(default=timezone.now)
+    # local date the sale counts for in reports (the branch's day_rollover_hour applied); set by save()
+    business_date = models.DateField(editable=False)
     order_type = models.CharField(max_length=20, choices=ORDER_TYPES, default='takeaway')  
     table_number = models.CharField(max_length=10, null=True, blank=True)  
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='cash')
@@ -31,6 +35,28 @@ class Sale(models.Model):
     cash_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     card_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # time-ordered reads of one branch (exports, receipts)
+            models.Index(fields=["branch", "datetime"]),
+            # business day reads: reports and rollups per branch, a cashier's sales of the day
+            models.Index(fields=["branch", "business_date"]),
+            models.Index(fields=["user", "business_date"]),
+        ]
+
+    def compute_business_date(self):
+        if self.branch_id:
+            return self.branch.business_date(self.datetime)
+        return timezone.localdate(self.datetime)
+
+    def save(self, *args, **kwargs):
+        # bulk_create skips this: callers set business_date themselves (see sales/checkout.py)
+        self.business_date = self.compute_business_date()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"datetime", "branch"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "business_date"}
+        super().save(*args, **kwargs)
+
 class SaleItem(models.Model):
     sale = models.ForeignKey(Sale, related_name='items', on_delete=models.CASCADE)
     item = models.ForeignKey('inventory.Item', on_delete=models.PROTECT)
@@ -42,3 +68,22 @@ class SaleItem(models.Model):
 
     def __str__(self):
         return f"{self.item.name} x {self.quantity}"
+
+
+class CheckoutRequest(models.Model):
+    """
+    Response of a checkout that was sent with an idempotency key, so a
+    client retry with the same key is answered from here instead of
+    selling the cart twice. Rows expire and are pruned (see sales/idempotency.py).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True)
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+    def __str__(self):
+        return f"{self.user} {self.key}"
@@ -0,0 +1,356 @@
+# sales/receipts.py
+"""
+Receipts: renderer backends plus an on-disk cache.
+
+Renderers (chosen per branch with Branch.receipt_renderer):
+  - html:      sales/receipt.html through xhtml2pdf, in the shared render pool
+               (pos_system/rendering.py)
+  - reportlab: the same layout drawn directly on an 80mm roll with reportlab
+  - text:      plain text, RECEIPT_TEXT_WIDTH columns
+  - escpos:    the text layout as an ESC/POS byte stream for thermal printers
+
+A receipt is rendered once and stored under RECEIPT_CACHE_DIR as
+"<sale id>-<renderer>-<version>-<fingerprint>.<ext>". For the html renderer
+the version is a hash of the receipt template and the layout it extends, so
+editing either one produces new keys; the other renderers carry a
+LAYOUT_VERSION to bump when their layout changes. The fingerprint is a hash
+of what the receipt shows (receipt_lines()), so a sale edited in the admin,
+or a renamed customer or branch, gets a new receipt. Old files age out.
+
+The cache is bounded by RECEIPT_CACHE_MAX_BYTES with LRU eviction. Recency
+is the file's access time, which is set explicitly on every hit (so it does
+not depend on how the disk is mounted); the modification time stays the
+time the receipt was generated and is used for Last-Modified.
+
+Eviction does not scan the directory on every miss: each process reads the
+cache size once and adds what it writes, and only evicts when that crosses
+the bound. Other processes' writes are not in that count, so with several
+workers the directory can run over until one of them crosses it;
+"receipt_cache --evict" (e.g. from cron) applies the bound exactly.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils import timezone
+
+from pos_system import rendering
+
+from .models import Sale
+
+
+RECEIPT_TEMPLATES = ["sales/receipt.html", "accounts/layout.html"]
+TWO_PLACES = Decimal("0.01")
+# Bump when the reportlab / text layouts below change
+LAYOUT_VERSION = "1"
+
+_template_hash = {"stamp": None, "hash": None}
+# Cache size as this process knows it (None: not read from disk yet)
+_cache_bytes = {"total": None}
+_cache_bytes_lock = threading.Lock()
+
+
+class ReceiptError(rendering.RenderError):
+    pass
+
+
+def get_cache_dir():
+    return Path(getattr(settings, "RECEIPT_CACHE_DIR", Path(settings.BASE_DIR) / "cache" / "receipts"))
+
+
+def template_hash():
+    """Short hash of the receipt templates' source, recomputed only when a file changes."""
+    paths = [Path(get_template(name).origin.name) for name in RECEIPT_TEMPLATES]
+    stamp = tuple((str(p), p.stat().st_mtime_ns) for p in paths)
+    if _template_hash["stamp"] != stamp:
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(path.read_bytes())
+        _template_hash.update(stamp=stamp, hash=digest.hexdigest()[:16])
+    return _template_hash["hash"]
+
+
+# -------------------------------
+# Receipt content
+# -------------------------------
+def receipt_queryset():
+    """Sales with everything a receipt reads, in a fixed number of queries."""
+    return Sale.objects.select_related("user", "branch", "customer").prefetch_related("items__item")
+
+
+def receipt_lines(sale):
+    """
+    The receipt as (label, value) header rows, item rows and total rows,
+    following sales/receipt.html. Shared by the non-HTML renderers.
+    """
+    local_dt = timezone.localtime(sale.datetime)
+    if sale.customer:
+        customer = sale.customer.name
+        if sale.customer.phone:
+            customer += f" ({sale.customer.phone})"
+    else:
+        customer = "Walk-in"
+
+    header = [
+        ("Sale ID", str(sale.id)),
+        ("Date", local_dt.strftime("%b %d, %Y, %I:%M %p")),
+        ("Cashier", str(sale.user) if sale.user else ""),
+        ("Branch", str(sale.branch) if sale.branch else ""),
+        ("Customer", customer),
+        ("Payment", sale.payment_method.capitalize()),
+        ("Order Type", sale.order_type.capitalize()),
+    ]
+    if sale.order_type == "dine_in" and sale.table_number:
+        header.append(("Table Number", sale.table_number))
+
+    items = [
+        (si.item.name, si.quantity, f"{si.price:.2f}", f"{si.line_total():.2f}")
+        for si in sale.items.all()
+    ]
+    totals = [
+        ("Total before discount", f"{sale.total:.2f}"),
+        (f"Discount ({sale.discount_percent}%)", f"{sale.discount_amount:.2f}"),
+        ("Total after discount", f"{sale.final_total:.2f}"),
+    ]
+    return header, items, totals
+
+
+# -------------------------------
+# Renderers
+# -------------------------------
+def render_html(sale):
+    """sales/receipt.html through xhtml2pdf (in the render pool). Raises RenderBusy / RenderTimeout."""
+    sale.datetime = timezone.localtime(sale.datetime)
+    return rendering.render_pdf("sales/receipt.html", {
+        "sale": sale,
+        "total_before_discount": sale.total.quantize(TWO_PLACES),
+        "discount_amount": sale.discount_amount.quantize(TWO_PLACES),
+        "total_after_discount": sale.final_total.quantize(TWO_PLACES),
+    })
+
+
+def render_reportlab(sale):
+    """The receipt layout drawn directly on a single 80mm roll page."""
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+
+    header, items, totals = receipt_lines(sale)
+    width, margin, line_h = 80 * mm, 4 * mm, 4.2 * mm
+    rows = 2 + len(header) + 1 + len(items) + 1 + len(totals)
+    height = rows * line_h + 2 * margin + 6 * mm
+
+    out = io.BytesIO()
+    c = canvas.Canvas(out, pagesize=(width, height), pageCompression=1)
+    y = height - margin - 5 * mm
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawCentredString(width / 2, y, "Receipt")
+    y -= line_h * 1.5
+
+    def row(label, value, bold_label=True):
+        nonlocal y
+        c.setFont("Helvetica-Bold" if bold_label else "Helvetica", 7.5)
+        c.drawString(margin, y, f"{label}:")
+        c.setFont("Helvetica", 7.5)
+        c.drawRightString(width - margin, y, value)
+        y -= line_h
+
+    def rule():
+        nonlocal y
+        c.line(margin, y + line_h / 2, width - margin, y + line_h / 2)
+        y -= line_h / 2
+
+    for label, value in header:
+        row(label, value)
+    rule()
+
+    c.setFont("Helvetica", 7.5)
+    max_name = width - 2 * margin - 30 * mm
+    for name, qty, price, line_total in items:
+        while name and stringWidth(name, "Helvetica", 7.5) > max_name:
+            name = name[:-1]
+        c.drawString(margin, y, name)
+        c.drawRightString(width - margin, y, f"{qty} x {price} = {line_total}")
+        y -= line_h
+    rule()
+
+    for label, value in totals:
+        row(label, value)
+
+    c.showPage()
+    c.save()
+    return out.getvalue()
+
+
+def render_text(sale):
+    """Fixed-width plain text receipt (RECEIPT_TEXT_WIDTH columns)."""
+    width = getattr(settings, "RECEIPT_TEXT_WIDTH", 42)
+    header, items, totals = receipt_lines(sale)
+
+    def pair(left, right):
+        room = max(width - len(right) - 1, 1)
+        return f"{left[:room]:<{room}} {right}"
+
+    lines = ["Receipt".center(width), ""]
+    lines += [pair(f"{label}:", value) for label, value in header]
+    lines.append("-" * width)
+    for name, qty, price, line_total in items:
+        lines.append(name[:width])
+        lines.append(pair(f"  {qty} x {price}", line_total))
+    lines.append("-" * width)
+    lines += [pair(f"{label}:", value) for label, value in totals]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+ESC_INIT = b"\x1b@"
+ESC_BOLD_ON, ESC_BOLD_OFF = b"\x1bE\x01", b"\x1bE\x00"
+ESC_CENTER, ESC_LEFT = b"\x1ba\x01", b"\x1ba\x00"
+ESC_FEED_CUT = b"\x1bd\x04" + b"\x1dV\x42\x00"
+
+
+def render_escpos(sale):
+    """The text layout as an ESC/POS stream: init, bold centered title, body, feed and cut."""
+    encoding = getattr(settings, "RECEIPT_ESCPOS_ENCODING", "cp437")
+    title, _, body = render_text(sale).decode("utf-8").partition("\n")
+    return b"".join([
+        ESC_INIT,
+        ESC_CENTER, ESC_BOLD_ON, title.strip().encode(encoding, "replace"), b"\n", ESC_BOLD_OFF,
+        ESC_LEFT, body.encode(encoding, "replace"),
+        ESC_FEED_CUT,
+    ])
+
+
+RENDERERS = {
+    "html": {"render": render_html, "content_type": "application/pdf", "extension": "pdf"},
+    "reportlab": {"render": render_reportlab, "content_type": "application/pdf", "extension": "pdf"},
+    "text": {"render": render_text, "content_type": "text/plain; charset=utf-8", "extension": "txt"},
+    "escpos": {"render": render_escpos, "content_type": "application/octet-stream", "extension": "bin"},
+}
+
+
+def renderer_for(sale, name=None):
+    """Renderer name to use: an explicit choice, else the sale's branch setting, else html."""
+    name = name or (sale.branch.receipt_renderer if sale.branch else None) or "html"
+    if name not in RENDERERS:
+        raise ReceiptError(f"Unknown receipt renderer: {name}")
+    return name
+
+
+# -------------------------------
+# Cache
+# -------------------------------
+def fingerprint(sale):
+    """Short hash of what the sale's receipt shows (expects receipt_queryset()'s related rows)."""
+    return hashlib.sha256(repr(receipt_lines(sale)).encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(sale, renderer="html"):
+    version = template_hash() if renderer == "html" else LAYOUT_VERSION
+    return f"{sale.pk}-{renderer}-{version}-{fingerprint(sale)}"
+
+
+def cache_path(sale, renderer="html"):
+    return get_cache_dir() / f"{cache_key(sale, renderer)}.{RENDERERS[renderer]['extension']}"
+
+
+def get_receipt(sale, renderer="html"):
+    """Path of the cached receipt of a sale, rendering and storing it on a miss."""
+    path = cache_path(sale, renderer)
+    if path.exists():
+        touch(path)
+        return path
+
+    data = RENDERERS[renderer]["render"](sale)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file and rename, so readers never see half a receipt
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    if _grown(len(data)) > get_max_bytes():
+        evict()
+    return path
+
+
+def get_max_bytes():
+    return getattr(settings, "RECEIPT_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+
+
+def _grown(size):
+    """Add a written receipt to the known cache size and return the new size."""
+    with _cache_bytes_lock:
+        if _cache_bytes["total"] is None:
+            _cache_bytes["total"] = stats()["bytes"]  # already includes the new file
+        else:
+            _cache_bytes["total"] += size
+        return _cache_bytes["total"]
+
+
+def touch(path):
+    """Mark a cached file as recently used (atime only; mtime stays the generation time)."""
+    try:
+        os.utime(path, (time.time(), path.stat().st_mtime))
+    except FileNotFoundError:
+        pass
+
+
+def _entries():
+    cache_dir = get_cache_dir()
+    if not cache_dir.exists():
+        return []
+    entries = []
+    for path in cache_dir.iterdir():
+        if path.suffix == ".tmp":
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_atime, stat.st_size, path))
+    return entries
+
+
+def evict(max_bytes=None):
+    """Delete least recently used receipts until the cache fits in max_bytes. Returns files removed."""
+    if max_bytes is None:
+        max_bytes = get_max_bytes()
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    with _cache_bytes_lock:
+        _cache_bytes["total"] = total
+    return removed
+
+
+def purge(stale_only=False):
+    """Delete cached receipts (only those of older template/layout versions if stale_only). Returns files removed."""
+    current = {f"html-{template_hash()}"} | {f"{name}-{LAYOUT_VERSION}" for name in RENDERERS if name != "html"}
+    removed = 0
+    for _, _, path in _entries():
+        # stem: <sale id>-<renderer>-<version>-<fingerprint>
+        if stale_only and "-".join(path.stem.split("-")[1:3]) in current:
+            continue
+        path.unlink(missing_ok=True)
+        removed += 1
+    with _cache_bytes_lock:
+        _cache_bytes["total"] = None
+    return removed
+
+
+def stats():
+    entries = _entries()
+    return {"files": len(entries), "bytes": sum(size for _, size, _ in entries)}
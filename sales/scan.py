@@ -0,0 +1,94 @@
+# sales/scan.py
+"""
+In-memory barcode/SKU index for scan-to-cart.
+
+Each process keeps one hash index per branch, mapping barcodes and SKUs to
+a compact item record. It is built lazily on the first scan and kept in step
+with the branch catalog version (inventory/catalog.py): when the branch has
+moved past the version the index was built at, only the items changed since
+then (plus tombstones) are re-read, so a checkout or an item edit costs one
+small indexed query on the next scan instead of a rebuild.
+"""
+import threading
+
+from inventory.models import CatalogTombstone, Item
+
+
+RECORD_FIELDS = ("id", "name", "price", "stock", "sku", "barcode")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class ScanIndex:
+    def __init__(self, branch_id):
+        self.branch_id = branch_id
+        self.version = None
+        self.codes = {}        # barcode / sku -> record tuple
+        self.item_codes = {}   # item id -> codes currently pointing at it
+        self.lock = threading.Lock()
+
+    def lookup(self, code, version):
+        """Record tuple for a barcode or SKU, refreshing first if the branch moved past `version`."""
+        if self.version is None or self.version < version:
+            self.refresh(version)
+        return self.codes.get(code)
+
+    def refresh(self, version):
+        with self.lock:
+            if self.version is not None and self.version >= version:
+                return  # another thread already caught up
+
+            items = Item.objects.filter(branch_id=self.branch_id)
+            if self.version is None:
+                self.codes, self.item_codes = {}, {}
+            else:
+                items = items.filter(version__gt=self.version)
+                removed = CatalogTombstone.objects.filter(
+                    branch_id=self.branch_id, version__gt=self.version
+                ).values_list("item_id", flat=True)
+                for item_id in removed:
+                    self._drop(item_id)
+
+            for row in items.values_list(*RECORD_FIELDS).iterator(chunk_size=5000):
+                self._add(row)
+            self.version = version
+
+    def _drop(self, item_id):
+        for code in self.item_codes.pop(item_id, ()):
+            record = self.codes.get(code)
+            if record is not None and record[0] == item_id:
+                del self.codes[code]
+
+    def _add(self, row):
+        item_id, name, price, stock, sku, barcode = row
+        self._drop(item_id)
+        record = (item_id, name, str(price), stock, sku, barcode)
+        codes = tuple(code.strip() for code in (barcode, sku) if code and code.strip())
+        for code in codes:
+            # If several items share a barcode, the most recently changed one wins
+            self.codes[code] = record
+        self.item_codes[item_id] = codes
+
+
+def get_index(branch_id):
+    index = _indexes.get(branch_id)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(branch_id, ScanIndex(branch_id))
+    return index
+
+
+def lookup(branch, code):
+    """Item record (dict) for a scanned barcode or SKU in the branch, or None."""
+    code = (code or "").strip()
+    if not code:
+        return None
+    record = get_index(branch.pk).lookup(code, branch.catalog_version)
+    return dict(zip(RECORD_FIELDS, record)) if record else None
+
+
+def reset():
+    """Drop every index (tests)."""
+    with _indexes_lock:
+        _indexes.clear()
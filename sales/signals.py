@@ -0,0 +1,13 @@
+# sales/signals.py
+"""
+sales_recorded is sent inside the checkout transaction, once the Sale and
+SaleItem rows are written (place_order(), ingest_sales() and the manual sale
+form). Receivers such as the report rollups write in the same transaction,
+so a checkout that rolls back never reaches them.
+
+Arguments: branch, sales (saved Sale instances), items (their saved SaleItem rows).
+"""
+from django.dispatch import Signal
+
+
+sales_recorded = Signal()
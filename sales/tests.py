@@ -1,3 +1,602 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from branches.models import Branch
+from inventory.models import Item
+from .checkout import CheckoutError, decrement_stock, lock_items
+from .models import CheckoutRequest, Sale, SaleItem
+from . import idempotency, receipts, scan
+
+
+User = get_user_model()
+
+
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        self.branch = Branch.objects.create(name="Main")
+        self.other = Branch.objects.create(name="Other")
+        self.cashier = User.objects.create_user("cashier", password="pw", role="cashier", branch=self.branch)
+        self.tea = Item.objects.create(name="Tea", price=Decimal("2.50"), stock=5, branch=self.branch)
+        self.cake = Item.objects.create(name="Cake", price=Decimal("1.00"), stock=1, branch=self.branch)
+        self.juice = Item.objects.create(name="Juice", price=Decimal("3.00"), stock=10, branch=self.other)
+        self.client.force_login(self.cashier)
+
+    def cart(self, *lines, **extra):
+        return {"items": [{"id": item.pk, "quantity": qty} for item, qty in lines], "order_type": "takeaway", **extra}
+
+    def post(self, url, payload, **headers):
+        return self.client.post(reverse(url), json.dumps(payload), content_type="application/json", headers=headers)
+
+    def checkout(self, payload, **headers):
+        return self.post("sales:checkout", payload, **headers)
+
+    def stock(self, item):
+        item.refresh_from_db()
+        return item.stock
+
+
+class CheckoutEngineTests(CheckoutTestCase):
+    def test_sale(self):
+        response = self.checkout(self.cart((self.tea, 2), (self.cake, 1), discount=10))
+        self.assertEqual(response.status_code, 200)
+        sale = Sale.objects.get()
+        self.assertEqual(response.json()["sale_id"], sale.pk)
+        self.assertEqual((sale.total, sale.discount_amount, sale.final_total),
+                         (Decimal("6.00"), Decimal("0.60"), Decimal("5.40")))
+        self.assertEqual(SaleItem.objects.filter(sale=sale).count(), 2)
+        self.assertEqual((self.stock(self.tea), self.stock(self.cake)), (3, 0))
+
+    def test_sale_stamps_catalog_version(self):
+        before = self.tea.version
+        self.checkout(self.cart((self.tea, 1), (self.cake, 1)))
+        self.branch.refresh_from_db()
+        self.tea.refresh_from_db()
+        self.cake.refresh_from_db()
+        # one version for the whole decrement, the branch's latest
+        self.assertGreater(self.tea.version, before)
+        self.assertEqual(self.tea.version, self.cake.version)
+        self.assertEqual(self.tea.version, self.branch.catalog_version)
+
+    def test_oversell_reports_every_line(self):
+        response = self.checkout(self.cart((self.tea, 9), (self.cake, 2)))
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(len(data["errors"]), 2)
+        self.assertEqual(
+            [(d["id"], d["reason"], d["requested"], d["available"]) for d in data["details"]],
+            [(self.tea.pk, "insufficient_stock", 9, 5), (self.cake.pk, "insufficient_stock", 2, 1)],
+        )
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual((self.stock(self.tea), self.stock(self.cake)), (5, 1))
+
+    def test_other_branch_item_not_found(self):
+        # checkout only sells the cashier's own branch items
+        response = self.checkout(self.cart((self.tea, 1), (self.juice, 1)))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["details"], [{"id": self.juice.pk, "reason": "not_found"}])
+        self.assertEqual((self.stock(self.tea), self.stock(self.juice)), (5, 10))
+
+    def test_stock_taken_after_lock_is_a_conflict(self):
+        def lock_then_sell(branch, item_ids):
+            items = lock_items(branch, item_ids)
+            # another checkout sells the cake between the locked read and the UPDATE
+            Item.objects.filter(pk=self.cake.pk).update(stock=0)
+            return items
+
+        with mock.patch("sales.checkout.lock_items", lock_then_sell):
+            response = self.checkout(self.cart((self.tea, 1), (self.cake, 1)))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(self.stock(self.tea), 5)
+
+    def test_guarded_decrement(self):
+        with self.assertRaises(CheckoutError) as raised, transaction.atomic():
+            decrement_stock(self.branch, {self.tea.pk: 1, self.cake.pk: 2})
+        self.assertEqual(raised.exception.status, 409)
+        # the row that did match is rolled back with the rest
+        self.assertEqual((self.stock(self.tea), self.stock(self.cake)), (5, 1))
+
+
+class IdempotentCheckoutTests(CheckoutTestCase):
+    def test_retry_is_replayed(self):
+        first = self.checkout(self.cart((self.tea, 2)), **{"Idempotency-Key": "cart-1"})
+        retry = self.checkout(self.cart((self.tea, 2)), **{"Idempotency-Key": "cart-1"})
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.tea), 3)
+
+        # a new key is a new sale; the key can also come in the body
+        self.checkout(self.cart((self.tea, 1), idempotency_key="cart-2"))
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_key_length(self):
+        response = self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "k" * 65})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+        response = self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "k" * 64})
+        self.assertEqual(response.status_code, 200)
+
+    def test_lost_race_is_replayed(self):
+        # a concurrent request with the same key committed between our lookup and our insert
+        first = self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "cart-1"})
+        stored = CheckoutRequest.objects.get()
+        with mock.patch("sales.idempotency.lookup", side_effect=[None, stored]):
+            retry = self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "cart-1"})
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.tea), 4)
+
+    def test_lost_race_in_flight(self):
+        # the winner's row is not visible yet: ask the client to retry
+        self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "cart-1"})
+        with mock.patch("sales.idempotency.lookup", return_value=None):
+            response = self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "cart-1"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(self.stock(self.tea), 4)
+
+    def test_expired_key_sells_again(self):
+        self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "cart-1"})
+        CheckoutRequest.objects.update(created_at=timezone.now() - idempotency.get_ttl() - datetime.timedelta(seconds=1))
+        response = self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "cart-1"})
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(CheckoutRequest.objects.count(), 1)
+
+    @override_settings(CHECKOUT_IDEMPOTENCY_MAX_KEYS=1, CHECKOUT_IDEMPOTENCY_PRUNE_RATE=0)
+    def test_prune(self):
+        for key in ("a", "b", "c"):
+            self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": key})
+        CheckoutRequest.objects.filter(key="c").update(created_at=timezone.now() - datetime.timedelta(days=2))
+        idempotency.prune()
+        # "c" expired, then only the newest MAX_KEYS rows are kept
+        self.assertEqual(list(CheckoutRequest.objects.values_list("key", flat=True)), ["b"])
+
+    @override_settings(CHECKOUT_IDEMPOTENCY_MAX_KEYS=1, CHECKOUT_IDEMPOTENCY_PRUNE_RATE=1)
+    def test_prune_after_commit(self):
+        self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "a"})
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "b"})
+        # not pruned inside the checkout transaction
+        self.assertEqual(CheckoutRequest.objects.count(), 2)
+        self.assertIn(idempotency.prune, callbacks)
+        idempotency.prune()
+        self.assertEqual(list(CheckoutRequest.objects.values_list("key", flat=True)), ["b"])
+
+
+class BatchCheckoutTests(CheckoutTestCase):
+    def batch(self, *entries):
+        return self.post("sales:checkout_batch", {"sales": list(entries)})
+
+    def test_statuses(self):
+        self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "sold-online"})
+        response = self.batch(
+            self.cart((self.tea, 2), client_ref="a", idempotency_key="k1", sold_at="2026-01-01T10:00:00"),
+            self.cart((self.tea, 1), (self.cake, 1)),
+            self.cart((self.cake, 1)),                              # cake was taken by the sale before
+            "junk",
+            self.cart((self.tea, 1), idempotency_key="k1"),        # same key twice in one batch
+            self.cart((self.tea, 1), idempotency_key="sold-online"),
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [result["status"] for result in data["results"]],
+            ["created", "created", "conflict", "invalid", "invalid", "duplicate"],
+        )
+        self.assertEqual(data["summary"], {"created": 2, "conflict": 1, "invalid": 2, "duplicate": 1})
+        self.assertEqual(data["results"][0]["client_ref"], "a")
+        self.assertEqual(data["results"][2]["details"][0]["reason"], "insufficient_stock")
+        self.assertEqual((self.stock(self.tea), self.stock(self.cake)), (1, 0))
+        self.assertEqual(Sale.objects.count(), 3)
+
+        # the terminal sends the batch again: nothing is sold twice
+        again = self.batch(self.cart((self.tea, 2), idempotency_key="k1")).json()["results"][0]
+        self.assertEqual((again["status"], again["sale_id"]), ("duplicate", data["results"][0]["sale_id"]))
+
+    def test_key_taken_during_batch(self):
+        # another request stores "k1" after the batch looked its keys up
+        self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "k1"})
+        stored = CheckoutRequest.objects.get()
+        lookup_many = idempotency.lookup_many
+        with mock.patch("sales.idempotency.lookup_many", side_effect=[{}, {"k1": stored}]):
+            response = self.batch(
+                self.cart((self.tea, 1), idempotency_key="k1"),
+                self.cart((self.tea, 1), idempotency_key="k2"),
+                self.cart((self.cake, 1)),
+            )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["duplicate", "created", "created"])
+        self.assertEqual(results[0]["sale_id"], stored.sale_id)
+        self.assertEqual((self.stock(self.tea), self.stock(self.cake)), (3, 0))
+        self.assertEqual(set(lookup_many(self.cashier, ["k1", "k2"])), {"k1", "k2"})
+
+    def test_key_in_flight_during_batch(self):
+        # the other request has not committed: its key is a conflict, unkeyed sales still go through
+        self.checkout(self.cart((self.tea, 1)), **{"Idempotency-Key": "k1"})
+        with mock.patch("sales.idempotency.lookup_many", return_value={}):
+            results = self.batch(
+                self.cart((self.tea, 1), idempotency_key="k1"),
+                self.cart((self.cake, 1)),
+            ).json()["results"]
+        self.assertEqual([result["status"] for result in results], ["conflict", "created"])
+        self.assertEqual((self.stock(self.tea), self.stock(self.cake)), (4, 0))
+
+    @override_settings(SALES_BATCH_MAX_SIZE=2)
+    def test_max_size(self):
+        response = self.batch(*[self.cart((self.tea, 1))] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(self.batch(*[self.cart((self.tea, 1))] * 2).status_code, 200)
+
+    @override_settings(SALES_BATCH_CHUNK_SIZE=1)
+    def test_chunks_commit_separately(self):
+        results = self.batch(self.cart((self.cake, 1)), self.cart((self.cake, 1)), self.cart((self.tea, 1))).json()
+        self.assertEqual([result["status"] for result in results["results"]], ["created", "conflict", "created"])
+        self.assertEqual(Sale.objects.count(), 2)
+
+
+class CatalogTests(CheckoutTestCase):
+    def catalog(self, since=None, **headers):
+        params = {"since": since} if since is not None else {}
+        return self.client.get(reverse("sales:catalog"), params, headers=headers)
+
+    def rows(self, data):
+        return {row[0]: dict(zip(data["fields"], row)) for row in data["items"]}
+
+    def test_full_catalog(self):
+        self.cake.stock = 0
+        self.cake.save()
+        data = self.catalog().json()
+        self.assertTrue(data["full"])
+        # only the branch's items; out of stock items are sent too (the POS hides them)
+        rows = self.rows(data)
+        self.assertEqual(set(rows), {self.tea.pk, self.cake.pk})
+        self.assertEqual(rows[self.cake.pk]["stock"], 0)
+        self.assertEqual(rows[self.tea.pk]["price"], "2.50")
+
+    def test_not_modified(self):
+        response = self.catalog()
+        etag = response["ETag"]
+        self.assertEqual(self.catalog(**{"If-None-Match": etag}).status_code, 304)
+
+        self.checkout(self.cart((self.tea, 1)))
+        response = self.catalog(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_delta(self):
+        version = self.catalog().json()["version"]
+        self.checkout(self.cart((self.tea, 1)))
+        data = self.catalog(since=version).json()
+        self.assertFalse(data["full"])
+        self.assertEqual(self.rows(data)[self.tea.pk]["stock"], 4)
+        self.assertNotIn(self.cake.pk, self.rows(data))
+        self.assertEqual(data["deleted"], [])
+
+        # nothing changed since the latest version
+        self.assertEqual(self.catalog(since=data["version"]).json()["items"], [])
+
+    def test_tombstones(self):
+        version = self.catalog().json()["version"]
+        cake_id = self.cake.pk
+        self.cake.delete()
+        self.tea.branch = self.other
+        self.tea.save()
+        data = self.catalog(since=version).json()
+        self.assertEqual(sorted(data["deleted"]), sorted([cake_id, self.tea.pk]))
+        self.assertEqual(data["items"], [])
+
+    def test_failed_item_write_takes_no_version(self):
+        versions = dict(Branch.objects.values_list("pk", "catalog_version"))
+        self.tea.branch, self.tea.name = self.other, None
+        with self.assertRaises(IntegrityError):
+            self.tea.save()
+        # neither branch moved on, and the old one got no tombstone for an item still in it
+        self.assertEqual(dict(Branch.objects.values_list("pk", "catalog_version")), versions)
+        self.assertEqual(self.catalog(since=versions[self.branch.pk]).json()["deleted"], [])
+
+    def test_unknown_version_is_full(self):
+        data = self.catalog(since=10 ** 6).json()
+        self.assertTrue(data["full"])
+        self.assertEqual(len(data["items"]), 2)
+
+    def test_pos_page_loads_items_from_catalog(self):
+        response = self.client.get(reverse("sales:pos"))
+        self.assertContains(response, reverse("sales:catalog"))
+        self.assertNotContains(response, "Tea")
+
+
+class ScanIndexTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        scan.reset()
+        self.addCleanup(scan.reset)
+        self.tea.barcode, self.tea.sku = "111", "TEA-1"
+        self.tea.save()
+
+    def lookup(self, code):
+        self.branch.refresh_from_db()
+        return scan.lookup(self.branch, code)
+
+    def test_lookup(self):
+        self.assertEqual(self.lookup("111")["id"], self.tea.pk)
+        self.assertEqual(self.lookup(" TEA-1 ")["name"], "Tea")
+        self.assertIsNone(self.lookup("999"))
+        response = self.client.get(reverse("sales:scan"), {"code": "111"})
+        self.assertEqual(response.json()["item"]["price"], "2.50")
+        self.assertEqual(self.client.get(reverse("sales:scan"), {"code": "999"}).status_code, 404)
+
+    def test_refresh_reads_only_changes(self):
+        self.lookup("111")
+        self.tea.name = "Green tea"
+        self.tea.save()
+        self.branch.refresh_from_db()
+        # the items changed since the index's version, and the tombstones since then
+        with self.assertNumQueries(2):
+            record = scan.lookup(self.branch, "111")
+        self.assertEqual(record["name"], "Green tea")
+        # caught up: no query at all
+        with self.assertNumQueries(0):
+            scan.lookup(self.branch, "111")
+
+    def test_changed_barcode(self):
+        self.lookup("111")
+        self.tea.barcode = "222"
+        self.tea.save()
+        self.assertIsNone(self.lookup("111"))
+        self.assertEqual(self.lookup("222")["id"], self.tea.pk)
+
+    def test_stock_after_checkout(self):
+        self.lookup("111")
+        self.checkout(self.cart((self.tea, 2)))
+        self.assertEqual(self.lookup("111")["stock"], 3)
+
+    def test_deleted_and_moved_items(self):
+        self.cake.barcode = "333"
+        self.cake.save()
+        self.lookup("111")
+        self.assertIsNotNone(self.lookup("333"))
+        self.cake.delete()
+        self.tea.branch = self.other
+        self.tea.save()
+        self.assertIsNone(self.lookup("333"))
+        self.assertIsNone(self.lookup("111"))
+        self.assertIsNone(self.lookup("TEA-1"))
+
+
+class ReceiptTestCase(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = override_settings(RECEIPT_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        receipts.purge()  # forget the cache size known from other tests
+
+        self.branch.receipt_renderer = "text"
+        self.branch.save()
+        self.sale_id = self.checkout(self.cart((self.tea, 1))).json()["sale_id"]
+
+    def receipt(self, renderer=None, **headers):
+        params = {"renderer": renderer} if renderer else {}
+        response = self.client.get(reverse("sales:receipt_pdf", args=[self.sale_id]), params, headers=headers)
+        if response.status_code == 200:
+            response.body = b"".join(response.streaming_content)
+        return response
+
+
+class ReceiptCacheTests(ReceiptTestCase):
+    def test_cached(self):
+        first = self.receipt()
+        self.assertIn(b"Tea", first.body)
+        self.assertEqual(self.receipt(**{"If-None-Match": first["ETag"]}).status_code, 304)
+        self.assertEqual(receipts.stats()["files"], 1)
+
+    def test_edited_sale_gets_a_new_receipt(self):
+        etag = self.receipt()["ETag"]
+        # edited in the admin
+        sale = Sale.objects.get(pk=self.sale_id)
+        sale.payment_method = "card"
+        sale.save()
+        response = self.receipt(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Card", response.body)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # so does a renamed line item
+        etag = response["ETag"]
+        self.tea.name = "Green tea"
+        self.tea.save()
+        self.assertEqual(self.receipt(**{"If-None-Match": etag}).status_code, 200)
+
+    @override_settings(PDF_RENDER_WORKERS=0)
+    def test_renderers(self):
+        pdf = self.receipt("html")
+        self.assertEqual((pdf["Content-Type"], pdf["Content-Disposition"]),
+                         ("application/pdf", f'filename="receipt_{self.sale_id}.pdf"'))
+        self.assertTrue(pdf.body.startswith(b"%PDF"))
+        drawn = self.receipt("reportlab")
+        self.assertEqual(drawn["Content-Type"], "application/pdf")
+        self.assertTrue(drawn.body.startswith(b"%PDF"))
+        self.assertNotEqual(drawn.body, pdf.body)
+
+        text = self.receipt("text")
+        self.assertEqual((text["Content-Type"], text["Content-Disposition"]),
+                         ("text/plain; charset=utf-8", f'filename="receipt_{self.sale_id}.txt"'))
+        lines = text.body.decode().splitlines()
+        self.assertEqual(lines[0], "Receipt".center(42))
+        self.assertIn(f"{'  1 x 2.50':<37} 2.50", lines)
+        self.assertEqual(lines[-1], f"{'Total after discount:':<37} 2.50")
+        self.assertTrue(all(len(line) <= 42 for line in lines))
+
+        escpos = self.receipt("escpos")
+        self.assertEqual(escpos["Content-Type"], "application/octet-stream")
+        self.assertTrue(escpos.body.startswith(
+            receipts.ESC_INIT + receipts.ESC_CENTER + receipts.ESC_BOLD_ON + b"Receipt\n" + receipts.ESC_BOLD_OFF
+        ))
+        self.assertTrue(escpos.body.endswith(text.body.split(b"\n", 1)[1] + receipts.ESC_FEED_CUT))
+        self.assertEqual(receipts.stats()["files"], 4)
+
+    def test_rendered_once_until_the_sale_changes(self):
+        render = mock.Mock(wraps=receipts.render_text)
+        with mock.patch.dict(receipts.RENDERERS["text"], render=render):
+            first = self.receipt()
+            self.assertEqual(self.receipt().body, first.body)
+            render.assert_called_once()
+
+            sale = Sale.objects.get(pk=self.sale_id)
+            sale.payment_method = "card"
+            sale.save()
+            edited = self.receipt()
+            self.assertEqual(render.call_count, 2)
+            self.assertIn(b"Card", edited.body)
+            self.assertEqual(self.receipt().body, edited.body)
+            self.assertEqual(render.call_count, 2)
+        # the old receipt stays until it is evicted
+        self.assertEqual(receipts.stats()["files"], 2)
+
+    def test_evicts_least_recently_used_first(self):
+        sale_ids = [self.sale_id] + [self.checkout(self.cart((self.tea, 1))).json()["sale_id"] for _ in range(3)]
+        paths = [receipts.get_receipt(receipts.receipt_queryset().get(pk=pk), "text") for pk in sale_ids[:3]]
+        now = time.time()
+        for age, path in zip([300, 200, 100], paths):
+            os.utime(path, (now - age, now - age))
+        # the oldest receipt was read again: the other two are now the least recently used
+        self.receipt()
+        largest = max(path.stat().st_size for path in paths)
+        with override_settings(RECEIPT_CACHE_MAX_BYTES=2 * largest):
+            newest = receipts.get_receipt(receipts.receipt_queryset().get(pk=sale_ids[3]), "text")
+        self.assertEqual(sorted(receipts.get_cache_dir().iterdir()), sorted([paths[0], newest]))
+
+    def test_evicts_only_past_the_bound(self):
+        with mock.patch("sales.receipts.evict") as evict:
+            self.receipt()
+        evict.assert_not_called()
+
+        size = receipts.stats()["bytes"]
+        other = self.checkout(self.cart((self.tea, 1))).json()["sale_id"]
+        with override_settings(RECEIPT_CACHE_MAX_BYTES=size):
+            self.client.get(reverse("sales:receipt_pdf", args=[other]))
+        # the least recently used receipt made room for the new one
+        self.assertEqual(receipts.stats()["files"], 1)
+
+
+@override_settings(PDF_RENDER_WORKERS=1, PDF_RENDER_TIMEOUT=0.05)
+class ReceiptRenderPoolTests(ReceiptTestCase):
+    def setUp(self):
+        super().setUp()
+        # one slot, and a pool whose jobs never finish on their own
+        self.slots = threading.BoundedSemaphore(1)
+        self.executor = mock.Mock(submit=mock.Mock(side_effect=lambda *args: Future()))
+        patcher = mock.patch("pos_system.rendering._get_executor", return_value=(self.executor, self.slots))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_busy(self):
+        self.slots.acquire()
+        response = self.receipt("html")
+        self.assertEqual((response.status_code, response["Retry-After"]), (503, "5"))
+        self.executor.submit.assert_not_called()
+        self.slots.release()
+
+    def test_timeout_releases_the_slot(self):
+        response = self.receipt("html")
+        self.assertEqual(response.status_code, 504)
+        self.executor.submit.assert_called_once()
+        # the abandoned job was cancelled, which gave its slot back
+        self.assertTrue(self.slots.acquire(blocking=False))
+        self.assertEqual(receipts.stats()["files"], 0)
+
+
+class BusinessDateTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch.day_rollover_hour = 4
+        self.branch.save()
+
+    def local(self, *args):
+        return timezone.make_aware(datetime.datetime(*args))
+
+    def test_save_across_rollover(self):
+        sale = Sale.objects.create(user=self.cashier, branch=self.branch, datetime=self.local(2026, 3, 10, 3, 59))
+        self.assertEqual(sale.business_date, datetime.date(2026, 3, 9))
+        sale.datetime = self.local(2026, 3, 10, 4, 0)
+        sale.save(update_fields=["datetime"])
+        sale.refresh_from_db()
+        self.assertEqual(sale.business_date, datetime.date(2026, 3, 10))
+        # moved to a branch whose day starts at midnight
+        sale.datetime = self.local(2026, 3, 11, 0, 30)
+        sale.branch = self.other
+        sale.save(update_fields=["datetime", "branch"])
+        sale.refresh_from_db()
+        self.assertEqual(sale.business_date, datetime.date(2026, 3, 11))
+        sale.branch = self.branch
+        sale.save(update_fields=["branch"])
+        sale.refresh_from_db()
+        self.assertEqual(sale.business_date, datetime.date(2026, 3, 10))
+
+    def test_other_update_fields_leave_it(self):
+        sale = Sale.objects.create(user=self.cashier, branch=self.branch, datetime=self.local(2026, 3, 10, 3, 0))
+        Branch.objects.filter(pk=self.branch.pk).update(day_rollover_hour=0)
+        sale = Sale.objects.get(pk=sale.pk)
+        sale.payment_method = "card"
+        sale.save(update_fields=["payment_method"])
+        sale.refresh_from_db()
+        self.assertEqual((sale.payment_method, sale.business_date), ("card", datetime.date(2026, 3, 9)))
+
+
+class BusinessDateBackfillTests(TransactionTestCase):
+    """sales migration 0014 dates existing sales like Branch.business_date."""
+    before = [("sales", "0013_sale_business_date")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.old_apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_matches_branch(self):
+        OldBranch = self.old_apps.get_model("branches", "Branch")
+        OldSale = self.old_apps.get_model("sales", "Sale")
+        branches = [OldBranch.objects.create(name=f"Rollover {hour}", day_rollover_hour=hour) for hour in (0, 4, 23)]
+        times = [
+            timezone.make_aware(datetime.datetime(*args)) for args in (
+                (2026, 3, 10, 0, 0), (2026, 3, 10, 3, 59), (2026, 3, 10, 4, 0), (2026, 3, 10, 22, 59),
+                (2026, 3, 10, 23, 0), (2026, 12, 31, 23, 30), (2026, 7, 1, 2, 0),   # summer time
+            )
+        ]
+        for branch in branches:
+            for when in times:
+                OldSale.objects.create(branch=branch, datetime=when)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([("sales", "0014_backfill_sale_business_date")])
+
+        rows = OldSale.objects.values_list("datetime", "branch_id", "business_date")
+        self.assertEqual(len(rows), 21)
+        for when, branch_id, business_date in rows:
+            self.assertEqual(business_date, Branch.objects.get(pk=branch_id).business_date(when), (when, branch_id))
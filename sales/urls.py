@@ -6,8 +6,11 @@ app_name = "sales"
 urlpatterns = [
     path("", views.index, name="index"),
     path("pos/", views.pos, name="pos"),
+    path("catalog/", views.catalog, name="catalog"),
+    path("scan/", views.scan, name="scan"),
     path("update_cart/<int:item_id>/", views.update_cart, name="update_cart"),
     path("checkout/", views.checkout, name="checkout"),
+    path("checkout/batch/", views.checkout_batch, name="checkout_batch"),
     path("history/", views.sale_history, name="sale_history"),
     path("today/", views.sales_today, name="sales_today"),
     path("sale_list/", views.sale_list, name="sales_list"),
@@ -1,21 +1,26 @@
 import json
 from decimal import Decimal
-from django.db import transaction
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, JsonResponse, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from inventory.models import Item, Category
+from inventory.models import Item
+from inventory.catalog import snapshot as catalog_snapshot
 from customers.models import Customer
 from .models import Sale, SaleItem
-
-from xhtml2pdf import pisa
-from django.template.loader import get_template
-import io
+from .checkout import TWO_PLACES, CheckoutError, parse_order, resolve_customer, place_order, sale_payload, ingest_sales
+from .signals import sales_recorded
+from . import idempotency
+from .scan import lookup as scan_lookup
+from . import receipts
+from pos_system import rendering
 
 
 # -------------------------------
@@ -31,23 +36,73 @@ def pos(request):
     """Point of Sale screen filtered by user branch"""
     branch = getattr(request.user, "branch", None)
 
-    if branch:
-        items = Item.objects.select_related("category").filter(branch=branch, stock__gt=0)
-        categories = Category.objects.filter(item__branch=branch).distinct()
-        customers = Customer.objects.filter(branch=branch)
-    else:
-        items = Item.objects.none()
-        categories = Category.objects.none()
-        customers = Customer.objects.none()
+    # Items are not rendered here: the page loads them from sales:catalog
+    # and keeps them in the browser, pulling only the changes afterwards.
+    customers = Customer.objects.filter(branch=branch) if branch else Customer.objects.none()
 
     return render(request, "sales/pos.html", {
-        "items": items,
-        "categories": categories,
         "customers": customers,
         "branch": branch,
     })
 
 
+# -------------------------------
+# Catalog API (POS terminals)
+# -------------------------------
+@login_required
+def catalog(request):
+    """
+    Compact JSON catalog of the user's branch.
+    Query params:
+      - since=N (optional): only what changed after catalog version N
+    Answers 304 to If-None-Match while the branch catalog version is unchanged.
+    """
+    branch = getattr(request.user, "branch", None)
+    if not branch:
+        return JsonResponse({"error": "User has no assigned branch"}, status=400)
+
+    since = request.GET.get("since")
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid version"}, status=400)
+
+    def etag(version):
+        scope = "full" if since is None else since
+        return f'"catalog-{branch.pk}-{version}-{scope}"'
+
+    # request.user.branch was just loaded, so its version is current: no extra query for a 304
+    not_modified = get_conditional_response(request, etag=etag(branch.catalog_version))
+    if not_modified is not None:
+        return not_modified
+
+    data = catalog_snapshot(branch, since)
+    response = JsonResponse(data)
+    response["ETag"] = etag(data["version"])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# -------------------------------
+# Scan-to-cart lookup (barcode / SKU)
+# -------------------------------
+@login_required
+def scan(request):
+    """
+    Query params:
+      - code: scanned barcode or SKU
+    Returns JSON: { item: {id, name, price, stock, sku, barcode} } or 404
+    """
+    branch = getattr(request.user, "branch", None)
+    if not branch:
+        return JsonResponse({"error": "User has no assigned branch"}, status=400)
+
+    item = scan_lookup(branch, request.GET.get("code"))
+    if item is None:
+        return JsonResponse({"error": "No item found for this code"}, status=404)
+    return JsonResponse({"item": item})
+
+
 # -------------------------------
 # Checkout API
 # -------------------------------
@@ -62,101 +117,77 @@ def checkout(request):
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-    items_data = payload.get("items", [])
-    customer_id = payload.get("customer_id")
-    order_type = payload.get("order_type", "dine_in")
-    payment_method = payload.get("payment_method", "cash")
-
     try:
-        discount_percent = Decimal(payload.get("discount", 0))
-        cash_amount = Decimal(payload.get("cash_amount", 0))
-        card_amount = Decimal(payload.get("card_amount", 0))
-    except Exception:
-        return JsonResponse({"error": "Invalid numeric values"}, status=400)
-
-    if not items_data:
-        return JsonResponse({"error": "Cart is empty"}, status=400)
-
-    customer = None
-    if customer_id:
-        try:
-            customer = Customer.objects.get(pk=int(customer_id))
-        except Customer.DoesNotExist:
-            return JsonResponse({"error": "Invalid customer"}, status=400)
+        key = idempotency.get_key(request, payload)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    branch = getattr(request.user, "branch", None)
-    if not branch:
-        return JsonResponse({"error": "User has no assigned branch"}, status=400)
-
-    table_number = payload.get("table_number") if order_type == "dine_in" else None
-    if order_type == "dine_in" and not table_number:
-        return JsonResponse({"error": "Please enter a table number for dine-in orders"}, status=400)
+    # A retry of a checkout that already went through -> answer from the replay table
+    if key:
+        record = idempotency.lookup(request.user, key)
+        if record is not None:
+            return idempotency.replay(record)
 
     try:
+        order = parse_order(payload)
+        customer = resolve_customer(order["customer_id"])
         with transaction.atomic():
-            sale = Sale.objects.create(
-                user=request.user,
-                branch=branch,
-                customer=customer,
-                order_type=order_type,
-                table_number=table_number,
-                payment_method=payment_method,
-                discount_percent=discount_percent,
-                cash_amount=cash_amount if payment_method == "mixed" else None,
-                card_amount=card_amount if payment_method == "mixed" else None,
-            )
+            sale = place_order(request.user, getattr(request.user, "branch", None), order, customer)
+            data = sale_payload(sale)
+            if key:
+                idempotency.store(request.user, key, sale, data)
+    except CheckoutError as e:
+        return JsonResponse(e.as_json(), status=e.status)
+    except IntegrityError:
+        # Lost the race against a concurrent request with the same key (our sale was rolled back)
+        record = idempotency.lookup(request.user, key) if key else None
+        if record is None:
+            return JsonResponse({"error": "Checkout already in progress, please retry"}, status=409)
+        return idempotency.replay(record)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
 
-            total = Decimal("0.00")
+    return JsonResponse(data)
 
-            for it in items_data:
-                try:
-                    item = Item.objects.select_for_update().get(pk=int(it["id"]))
-                except Item.DoesNotExist:
-                    transaction.set_rollback(True)
-                    return JsonResponse({"error": f"Item not found: {it['id']}"}, status=400)
 
-                qty = int(it["quantity"])
-                if item.stock < qty:
-                    transaction.set_rollback(True)
-                    return JsonResponse({"error": f"Insufficient stock for item: {item.name}"}, status=400)
+# -------------------------------
+# Batch checkout API (offline terminals)
+# -------------------------------
+@login_required
+@csrf_exempt
+def checkout_batch(request):
+    """
+    Body: {"sales": [<checkout payload> + optional "client_ref", "sold_at", "idempotency_key"], ...}
+    Returns one result per sale; stock conflicts are flagged per sale instead of failing the batch.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
 
-                item.stock -= qty
-                item.save()
+    try:
+        payload = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    entries = payload.get("sales") if isinstance(payload, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return JsonResponse({"error": "No sales to ingest"}, status=400)
 
-                SaleItem.objects.create(
-                    sale=sale,
-                    item=item,
-                    quantity=qty,
-                    price=item.price
-                )
-
-                total += item.price * qty
-
-            discount_amount = (total * discount_percent / 100).quantize(Decimal("0.01"))
-            final_total = (total - discount_amount).quantize(Decimal("0.01"))
-
-            if payment_method == "mixed":
-                if cash_amount + card_amount != final_total:
-                    transaction.set_rollback(True)
-                    return JsonResponse({"error": "Cash + Card amount must equal final total"}, status=400)
-
-            sale.total = total.quantize(Decimal("0.01"))
-            sale.discount_amount = discount_amount
-            sale.final_total = final_total
-            sale.save()
-
-            return JsonResponse({
-                "sale_id": sale.id,
-                "total": str(sale.total),
-                "final_total": str(sale.final_total),
-                "discount_percent": str(sale.discount_percent),
-                "discount_amount": str(sale.discount_amount),
-                "redirect_url": reverse("sales:sale_detail", args=[sale.id])
-            })
+    max_size = getattr(settings, "SALES_BATCH_MAX_SIZE", 1000)
+    if len(entries) > max_size:
+        return JsonResponse({"error": f"Too many sales in one batch (max {max_size})"}, status=400)
 
+    try:
+        results = ingest_sales(request.user, getattr(request.user, "branch", None), entries)
+    except CheckoutError as e:
+        return JsonResponse(e.as_json(), status=e.status)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return JsonResponse({"results": results, "summary": summary})
+
 
 # -------------------------------
 # Get customer address via AJAX
@@ -219,28 +250,37 @@ def sale_create(request):
             except Customer.DoesNotExist:
                 customer = None
 
-        sale = Sale.objects.create(
-            user=request.user,
-            branch=getattr(request.user, "branch", None),
-            customer=customer,
-            payment_method=payment_method,
-            order_type=order_type,
-            total=total
-        )
-
         items = request.POST.getlist("items")
         quantities = request.POST.getlist("quantities")
+        lines = [(Item.objects.get(pk=item_id), int(qty)) for item_id, qty in zip(items, quantities)]
+        if lines:
+            total = sum((item.price * qty for item, qty in lines), Decimal("0.00"))
+        discount_percent = Decimal(request.POST.get("discount") or 0)
+        # totals before the sale is written: sales_recorded adds final_total to the report rollups
+        discount_amount = (total * discount_percent / 100).quantize(TWO_PLACES)
 
-        for item_id, qty in zip(items, quantities):
-            item = Item.objects.get(pk=item_id)
-            SaleItem.objects.create(
-                sale=sale,
-                item=item,
-                quantity=int(qty),
-                price=item.price
+        with transaction.atomic():
+            sale = Sale.objects.create(
+                user=request.user,
+                branch=getattr(request.user, "branch", None),
+                customer=customer,
+                payment_method=payment_method,
+                order_type=order_type,
+                total=total.quantize(TWO_PLACES),
+                discount_percent=discount_percent,
+                discount_amount=discount_amount,
+                final_total=(total - discount_amount).quantize(TWO_PLACES),
             )
-            item.stock -= int(qty)
-            item.save()
+
+            # bulk_create sends no post_save: sales_recorded below adds the items, as in checkout
+            sale_items = SaleItem.objects.bulk_create([
+                SaleItem(sale=sale, item=item, quantity=qty, price=item.price) for item, qty in lines
+            ])
+            for item, qty in lines:
+                item.stock -= qty
+                item.save()
+            if sale.branch:
+                sales_recorded.send(sender=Sale, branch=sale.branch, sales=[sale], items=sale_items)
 
         return redirect("sales:pos")
 
@@ -258,27 +298,35 @@ def sale_create(request):
 # -------------------------------
 @login_required
 def receipt_pdf(request, sale_id):
-    sale = get_object_or_404(Sale, pk=sale_id)
-    sale.datetime = timezone.localtime(sale.datetime)
-
-    total_before_discount = sale.total.quantize(Decimal("0.01"))
-    discount_amount = sale.discount_amount.quantize(Decimal("0.01"))
-    total_after_discount = sale.final_total.quantize(Decimal("0.01"))
-
-    template = get_template('sales/receipt.html')
-    html = template.render({
-        'sale': sale,
-        'total_before_discount': total_before_discount,
-        'discount_amount': discount_amount,
-        'total_after_discount': total_after_discount,
-    })
+    """
+    Receipt of a sale in the branch's receipt format (override with ?renderer=html|reportlab|text|escpos),
+    served from the on-disk receipt cache (sales/receipts.py). The ETag is the cache key, so a
+    client that already has the receipt gets a 304 without it being read or rendered.
+    """
+    sale = get_object_or_404(receipts.receipt_queryset(), pk=sale_id)
+    try:
+        renderer = receipts.renderer_for(sale, request.GET.get("renderer"))
+    except receipts.ReceiptError as e:
+        return HttpResponse(str(e), status=400)
 
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="receipt_{sale.id}.pdf"'
+    path = receipts.cache_path(sale, renderer)
+    etag = f'"{path.stem}"'  # the cache key
+    last_modified = path.stat().st_mtime if path.exists() else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
 
-    pisa_status = pisa.CreatePDF(io.StringIO(html), dest=response)
-    if pisa_status.err:
-        return HttpResponse('Error generating PDF', status=500)
+    try:
+        path = receipts.get_receipt(sale, renderer)
+    except rendering.RenderError as e:
+        return rendering.error_response(e)
+
+    backend = receipts.RENDERERS[renderer]
+    response = FileResponse(open(path, "rb"), content_type=backend["content_type"])
+    response['Content-Disposition'] = f'filename="receipt_{sale.id}.{backend["extension"]}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(path.stat().st_mtime)
+    patch_cache_control(response, private=True, no_cache=True)
     return response
 
 
@@ -287,10 +335,11 @@ def receipt_pdf(request, sale_id):
 # -------------------------------
 @login_required
 def sales_today(request):
-    today = timezone.localdate()
+    branch = request.user.branch
+    today = branch.business_date() if branch else timezone.localdate()
     sales = Sale.objects.filter(
         user=request.user,
-        datetime__date=today
+        business_date=today
     ).order_by("-datetime")
     for s in sales:
         s.datetime = timezone.localtime(s.datetime)